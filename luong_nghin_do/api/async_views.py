@@ -0,0 +1,352 @@
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .models import ChuDe, DanhGia
+from .views import (
+    EXERCISE_TYPES,
+    FEEDBACK_MESSAGE,
+    OPENAI_RUN_TIMEOUT,
+    RUN_PENDING_STATUSES,
+    SUMMARY_MODES,
+    build_chat_context,
+    chunk_cache_key,
+    chunk_completion,
+    chunk_index,
+    chunk_summaries,
+    complete_async,
+    document_result,
+    exercise_completion,
+    get_async_client,
+    hierarchical_completion,
+    invalid_json_response,
+    load_chunk_summaries,
+    missing_chunks,
+    parse_json_response,
+    parse_short_summary,
+    reduce_steps,
+    run_error_response,
+    run_poll_intervals,
+    short_completion,
+    split_document,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@csrf_exempt
+async def summarize_text_hierarchical_async(request):
+    """
+    Bản async của summarize_text_hierarchical (cùng request/response).
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+
+    try:
+        data = json.loads(request.body)
+        input_text = data.get("text", "").strip()
+        mode = data.get("mode", "normal").strip().lower()
+
+        if not input_text:
+            return JsonResponse({"error": "Vui lòng nhập văn bản!"}, status=400)
+
+        try:
+            summary_dict = await complete_async(*hierarchical_completion(input_text, mode), parse_json_response)
+        except json.JSONDecodeError as e:
+            return invalid_json_response(e)
+
+        return JsonResponse({"status": "success", "summary": summary_dict, "mode": mode}, json_dumps_params={'ensure_ascii': False})
+
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON format"}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt
+async def generate_exercises_async(request):
+    """
+    Bản async của generate_exercises.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+
+    try:
+        data = json.loads(request.body)
+        text = data.get("text", "").strip()
+        exercise_type = data.get("type", "").strip().lower()
+
+        if not text:
+            return JsonResponse({"error": "Vui lòng nhập nội dung để tạo bài tập"}, status=400)
+
+        if exercise_type not in EXERCISE_TYPES:
+            return JsonResponse({"error": "Loại bài tập không hợp lệ"}, status=400)
+
+        exercises_dict = await complete_async(*exercise_completion(text, exercise_type), parse_json_response)
+
+        return JsonResponse({"status": "success", "exercise": exercises_dict}, json_dumps_params={'ensure_ascii': False})
+
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Phản hồi từ OpenAI không đúng JSON"}, status=500)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt
+async def summarize_text_short_async(request):
+    """
+    Bản async của summarize_text_short.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+
+    try:
+        data = json.loads(request.body)
+        input_text = data.get("text", "").strip()
+
+        if not input_text:
+            return JsonResponse({"error": "Vui lòng nhập văn bản!"}, status=400)
+
+        try:
+            result = await complete_async(*short_completion(input_text), parse_short_summary)
+        except json.JSONDecodeError:
+            logger.error("⚠️ Phản hồi từ AI không phải JSON hợp lệ!")
+            return JsonResponse({"error": "Phản hồi từ AI không phải JSON hợp lệ"}, status=500)
+
+        return JsonResponse({
+            "status": "success",
+            "title": result["title"],
+            "summary": result["summary"]
+        }, json_dumps_params={'ensure_ascii': False})
+
+    except json.JSONDecodeError:
+        logger.error("⚠️ Lỗi JSON từ request!")
+        return JsonResponse({"error": "Invalid JSON format"}, status=400)
+    except Exception as e:
+        logger.exception(f"⚠️ Lỗi không xác định: {str(e)}")
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+async def request_chunk_summary_async(text_chunk):
+    """
+    Bản async của request_chunk_summary: ném lỗi nếu thất bại.
+    """
+    result = await complete_async(*chunk_completion(text_chunk), parse_short_summary, cache=chunk_index)
+    return result["title"], result["summary"]
+
+
+async def request_chunk_summaries_async(text_chunks):
+    """
+    Bản async của request_chunk_summaries: đoạn lỗi trả về None.
+    Số lời gọi OpenAI cùng lúc đã được giới hạn trong complete_async (openai_semaphore).
+    """
+    outcomes = await asyncio.gather(*(request_chunk_summary_async(chunk) for chunk in text_chunks), return_exceptions=True)
+    results = []
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            logger.error(f"⚠️ Lỗi khi tóm tắt đoạn văn bản: {str(outcome)}")
+            results.append(None)
+        else:
+            results.append(outcome)
+    return results
+
+
+async def summarize_chunks_incremental_async(text_chunks):
+    """
+    Bản async của summarize_chunks_incremental: chỉ gọi OpenAI cho đoạn chưa có trong llm_cache.
+    """
+    keys = [chunk_cache_key(chunk) for chunk in text_chunks]
+    known = await sync_to_async(load_chunk_summaries)(keys)
+    reused = sum(1 for key in keys if key in known)
+
+    missing = missing_chunks(keys, text_chunks, known)
+    results = await request_chunk_summaries_async(list(missing.values()))
+    known.update((key, result) for key, result in zip(missing, results) if result is not None)
+
+    return [known.get(key) for key in keys], reused
+
+
+async def reduce_summaries_async(summaries):
+    """
+    Bản async của reduce_summaries (cùng các bước reduce_steps).
+    """
+    steps = reduce_steps(summaries)
+    try:
+        groups = next(steps)
+        while True:
+            groups = steps.send(await request_chunk_summaries_async(groups))
+    except StopIteration as done:
+        return done.value
+
+
+async def summarize_document_async(input_text, mode="concat"):
+    """
+    Bản async của summarize_document.
+    """
+    text_chunks = split_document(input_text)
+    results, reused = await summarize_chunks_incremental_async(text_chunks)
+    summaries, stats = chunk_summaries(text_chunks, results, reused)
+
+    reduced = await reduce_summaries_async(summaries) if mode == "map_reduce" else None
+    return document_result(summaries, stats, reduced)
+
+
+@csrf_exempt
+async def summarize_text_async(request):
+    """
+    Bản async của summarize_text (hỗ trợ cả "mode": "map_reduce").
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+
+    try:
+        data = json.loads(request.body)
+        input_text = data.get("text", "").strip()
+        mode = data.get("mode", "concat").strip().lower()
+
+        if not input_text:
+            return JsonResponse({"error": "Vui lòng nhập văn bản!"}, status=400)
+
+        if mode not in SUMMARY_MODES:
+            return JsonResponse({"error": "Chế độ tóm tắt không hợp lệ"}, status=400)
+
+        result = await summarize_document_async(input_text, mode)
+
+        return JsonResponse({"status": "success", **result}, json_dumps_params={'ensure_ascii': False})
+
+    except json.JSONDecodeError:
+        logger.error("⚠️ Lỗi JSON từ request!")
+        return JsonResponse({"error": "Invalid JSON format"}, status=400)
+    except Exception as e:
+        logger.exception(f"⚠️ Lỗi không xác định: {str(e)}")
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+async def cancel_run_async(thread_id, run_id):
+    try:
+        await get_async_client().beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except Exception as e:
+        logger.warning(f"⚠️ Không hủy được run {run_id}: {str(e)}")
+
+
+async def wait_for_run_async(thread_id, run, timeout=OPENAI_RUN_TIMEOUT):
+    """
+    Bản async của wait_for_run: polling thích ứng, quá timeout thì hủy run và ném TimeoutError.
+    """
+    deadline = time.monotonic() + timeout
+    intervals = run_poll_intervals()
+    while run.status in RUN_PENDING_STATUSES:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            await cancel_run_async(thread_id, run.id)
+            raise TimeoutError(f"Run {run.id} chưa xong sau {timeout} giây")
+        await asyncio.sleep(min(next(intervals), remaining))
+        run = await get_async_client().beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+    return run
+
+
+@csrf_exempt
+async def chat_with_ai_async(request):
+    """
+    Bản async của chat_with_ai, dùng AsyncOpenAI và ORM async.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+
+    try:
+        data = json.loads(request.body)
+        user_id = data.get("idUser")
+        chu_de_id = data.get("idChuDe")
+        user_message = data.get("message", "").strip()
+
+        if not user_id or not chu_de_id or not user_message:
+            return JsonResponse({"error": "Vui lòng nhập idUser, idChuDe và tin nhắn!"}, status=400)
+
+        async_client = get_async_client()
+
+        try:
+            chu_de = await ChuDe.objects.aget(id=chu_de_id)
+        except ChuDe.DoesNotExist:
+            return JsonResponse({"error": "Chủ đề không tồn tại"}, status=404)
+
+        danh_gia, created = await DanhGia.objects.aget_or_create(
+            idUser_id=user_id,
+            idChuDe_id=chu_de_id,
+            defaults={"idThread": None, "soCauHoi": 0}
+        )
+
+        if danh_gia.idThread is None:
+            thread = await async_client.beta.threads.create()
+            danh_gia.idThread = thread.id
+            danh_gia.soCauHoi = 0
+            await danh_gia.asave()
+
+            await async_client.beta.threads.messages.create(
+                thread_id=thread.id,
+                role="assistant",
+                content=build_chat_context(chu_de)
+            )
+
+        thread_id = danh_gia.idThread
+
+        if danh_gia.soCauHoi >= 4:
+            await async_client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=FEEDBACK_MESSAGE
+            )
+            danh_gia.soCauHoi = 0
+        else:
+            await async_client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=user_message
+            )
+            danh_gia.soCauHoi += 1
+        await danh_gia.asave()
+
+        run = await async_client.beta.threads.runs.create(
+            thread_id=thread_id,
+            assistant_id=settings.OPENAI_ASSISTANT_ID,
+            instructions=f"Chỉ trả lời trong phạm vi chủ đề '{chu_de.name_chu_de}'. Không lan man."
+        )
+
+        # ⏳ Chờ phản hồi từ AI mà không chặn event loop
+        try:
+            run = await wait_for_run_async(thread_id, run)
+        except TimeoutError:
+            return JsonResponse({"error": "AI phản hồi quá thời gian cho phép"}, status=504)
+
+        if run.status == "requires_action":
+            await cancel_run_async(thread_id, run.id)
+
+        error_response = run_error_response(run)
+        if error_response is not None:
+            return error_response
+
+        # 📌 Chỉ lấy tin nhắn mới nhất của run vừa chạy
+        messages = await async_client.beta.threads.messages.list(
+            thread_id=thread_id, run_id=run.id, order="desc", limit=1
+        )
+        ai_messages = [msg for msg in messages.data if msg.role == "assistant"]
+        if not ai_messages:
+            return JsonResponse({"error": "AI không phản hồi!"}, status=500)
+
+        ai_response = ai_messages[0].content[0].text.value
+
+        return JsonResponse({
+            "status": "success",
+            "thread_id": thread_id,
+            "response": ai_response
+        }, json_dumps_params={'ensure_ascii': False})
+
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Dữ liệu JSON không hợp lệ"}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
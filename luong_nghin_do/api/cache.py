@@ -0,0 +1,151 @@
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CacheEntry, CacheCounter
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """
+    Chuẩn hóa khoảng trắng để cùng một nội dung luôn cho cùng một khóa.
+    """
+    return " ".join(text.split())
+
+
+def make_key(*parts):
+    """
+    Tạo khóa SHA-256 từ các thành phần (prompt, model, chế độ, max_tokens...).
+    """
+    raw = json.dumps(parts, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ContentCache:
+    """
+    Cache theo hash nội dung, lưu trong DB nên dùng chung giữa các worker gunicorn.
+    - LRU: vượt quá max_entries thì xóa các entry lâu không được dùng nhất.
+    - TTL: entry cũ hơn ttl (giây) bị coi là hết hạn. ttl=None là không hết hạn.
+    Lỗi DB chỉ được ghi log, không làm hỏng request.
+    """
+
+    def __init__(self, namespace, max_entries=1000, ttl=None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def _entries(self):
+        return CacheEntry.objects.filter(namespace=self.namespace)
+
+    def _expired_before(self):
+        return timezone.now() - timedelta(seconds=self.ttl)
+
+    def _count(self, field, amount=1):
+        # 📌 Tăng bộ đếm bằng F() để an toàn khi nhiều worker cùng ghi
+        if not amount:
+            return
+        updated = CacheCounter.objects.filter(namespace=self.namespace).update(**{field: F(field) + amount})
+        if not updated:
+            try:
+                CacheCounter.objects.create(namespace=self.namespace, **{field: amount})
+            except IntegrityError:
+                CacheCounter.objects.filter(namespace=self.namespace).update(**{field: F(field) + amount})
+
+    def get(self, key):
+        """
+        Trả về giá trị đã cache hoặc None nếu chưa có / đã hết hạn.
+        """
+        try:
+            entry = self._entries().filter(key=key).first()
+            if entry is not None and self.ttl is not None and entry.created_at < self._expired_before():
+                entry.delete()
+                entry = None
+
+            if entry is None:
+                self._count("misses")
+                return None
+
+            self._entries().filter(pk=entry.pk).update(last_accessed=timezone.now())
+            self._count("hits")
+            return json.loads(entry.value)
+        except Exception as e:
+            logger.warning(f"⚠️ Không đọc được cache {self.namespace}: {str(e)}")
+            return None
+
+    def get_many(self, keys):
+        """
+        Đọc nhiều khóa trong một truy vấn, trả về dict khóa -> giá trị (chỉ gồm các khóa có trong cache).
+        """
+        keys = set(keys)
+        try:
+            entries = self._entries().filter(key__in=keys)
+            if self.ttl is not None:
+                entries = entries.filter(created_at__gte=self._expired_before())
+            found = {entry.key: entry for entry in entries}
+
+            if found:
+                self._entries().filter(pk__in=[entry.pk for entry in found.values()]).update(last_accessed=timezone.now())
+            self._count("hits", len(found))
+            self._count("misses", len(keys) - len(found))
+            return {key: json.loads(entry.value) for key, entry in found.items()}
+        except Exception as e:
+            logger.warning(f"⚠️ Không đọc được cache {self.namespace}: {str(e)}")
+            return {}
+
+    def set(self, key, value):
+        """
+        Lưu giá trị (phải serialize được sang JSON) rồi dọn các entry thừa.
+        """
+        try:
+            now = timezone.now()
+            CacheEntry.objects.update_or_create(
+                namespace=self.namespace,
+                key=key,
+                defaults={
+                    "value": json.dumps(value, ensure_ascii=False),
+                    "created_at": now,
+                    "last_accessed": now,
+                },
+            )
+            self._evict()
+        except Exception as e:
+            logger.warning(f"⚠️ Không ghi được cache {self.namespace}: {str(e)}")
+
+    async def aget(self, key):
+        return await sync_to_async(self.get)(key)
+
+    async def aset(self, key, value):
+        await sync_to_async(self.set)(key, value)
+
+    def _evict(self):
+        if self.ttl is not None:
+            self._entries().filter(created_at__lt=self._expired_before()).delete()
+
+        if self.max_entries is not None:
+            stale_ids = list(
+                self._entries().order_by("-last_accessed").values_list("id", flat=True)[self.max_entries:]
+            )
+            if stale_ids:
+                CacheEntry.objects.filter(id__in=stale_ids).delete()
+
+    def clear(self):
+        self._entries().delete()
+        CacheCounter.objects.filter(namespace=self.namespace).delete()
+
+    def stats(self):
+        counter = CacheCounter.objects.filter(namespace=self.namespace).first()
+        return {
+            "namespace": self.namespace,
+            "hits": counter.hits if counter else 0,
+            "misses": counter.misses if counter else 0,
+            "entries": self._entries().count(),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        }
@@ -0,0 +1,155 @@
+import functools
+import logging
+import re
+import zlib
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken là tùy chọn, thiếu thì ước lượng số token
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_ENCODING = "o200k_base"  # ➜ Bộ mã hóa token của gpt-4o / gpt-4o-mini
+
+# 📌 Ranh giới câu: dấu kết thúc câu (có thể kèm ngoặc/nháy đóng) + khoảng trắng, hoặc xuống dòng
+SENTENCE_BOUNDARY = re.compile(r"([.!?…]+[\"'”’)\]]*)\s+|\s*\n\s*")
+
+# 📌 Các từ viết tắt hay gặp trong tiếng Việt, dấu chấm sau chúng không kết thúc câu
+ABBREVIATIONS = {
+    "tp", "q", "p", "tx", "tt", "ts", "ths", "pgs", "gs", "bs", "ks", "cn", "th",
+    "v.v", "vd", "st", "mr", "mrs", "dr", "no",
+}
+
+# 📌 Chia đoạn theo nội dung: trung bình cứ ANCHOR_EVERY câu có một câu "mốc" được phép kết thúc đoạn
+ANCHOR_EVERY = 8
+
+# 📌 Phần chưa hết câu dài quá mức này thì vẫn cắt, tránh giữ bộ đệm vô hạn
+MAX_PENDING_CHARS = 20000
+
+
+@functools.lru_cache(maxsize=1)
+def get_encoding():
+    """
+    Nạp tokenizer một lần cho mỗi process. Trả về None nếu không dùng được
+    (chưa cài tiktoken hoặc không tải được file encoding khi chạy offline).
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"⚠️ Không nạp được tokenizer {TOKENIZER_ENCODING}, dùng ước lượng: {str(e)}")
+        return None
+
+
+def count_tokens(text):
+    """
+    Đếm số token của đoạn văn bản. Không có tokenizer thì ước lượng
+    (tiếng Việt có dấu khoảng 2 ký tự / token, ước lượng dư để không vượt ngân sách).
+    """
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 2 + 1
+
+
+def _is_abbreviation(text, end):
+    """
+    Kiểm tra từ đứng trước dấu chấm tại vị trí `end` có phải từ viết tắt không (vd: "TP. Hồ Chí Minh").
+    """
+    start = end
+    while start > 0 and not text[start - 1].isspace():
+        start -= 1
+    word = text[start:end].rstrip(".").lower()
+    return word in ABBREVIATIONS
+
+
+def iter_sentences(pieces):
+    """
+    Tách luồng văn bản (một chuỗi hoặc nhiều phần liên tiếp, vd: từng trang PDF) thành các câu.
+    Mỗi phần chỉ được quét một lần nên thời gian tuyến tính theo độ dài văn bản.
+    """
+    if isinstance(pieces, str):
+        pieces = [pieces]
+
+    pending = ""
+    for piece in pieces:
+        text = pending + piece if pending else piece
+        last = 0
+        for match in SENTENCE_BOUNDARY.finditer(text):
+            end = match.end(1) if match.group(1) else match.start()
+            if match.group(1) == "." and _is_abbreviation(text, end):
+                continue
+            sentence = text[last:end].strip()
+            if sentence:
+                yield sentence
+            last = match.end()
+        pending = text[last:]
+
+        if len(pending) > MAX_PENDING_CHARS:
+            yield pending.strip()
+            pending = ""
+
+    if pending.strip():
+        yield pending.strip()
+
+
+def _split_long_sentence(sentence, max_tokens):
+    """
+    Câu dài hơn ngân sách: cắt theo từ.
+    """
+    words, word_tokens = [], 0
+    for word in sentence.split():
+        tokens = count_tokens(word) + 1
+        if words and word_tokens + tokens > max_tokens:
+            yield " ".join(words)
+            words, word_tokens = [], 0
+        words.append(word)
+        word_tokens += tokens
+    if words:
+        yield " ".join(words)
+
+
+def is_anchor(sentence):
+    """
+    Câu "mốc" được chọn theo hash nội dung (crc32 ổn định giữa các process).
+    """
+    return zlib.crc32(sentence.encode("utf-8")) % ANCHOR_EVERY == 0
+
+
+def iter_text_chunks(text, max_tokens=2000, content_defined=False):
+    """
+    Chia văn bản thành các đoạn không vượt quá `max_tokens` token, không cắt giữa câu
+    (trừ khi bản thân câu dài hơn ngân sách). Là generator nên dùng được với văn bản rất lớn
+    hoặc với luồng văn bản đang được trích xuất.
+
+    content_defined=True: khi đoạn đã đạt 3/4 ngân sách thì kết thúc đoạn tại câu "mốc" đầu tiên.
+    Ranh giới phụ thuộc nội dung nên sửa một câu chỉ làm đổi các đoạn quanh nó, các đoạn sau
+    vẫn giống hệt lần trước (dùng cho tóm tắt lại tăng dần).
+    """
+    min_tokens = max_tokens * 3 // 4
+    sentences, chunk_tokens = [], 0
+    for sentence in iter_sentences(text):
+        tokens = count_tokens(sentence) + 1  # ➜ +1 cho khoảng trắng nối câu
+
+        if tokens > max_tokens:
+            if sentences:
+                yield " ".join(sentences)
+                sentences, chunk_tokens = [], 0
+            yield from _split_long_sentence(sentence, max_tokens)
+            continue
+
+        if sentences and chunk_tokens + tokens > max_tokens:
+            yield " ".join(sentences)
+            sentences, chunk_tokens = [], 0
+
+        sentences.append(sentence)
+        chunk_tokens += tokens
+
+        if content_defined and chunk_tokens >= min_tokens and is_anchor(sentence):
+            yield " ".join(sentences)
+            sentences, chunk_tokens = [], 0
+
+    if sentences:
+        yield " ".join(sentences)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_cacheentry_cachecounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='secure_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+    ]
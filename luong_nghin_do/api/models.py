@@ -44,3 +44,27 @@ class DanhGia(models.Model):
 class ImageUpload(models.Model):
     image = cloudinary.models.CloudinaryField('image')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # ➜ SHA-256 của ảnh, dùng để không upload trùng
+    secure_url = models.URLField(max_length=500, blank=True)
+
+class CacheEntry(models.Model):
+    namespace = models.CharField(max_length=50)
+    key = models.CharField(max_length=64)  # ➜ SHA-256 của nội dung
+    value = models.TextField()  # ➜ Kết quả dạng JSON
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('namespace', 'key')
+        indexes = [models.Index(fields=['namespace', 'last_accessed'])]
+
+    def __str__(self):
+        return f"{self.namespace}:{self.key}"
+
+class CacheCounter(models.Model):
+    namespace = models.CharField(max_length=50, unique=True)
+    hits = models.BigIntegerField(default=0)
+    misses = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.namespace}: {self.hits} hit / {self.misses} miss"
@@ -0,0 +1,89 @@
+"""
+Response streaming (SSE / NDJSON) chạy được cả dưới WSGI lẫn ASGI (uvicorn).
+Dưới ASGI, Django đọc generator đồng bộ bằng sync_to_async(list), tức là gom hết body rồi mới gửi:
+generator đồng bộ phải được chuyển thành async generator thì từng phần mới tới client ngay.
+"""
+import asyncio
+import concurrent.futures
+import threading
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import StreamingHttpResponse
+
+STREAM_BUFFER_SIZE = 16  # ➜ Số phần tối đa chờ gửi, producer dừng lại khi client đọc chậm
+STREAM_STOP_POLL = 1.0  # ➜ Giây producer chờ mỗi lần trước khi kiểm tra client đã ngắt chưa
+
+_END = object()
+
+
+def is_asgi(request):
+    """
+    Request đến qua ASGI hay không (request của DRF bọc HttpRequest gốc trong _request).
+    """
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
+async def aiter_in_thread(iterable, max_buffer=STREAM_BUFFER_SIZE):
+    """
+    Chạy generator đồng bộ trong một thread riêng và trả từng phần qua async generator.
+    - Hàng đợi có giới hạn: client đọc chậm thì producer chờ, không dồn cả body vào bộ nhớ.
+    - Client ngắt kết nối: producer dừng và đóng generator (chạy các khối finally của nó).
+    - Lỗi trong generator được ném lại ở phía async.
+    Không dùng openai_executor: generator thường tự đẩy việc vào pool đó và chờ, dễ tự khóa.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(max_buffer)
+    stop = threading.Event()
+
+    def put(item):
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while not stop.is_set():
+            try:
+                future.result(timeout=STREAM_STOP_POLL)
+                return True
+            except concurrent.futures.TimeoutError:
+                continue
+        future.cancel()
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if stop.is_set() or not put((item, None)):
+                    return
+            put((_END, None))
+        except BaseException as e:
+            put((_END, e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            # ➜ Thread không qua vòng đời request nên tự đóng kết nối DB đã mở
+            connections.close_all()
+
+    threading.Thread(target=produce, daemon=True, name="stream").start()
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def streaming_response(request, content, content_type):
+    """
+    StreamingHttpResponse gửi từng phần ngay khi có: dưới ASGI thì bọc generator đồng bộ bằng aiter_in_thread,
+    dưới WSGI thì giữ nguyên (async generator thì dùng thẳng dưới ASGI).
+    """
+    if is_asgi(request) and not hasattr(content, "__aiter__"):
+        content = aiter_in_thread(content)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # ➜ Không để nginx buffer, dữ liệu tới client ngay
+    return response
@@ -312,6 +312,9 @@ class ChatWithAiTestCase(TestCase):
         self.assertEqual(response_data["status"], "success")
         self.assertEqual(response_data["thread_id"], "thread_test_id")
         self.assertEqual(response_data["response"], "Đây là câu trả lời từ AI.")
+        mock_client.beta.threads.messages.list.assert_called_once_with(
+            thread_id="thread_test_id", run_id="run_test_id", order="desc", limit=1
+        )
 
     def test_chat_with_missing_fields_returns_error(self):
         payload = {
@@ -403,44 +406,64 @@ class RegisterUserTestCase(APITestCase):
         response = self.client.post("/register/", data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data["message"], "Email đã được sử dụng")
-from .views import split_text
-class TestSplitText(unittest.TestCase):
+import types
+from .chunking import iter_text_chunks, iter_sentences, count_tokens
+class TestIterTextChunks(unittest.TestCase):
     def test_short_text(self):
         text = "Đây là một câu ngắn."
-        result = split_text(text)
-        self.assertEqual(result, [text.strip()])
-
-    def test_exact_max_length(self):
-        sentence = "a" * 998  # 998 ký tự
-        text = sentence + ". "
-        result = split_text(text, max_length=1000)
-        self.assertEqual(result, [text.strip()])
-
-    def test_long_text_split(self):
-        text = "Câu thứ nhất. Câu thứ hai. Câu thứ ba."
-        result = split_text(text, max_length=20)
+        result = list(iter_text_chunks(text))
+        self.assertEqual(result, [text])
+
+    def test_returns_generator(self):
+        self.assertIsInstance(iter_text_chunks("Một câu."), types.GeneratorType)
+
+    def test_empty_text(self):
+        self.assertEqual(list(iter_text_chunks("")), [])
+        self.assertEqual(list(iter_text_chunks("   \n  ")), [])
+
+    def test_chunks_respect_token_budget(self):
+        text = " ".join(f"Đây là câu số {i} trong bài giảng về trí tuệ nhân tạo." for i in range(200))
+        result = list(iter_text_chunks(text, max_tokens=100))
         self.assertTrue(len(result) > 1)
         for chunk in result:
-            self.assertLessEqual(len(chunk), 20)
+            self.assertLessEqual(count_tokens(chunk), 100)
 
-    def test_empty_text(self):
-        text = ""
-        result = split_text(text)
-        self.assertEqual(result, [])
+    def test_chunks_keep_whole_sentences_in_order(self):
+        sentences = [f"Câu thứ {i} có nội dung riêng!" for i in range(50)]
+        result = list(iter_text_chunks(" ".join(sentences), max_tokens=60))
+        rebuilt = list(iter_sentences(" ".join(result)))
+        self.assertEqual(rebuilt, sentences)
+
+    def test_bigger_budget_gives_fewer_chunks(self):
+        text = " ".join(f"Câu số {i}." for i in range(300))
+        self.assertLess(len(list(iter_text_chunks(text, max_tokens=400))), len(list(iter_text_chunks(text, max_tokens=50))))
 
-    def test_chunk_not_exceed_max_length(self):
-        text = "Một. Hai. Ba. Bốn. Năm. Sáu. Bảy. Tám. Chín. Mười."
-        result = split_text(text, max_length=20)
+    def test_long_sentence_is_split_by_words(self):
+        text = " ".join(["từ"] * 500)
+        result = list(iter_text_chunks(text, max_tokens=50))
+        self.assertTrue(len(result) > 1)
+        self.assertEqual(" ".join(result), text)
         for chunk in result:
-            self.assertLessEqual(len(chunk), 20)
+            self.assertLessEqual(count_tokens(chunk), 50)
+
+    def test_vietnamese_abbreviation_is_not_a_boundary(self):
+        text = "Trường nằm ở TP. Hồ Chí Minh. Năm học mới bắt đầu."
+        self.assertEqual(list(iter_sentences(text)), ["Trường nằm ở TP. Hồ Chí Minh.", "Năm học mới bắt đầu."])
+
+    def test_sentences_across_pieces(self):
+        pieces = ["Câu một. Câu ", "hai chưa hết", " trang. Câu ba?"]
+        self.assertEqual(list(iter_sentences(pieces)), ["Câu một.", "Câu hai chưa hết trang.", "Câu ba?"])
 
 from unittest.mock import patch, MagicMock
 import json
 
-from .views import summarize_chunk 
+from .views import request_chunk_summary, chunk_index
 
 class TestSummarizeChunk(unittest.TestCase):
 
+    def setUp(self):
+        chunk_index.clear()
+
     @patch("api.views.client.chat.completions.create")  # 👉 mock OpenAI
     def test_successful_response(self, mock_create):
         # Giả lập response hợp lệ
@@ -451,7 +474,7 @@ class TestSummarizeChunk(unittest.TestCase):
         })
         mock_create.return_value = mock_response
 
-        title, summary = summarize_chunk("Đây là văn bản mẫu cần tóm tắt.")
+        title, summary = request_chunk_summary("Đây là văn bản mẫu cần tóm tắt.")
 
         self.assertEqual(title, "Tiêu đề mẫu")
         self.assertEqual(summary, "Đây là bản tóm tắt mẫu của văn bản.")
@@ -463,17 +486,794 @@ class TestSummarizeChunk(unittest.TestCase):
         mock_response.choices[0].message.content = "Không phải JSON"
         mock_create.return_value = mock_response
 
-        title, summary = summarize_chunk("Văn bản bất kỳ")
-
-        self.assertEqual(title, "")
-        self.assertEqual(summary, "Phản hồi từ AI không hợp lệ")
+        # ➜ Lỗi được ném cho nơi gọi (request_chunk_summaries bỏ đoạn đó đi)
+        with self.assertRaises(json.JSONDecodeError):
+            request_chunk_summary("Văn bản bất kỳ")
+        self.assertEqual(chunk_index.stats()["entries"], 0)
 
     @patch("api.views.client.chat.completions.create")
     def test_api_exception(self, mock_create):
         # Giả lập lỗi từ API
         mock_create.side_effect = Exception("Mạng lỗi")
 
-        title, summary = summarize_chunk("Văn bản bất kỳ")
+        with self.assertRaisesRegex(Exception, "Mạng lỗi"):
+            request_chunk_summary("Văn bản bất kỳ")
+
+import threading
+from .views import request_chunk_summaries, llm_cache
+
+class TestSummarizeChunks(unittest.TestCase):
+
+    def setUp(self):
+        chunk_index.clear()
+
+    def _fake_create(self, **kwargs):
+        prompt = kwargs["messages"][0]["content"]
+        chunk = prompt.split("Văn bản: ")[-1].strip()
+        if chunk == "Đoạn lỗi":
+            raise Exception("Mạng lỗi")
+        mock_response = MagicMock()
+        mock_response.choices[0].message.content = json.dumps({"title": chunk, "summary": f"Tóm tắt {chunk}"})
+        return mock_response
+
+    @patch("api.views.client.chat.completions.create")
+    def test_results_keep_chunk_order(self, mock_create):
+        mock_create.side_effect = self._fake_create
+        chunks = [f"Đoạn {i}" for i in range(6)]
+
+        results = request_chunk_summaries(chunks)
+
+        self.assertEqual([summary for _, summary in results], [f"Tóm tắt Đoạn {i}" for i in range(6)])
+
+    @patch("api.views.client.chat.completions.create")
+    def test_failed_chunk_is_isolated(self, mock_create):
+        mock_create.side_effect = self._fake_create
+
+        results = request_chunk_summaries(["Đoạn 1", "Đoạn lỗi", "Đoạn 3"])
+
+        self.assertEqual(results[0], ("Đoạn 1", "Tóm tắt Đoạn 1"))
+        self.assertIsNone(results[1])
+        self.assertEqual(results[2], ("Đoạn 3", "Tóm tắt Đoạn 3"))
+
+    @patch("api.views.client.chat.completions.create")
+    def test_chunks_run_concurrently(self, mock_create):
+        # 📌 Barrier chỉ mở khi cả 3 request cùng đang chạy, nếu chạy tuần tự sẽ bị timeout
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fake_create(**kwargs):
+            barrier.wait()
+            return self._fake_create(**kwargs)
+
+        mock_create.side_effect = fake_create
+
+        results = request_chunk_summaries(["Đoạn 1", "Đoạn 2", "Đoạn 3"])
+
+        self.assertEqual([summary for _, summary in results], ["Tóm tắt Đoạn 1", "Tóm tắt Đoạn 2", "Tóm tắt Đoạn 3"])
+
+
+from datetime import timedelta
+from django.utils import timezone
+from .cache import ContentCache
+from .models import CacheEntry
+
+class ContentCacheTests(TestCase):
+
+    def test_set_then_get_counts_hit_and_miss(self):
+        cache = ContentCache("test", max_entries=10)
+        self.assertIsNone(cache.get("k1"))
+
+        cache.set("k1", {"title": "A", "summary": "B"})
+
+        self.assertEqual(cache.get("k1"), {"title": "A", "summary": "B"})
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["entries"], 1)
+
+    def test_expired_entry_is_a_miss(self):
+        cache = ContentCache("test", ttl=60)
+        cache.set("k1", "giá trị")
+        CacheEntry.objects.filter(namespace="test", key="k1").update(
+            created_at=timezone.now() - timedelta(seconds=120)
+        )
+
+        self.assertIsNone(cache.get("k1"))
+        self.assertFalse(CacheEntry.objects.filter(namespace="test", key="k1").exists())
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ContentCache("test", max_entries=2)
+        cache.set("k1", 1)
+        cache.set("k2", 2)
+        CacheEntry.objects.filter(namespace="test", key="k1").update(last_accessed=timezone.now() - timedelta(minutes=5))
+        CacheEntry.objects.filter(namespace="test", key="k2").update(last_accessed=timezone.now() - timedelta(minutes=10))
+        cache.get("k2")  # ➜ k2 vừa được dùng, k1 thành entry cũ nhất
+
+        cache.set("k3", 3)
+
+        self.assertIsNone(cache.get("k1"))
+        self.assertEqual(cache.get("k2"), 2)
+        self.assertEqual(cache.get("k3"), 3)
+
+    def test_get_many_skips_missing_and_expired(self):
+        cache = ContentCache("test", ttl=60)
+        cache.set("k1", 1)
+        cache.set("k2", 2)
+        CacheEntry.objects.filter(namespace="test", key="k2").update(
+            created_at=timezone.now() - timedelta(seconds=120)
+        )
+
+        self.assertEqual(cache.get_many(["k1", "k2", "k3"]), {"k1": 1})
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_namespaces_are_isolated(self):
+        ContentCache("a").set("k", "từ a")
+        self.assertIsNone(ContentCache("b").get("k"))
+
+class LLMCacheViewTests(TestCase):
+
+    @patch("api.views.client.chat.completions.create")
+    def test_repeated_short_summary_skips_openai(self, mock_openai):
+        mock_response = MagicMock()
+        mock_response.choices[0].message.content = json.dumps({"title": "AI", "summary": "Tóm tắt"})
+        mock_openai.return_value = mock_response
+
+        for _ in range(2):
+            response = self.client.post(
+                "/summarize-text-short/",
+                data=json.dumps({"text": "Trí tuệ nhân tạo   là gì?"}),
+                content_type="application/json"
+            )
+            self.assertEqual(json.loads(response.content)["summary"], "Tóm tắt")
+
+        mock_openai.assert_called_once()
+
+        response = self.client.get("/llm-cache-stats/")
+        data = json.loads(response.content)
+        self.assertEqual(data["hits"], 1)
+        self.assertEqual(data["misses"], 1)
+
+class StreamingSummaryTests(TestCase):
+
+    def _stream_chunks(self, content, size=5):
+        chunks = []
+        for i in range(0, len(content), size):
+            chunk = MagicMock()
+            chunk.choices[0].delta.content = content[i:i + size]
+            chunks.append(chunk)
+        return iter(chunks)
+
+    def _events(self, response):
+        body = b"".join(response.streaming_content).decode("utf-8")
+        events = []
+        for block in body.strip().split("\n\n"):
+            event_line, data_line = block.split("\n")
+            events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+        return events
+
+    @patch("api.views.client.chat.completions.create")
+    def test_short_summary_streams_tokens_then_done(self, mock_openai):
+        content = json.dumps({"title": "AI", "summary": "Tóm tắt ngắn"}, ensure_ascii=False)
+        mock_openai.return_value = self._stream_chunks(content)
+
+        response = self.client.post(
+            "/summarize-text-short/",
+            data=json.dumps({"text": "Trí tuệ nhân tạo", "stream": True}),
+            content_type="application/json"
+        )
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = self._events(response)
+        self.assertTrue(mock_openai.call_args.kwargs["stream"])
+        tokens = "".join(data["content"] for event, data in events if event == "token")
+        self.assertEqual(tokens, content)
+        self.assertEqual(events[-1], ("done", {"status": "success", "title": "AI", "summary": "Tóm tắt ngắn"}))
+
+    @patch("api.views.client.chat.completions.create")
+    def test_hierarchical_stream_with_accept_header(self, mock_openai):
+        summary = {"title": "Chủ đề", "children": [{"title": "Ý 1"}]}
+        mock_openai.return_value = self._stream_chunks(f"```json\n{json.dumps(summary)}\n```")
+
+        response = self.client.post(
+            "/summarize/",
+            data=json.dumps({"text": "Nội dung", "mode": "basic"}),
+            content_type="application/json",
+            HTTP_ACCEPT="text/event-stream"
+        )
+
+        events = self._events(response)
+        self.assertEqual(events[-1], ("done", {"status": "success", "summary": summary, "mode": "basic"}))
+
+    @patch("api.views.client.chat.completions.create")
+    def test_stream_invalid_json_sends_error_event(self, mock_openai):
+        mock_openai.return_value = self._stream_chunks("không phải JSON")
+
+        response = self.client.post(
+            "/summarize-text-short/",
+            data=json.dumps({"text": "Nội dung khác", "stream": True}),
+            content_type="application/json"
+        )
+
+        event, data = self._events(response)[-1]
+        self.assertEqual(event, "error")
+        self.assertEqual(data["error"], "Phản hồi từ AI không phải JSON hợp lệ")
+
+import asyncio
+from django.test import SimpleTestCase
+from .views import parse_short_summary, stream_completion_async
+
+async def asgi_post(path, payload, on_body, headers=(), timeout=10):
+    """
+    Gửi POST thẳng vào ASGI app của project (như uvicorn), gọi on_body() mỗi khi một phần body được gửi đi.
+    Trả về toàn bộ body.
+    """
+    from luong_nghin_do.asgi import application
+
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-length", str(len(body)).encode()), *headers],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    requested = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # ➜ Client vẫn giữ kết nối cho tới khi nhận xong response
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    parts = []
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            parts.append(message["body"])
+            on_body()
+
+    try:
+        await asyncio.wait_for(application(scope, receive, send), timeout)
+    finally:
+        disconnected.set()
+    return b"".join(parts)
+
+class AsgiStreamingTests(SimpleTestCase):
+
+    @patch("api.views.llm_cache.aset")
+    @patch("api.views.llm_cache.aget", return_value=None)
+    @patch("api.views.get_async_client")
+    async def test_first_token_arrives_before_completion_ends(self, mock_get_client, mock_cache_get, mock_cache_set):
+        mock_client = mock_get_client.return_value
+        content = json.dumps({"title": "AI", "summary": "Tóm tắt ngắn"}, ensure_ascii=False)
+        first_sent = asyncio.Event()
+        sent_early = []
+
+        def chunk(text):
+            mock_chunk = MagicMock()
+            mock_chunk.choices[0].delta.content = text
+            return mock_chunk
+
+        async def stream():
+            yield chunk(content[:5])
+            # ➜ Model chỉ sinh tiếp khi token đầu đã tới client; nếu body bị gom lại thì chờ hết timeout
+            try:
+                await asyncio.wait_for(first_sent.wait(), 5)
+                sent_early.append(True)
+            except asyncio.TimeoutError:
+                sent_early.append(False)
+            yield chunk(content[5:])
+
+        mock_client.chat.completions.create = AsyncMock(side_effect=lambda **kwargs: stream())
+
+        body = await asgi_post(
+            "/summarize-text-short/",
+            {"text": "Trí tuệ nhân tạo", "stream": True},
+            first_sent.set,
+            headers=[(b"content-type", b"application/json")],
+        )
+
+        self.assertEqual(sent_early, [True])
+        self.assertTrue(mock_client.chat.completions.create.call_args.kwargs["stream"])
+        self.assertIn('event: done\ndata: {"status": "success", "title": "AI", "summary": "Tóm tắt ngắn"}', body.decode("utf-8"))
+        mock_cache_set.assert_awaited_once()
+
+    @patch("api.views.OPENAI_MAX_CONCURRENCY", 1)
+    @patch("api.views.llm_cache.aset")
+    @patch("api.views.llm_cache.aget", return_value=None)
+    @patch("api.views.get_async_client")
+    async def test_streams_share_concurrency_limit(self, mock_get_client, mock_cache_get, mock_cache_set):
+        mock_client = mock_get_client.return_value
+        in_flight, peak = 0, 0
+
+        async def stream():
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            for part in ['{"title": "AI", ', '"summary": "Tóm tắt"}']:
+                await asyncio.sleep(0.01)
+                mock_chunk = MagicMock()
+                mock_chunk.choices[0].delta.content = part
+                yield mock_chunk
+            in_flight -= 1
+
+        mock_client.chat.completions.create = AsyncMock(side_effect=lambda **kwargs: stream())
+
+        async def consume(cache_key):
+            return [event async for event in stream_completion_async(cache_key, {}, parse_short_summary, dict)]
+
+        results = await asyncio.gather(consume("a"), consume("b"))
+
+        # ➜ OPENAI_MAX_CONCURRENCY = 1: stream thứ hai chỉ bắt đầu khi stream đầu đã xong
+        self.assertEqual(peak, 1)
+        self.assertTrue(all(events[-1].startswith("event: done") for events in results))
+
+from unittest.mock import AsyncMock
+
+class AsyncViewsTests(TestCase):
+
+    @patch("api.views.get_async_client")
+    async def test_summarize_text_short_async(self, mock_get_client):
+        mock_client = mock_get_client.return_value
+        mock_response = MagicMock()
+        mock_response.choices[0].message.content = json.dumps({"title": "AI", "summary": "Tóm tắt async"})
+        mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
+
+        response = await self.async_client.post(
+            "/async/summarize-text-short/",
+            data=json.dumps({"text": "Văn bản async"}),
+            content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["summary"], "Tóm tắt async")
+
+    @patch("api.views.SUMMARY_CHUNK_TOKENS", 8)
+    @patch("api.views.get_async_client")
+    async def test_summarize_text_async_keeps_chunk_order(self, mock_get_client):
+        mock_client = mock_get_client.return_value
+        async def fake_create(**kwargs):
+            chunk = kwargs["messages"][0]["content"].split("Văn bản: ")[-1].strip()
+            mock_response = MagicMock()
+            mock_response.choices[0].message.content = json.dumps({"title": "", "summary": chunk.upper()})
+            return mock_response
+
+        mock_client.chat.completions.create = AsyncMock(side_effect=fake_create)
+
+        response = await self.async_client.post(
+            "/async/summarize-text/",
+            data=json.dumps({"text": "Câu một. Câu hai. Câu ba."}),
+            content_type="application/json"
+        )
+
+        self.assertEqual(json.loads(response.content)["summary"], "CÂU MỘT. CÂU HAI. CÂU BA.")
+        self.assertEqual(mock_client.chat.completions.create.await_count, 3)
+
+    @patch("api.views.get_async_client")
+    async def test_hierarchical_async_invalid_json_is_cleaned(self, mock_get_client):
+        mock_client = mock_get_client.return_value
+        mock_response = MagicMock()
+        mock_response.choices[0].message.content = "```json\nkhông phải JSON\n```"
+        mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
+
+        response = await self.async_client.post(
+            "/async/summarize/",
+            data=json.dumps({"text": "Văn bản hỏng"}),
+            content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(json.loads(response.content)["raw_response"], "không phải JSON")
+
+    @patch("api.views.OPENAI_MAX_CONCURRENCY", 2)
+    @patch("api.views.SUMMARY_CHUNK_TOKENS", 8)
+    @patch("api.views.get_async_client")
+    async def test_concurrency_limit_shared_between_requests(self, mock_get_client):
+        mock_client = mock_get_client.return_value
+        in_flight, peak = 0, 0
+
+        async def fake_create(**kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            chunk = kwargs["messages"][0]["content"].split("Văn bản: ")[-1].strip()
+            mock_response = MagicMock()
+            mock_response.choices[0].message.content = json.dumps({"title": "", "summary": chunk})
+            return mock_response
+
+        mock_client.chat.completions.create = AsyncMock(side_effect=fake_create)
+
+        responses = await asyncio.gather(*(
+            self.async_client.post(
+                "/async/summarize-text/",
+                data=json.dumps({"text": f"Bài {i} câu một. Bài {i} câu hai. Bài {i} câu ba."}),
+                content_type="application/json"
+            )
+            for i in range(2)
+        ))
+
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        self.assertGreater(mock_client.chat.completions.create.await_count, 2)
+        # ➜ Hai request dùng chung một semaphore: không bao giờ quá 2 lời gọi cùng lúc
+        self.assertEqual(peak, 2)
+
+    @patch("api.async_views.get_async_client")
+    async def test_chat_with_ai_async(self, mock_get_client):
+        mock_client = mock_get_client.return_value
+        chu_de = await ChuDe.objects.acreate(name_chu_de="Toán học", noi_dung="Phương trình bậc hai")
+        user = await UserDetail.objects.acreate(lastName="u", firstName="a", email="u@example.com", password="p")
+
+        mock_client.beta.threads.create = AsyncMock(return_value=MagicMock(id="thread_async"))
+        mock_client.beta.threads.messages.create = AsyncMock()
+        mock_client.beta.threads.runs.create = AsyncMock(return_value=MagicMock(id="run_async", status="completed"))
+        mock_message = MagicMock(role="assistant")
+        mock_message.content = [MagicMock(text=MagicMock(value="Câu trả lời async"))]
+        mock_client.beta.threads.messages.list = AsyncMock(return_value=MagicMock(data=[mock_message]))
+
+        response = await self.async_client.post(
+            "/async/chat-with-ai/",
+            data=json.dumps({"idUser": user.idUser, "idChuDe": chu_de.id, "message": "x = ?"}),
+            content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data["thread_id"], "thread_async")
+        self.assertEqual(data["response"], "Câu trả lời async")
+        mock_client.beta.threads.messages.list.assert_awaited_once_with(
+            thread_id="thread_async", run_id="run_async", order="desc", limit=1
+        )
+        danh_gia = await DanhGia.objects.aget(idChuDe=chu_de)
+        self.assertEqual(danh_gia.soCauHoi, 1)
+
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class OpenAIStubHandler(BaseHTTPRequestHandler):
+    """
+    Server OpenAI giả: mọi chat.completions trả về cùng một bản tóm tắt. Giữ kết nối (HTTP/1.1)
+    như API thật để client dùng lại kết nối trong pool.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content = json.dumps({"title": "AI", "summary": "Tóm tắt"})
+        body = json.dumps({
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class AsyncClientPerLoopTests(TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), OpenAIStubHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_sequential_async_requests_under_wsgi(self):
+        base_url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        with patch.dict(os.environ, {"OPENAI_BASE_URL": base_url}):
+            # ➜ Client test đồng bộ: mỗi request vào view async chạy trên một event loop mới (async_to_sync)
+            for i in range(2):
+                response = self.client.post(
+                    "/async/summarize-text-short/",
+                    data=json.dumps({"text": f"Văn bản {i}"}),
+                    content_type="application/json"
+                )
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertEqual(json.loads(response.content)["summary"], "Tóm tắt")
+
+from .views import wait_for_run, run_poll_intervals
+
+class WaitForRunTests(unittest.TestCase):
+
+    def test_poll_intervals_start_fast_and_back_off(self):
+        intervals = run_poll_intervals(start=0.1, factor=2, maximum=0.5)
+        self.assertEqual([next(intervals) for _ in range(5)], [0.1, 0.2, 0.4, 0.5, 0.5])
+
+    @patch("api.views.time.sleep")
+    @patch("api.views.client")
+    def test_returns_finished_run(self, mock_client, mock_sleep):
+        mock_client.beta.threads.runs.retrieve.side_effect = [
+            MagicMock(id="run_1", status="in_progress"),
+            MagicMock(id="run_1", status="completed"),
+        ]
+
+        run = wait_for_run("thread_1", MagicMock(id="run_1", status="queued"))
+
+        self.assertEqual(run.status, "completed")
+        self.assertEqual(mock_client.beta.threads.runs.retrieve.call_count, 2)
+        self.assertLess(mock_sleep.call_args_list[0].args[0], 1)
+
+    @patch("api.views.time.sleep")
+    @patch("api.views.client")
+    def test_timeout_cancels_run(self, mock_client, mock_sleep):
+        mock_client.beta.threads.runs.retrieve.return_value = MagicMock(id="run_1", status="in_progress")
+
+        with self.assertRaises(TimeoutError):
+            wait_for_run("thread_1", MagicMock(id="run_1", status="queued"), timeout=0)
+
+        mock_client.beta.threads.runs.cancel.assert_called_once_with(thread_id="thread_1", run_id="run_1")
+
+class ChatWithAiRunStatusTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.chu_de = ChuDe.objects.create(name_chu_de="Toán học", noi_dung="Giải phương trình bậc hai")
+
+    def _post(self):
+        payload = {"idUser": 1, "idChuDe": self.chu_de.id, "message": "Câu hỏi"}
+        return chat_with_ai(self.factory.post("/chat", data=json.dumps(payload), content_type="application/json"))
+
+    @patch("api.views.DanhGia.objects.get_or_create")
+    @patch("api.views.client")
+    def test_requires_action_cancels_run(self, mock_client, mock_get_or_create):
+        mock_get_or_create.return_value = (MagicMock(idThread="thread_1", soCauHoi=0), False)
+        mock_client.beta.threads.runs.create.return_value = MagicMock(id="run_1", status="requires_action")
+
+        response = self._post()
+
+        self.assertEqual(response.status_code, 500)
+        mock_client.beta.threads.runs.cancel.assert_called_once_with(thread_id="thread_1", run_id="run_1")
+
+    @patch("api.views.DanhGia.objects.get_or_create")
+    @patch("api.views.client")
+    def test_expired_run_returns_504(self, mock_client, mock_get_or_create):
+        mock_get_or_create.return_value = (MagicMock(idThread="thread_1", soCauHoi=0), False)
+        mock_client.beta.threads.runs.create.return_value = MagicMock(id="run_1", status="expired")
+
+        response = self._post()
+
+        self.assertEqual(response.status_code, 504)
+
+import itertools
+from .views import SUMMARY_MODES
+
+class SummarizeTextMapReduceTests(TestCase):
+
+    def setUp(self):
+        llm_cache.clear()
+        self.text = " ".join(f"Câu số {i} có nội dung." for i in range(8))
+
+    def _fake_create(self):
+        counter = itertools.count()
+        lock = threading.Lock()
+
+        def fake_create(**kwargs):
+            with lock:
+                n = next(counter)
+            mock_response = MagicMock()
+            mock_response.choices[0].message.content = json.dumps({"title": f"Tiêu đề {n}", "summary": f"Tóm tắt số {n}."})
+            return mock_response
+
+        return fake_create
+
+    @patch("api.views.SUMMARY_CHUNK_TOKENS", 12)
+    @patch("api.views.client.chat.completions.create")
+    def test_map_reduce_merges_level_by_level(self, mock_create):
+        mock_create.side_effect = self._fake_create()
+
+        response = self.client.post(
+            "/summarize-text/",
+            data=json.dumps({"text": self.text, "mode": "map_reduce"}),
+            content_type="application/json"
+        )
+
+        data = json.loads(response.content)
+        self.assertEqual(response.status_code, 200)
+        # 📌 8 đoạn -> 4 -> 2 -> 1: 3 tầng gộp, 8 + 4 + 2 + 1 lần gọi OpenAI
+        self.assertEqual(data["levels"], 3)
+        self.assertEqual(mock_create.call_count, 15)
+        self.assertEqual(data["summary"], "Tóm tắt số 14.")
+        self.assertEqual(data["title"], "Tiêu đề 14")
+
+    @patch("api.views.SUMMARY_CHUNK_TOKENS", 12)
+    @patch("api.views.client.chat.completions.create")
+    def test_concat_mode_joins_chunk_summaries(self, mock_create):
+        mock_create.side_effect = self._fake_create()
+
+        response = self.client.post(
+            "/summarize-text/",
+            data=json.dumps({"text": self.text}),
+            content_type="application/json"
+        )
+
+        data = json.loads(response.content)
+        self.assertEqual(mock_create.call_count, 8)
+        self.assertNotIn("levels", data)
+        self.assertEqual(data["title"], "Tóm tắt văn bản")
+
+    @patch("api.views.SUMMARY_CHUNK_TOKENS", 12)
+    @patch("api.views.client.chat.completions.create")
+    def test_failed_chunks_are_not_reduced(self, mock_create):
+        fake_create = self._fake_create()
+
+        def create(**kwargs):
+            if "Câu số 3 " in kwargs["messages"][0]["content"]:
+                raise Exception("OpenAI lỗi")
+            return fake_create(**kwargs)
+
+        mock_create.side_effect = create
+
+        response = self.client.post(
+            "/summarize-text/",
+            data=json.dumps({"text": self.text, "mode": "map_reduce"}),
+            content_type="application/json"
+        )
+
+        data = json.loads(response.content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["failed_chunks"], 1)
+        # ➜ Câu báo lỗi không được đưa vào các tầng gộp
+        for call in mock_create.call_args_list:
+            self.assertNotIn("Lỗi khi tóm tắt văn bản", call.kwargs["messages"][0]["content"])
+        self.assertNotIn("Lỗi", data["summary"])
+
+    @patch("api.views.SUMMARY_CHUNK_TOKENS", 12)
+    @patch("api.views.client.chat.completions.create")
+    def test_all_chunks_failed(self, mock_create):
+        mock_create.side_effect = Exception("OpenAI lỗi")
+
+        for mode in SUMMARY_MODES:
+            response = self.client.post(
+                "/summarize-text/",
+                data=json.dumps({"text": self.text, "mode": mode}),
+                content_type="application/json"
+            )
+            self.assertEqual(response.status_code, 500)
+            self.assertEqual(json.loads(response.content)["error"], "Không tóm tắt được văn bản")
+
+    def test_invalid_mode(self):
+        response = self.client.post(
+            "/summarize-text/",
+            data=json.dumps({"text": self.text, "mode": "abc"}),
+            content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+from concurrent.futures import ThreadPoolExecutor
+from django.test import TransactionTestCase
+
+# ➜ Bản tóm tắt được ghi vào llm_cache từ thread của openai_executor: cần commit thật để request sau đọc được
+from .views import chunk_index
+
+class IncrementalSummarizeTests(TransactionTestCase):
+
+    def setUp(self):
+        llm_cache.clear()
+        chunk_index.clear()
+        self.sentences = [f"Đây là câu số {i} nói về chủ đề học máy và dữ liệu {i * 7}." for i in range(300)]
+
+    def test_content_defined_chunks_localize_edits(self):
+        original = list(iter_text_chunks(" ".join(self.sentences), max_tokens=200, content_defined=True))
+        edited_sentences = list(self.sentences)
+        edited_sentences[150] = "Câu này đã được giáo viên sửa lại hoàn toàn."
+        edited = list(iter_text_chunks(" ".join(edited_sentences), max_tokens=200, content_defined=True))
+
+        changed = set(edited) - set(original)
+        self.assertTrue(len(original) > 5)
+        self.assertLessEqual(len(changed), 2)
+
+    @patch("api.views.SUMMARY_CHUNK_TOKENS", 200)
+    @patch("api.views.openai_executor", ThreadPoolExecutor(max_workers=1))  # ➜ SQLite không cho nhiều thread cùng ghi
+    @patch("api.views.client.chat.completions.create")
+    def test_resummarize_only_changed_chunks(self, mock_create):
+        mock_response = MagicMock()
+        mock_response.choices[0].message.content = json.dumps({"title": "T", "summary": "S"})
+        mock_create.return_value = mock_response
+
+        first = self.client.post(
+            "/summarize-text/",
+            data=json.dumps({"text": " ".join(self.sentences)}),
+            content_type="application/json"
+        )
+        first_data = json.loads(first.content)
+        self.assertEqual(first_data["reused_chunks"], 0)
+        self.assertEqual(mock_create.call_count, first_data["chunks"])
+
+        # 📌 Bản tóm tắt từng đoạn nằm trong chỉ mục riêng, không chiếm chỗ của llm_cache
+        self.assertEqual(chunk_index.stats()["entries"], first_data["chunks"])
+        self.assertEqual(llm_cache.stats()["entries"], 0)
+
+        # 📌 Sửa một câu rồi tóm tắt lại: các đoạn không đổi được lấy từ chunk_index bằng một truy vấn
+        llm_cache.clear()
+        mock_create.reset_mock()
+        self.sentences[150] = "Câu này đã được giáo viên sửa lại hoàn toàn."
+        second = self.client.post(
+            "/summarize-text/",
+            data=json.dumps({"text": " ".join(self.sentences)}),
+            content_type="application/json"
+        )
+        second_data = json.loads(second.content)
+
+        self.assertLessEqual(mock_create.call_count, 2)
+        self.assertEqual(second_data["reused_chunks"], second_data["chunks"] - mock_create.call_count)
+
+
+class SummarizeTextShortBatchTests(TestCase):
+
+    def setUp(self):
+        llm_cache.clear()
+        self.chu_de = ChuDe.objects.create(name_chu_de="Học máy", noi_dung="Nội dung về học máy.")
+
+    def post(self, payload):
+        return self.client.post(
+            "/summarize-text-short/batch/",
+            data=json.dumps(payload),
+            content_type="application/json"
+        )
+
+    def mock_reply(self, mock_create):
+        def reply(**kwargs):
+            text = kwargs["messages"][0]["content"]
+            if "lỗi" in text:
+                raise Exception("OpenAI lỗi")
+            response = MagicMock()
+            response.choices[0].message.content = json.dumps({"title": "Tiêu đề", "summary": "Tóm tắt"})
+            return response
+        mock_create.side_effect = reply
+
+    @patch("api.views.client.chat.completions.create")
+    def test_batch_texts_returns_results_in_order(self, mock_create):
+        self.mock_reply(mock_create)
+
+        response = self.post({"texts": ["Văn bản một.", "Văn bản  một.", "Văn bản gây lỗi.", ""]})
+        data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["total"], 4)
+        self.assertEqual(data["failed"], 2)
+        self.assertEqual([item["id"] for item in data["results"]], [0, 1, 2, 3])
+        self.assertEqual(data["results"][0]["summary"], "Tóm tắt")
+        self.assertEqual(data["results"][1]["status"], "success")
+        self.assertEqual(data["results"][2]["error"], "Lỗi khi tóm tắt văn bản")
+        self.assertEqual(data["results"][3]["error"], "Vui lòng nhập văn bản!")
+        # ➜ Hai văn bản chỉ khác khoảng trắng chỉ gửi OpenAI một lần
+        self.assertEqual(mock_create.call_count, 2)
+
+    @patch("api.views.client.chat.completions.create")
+    def test_batch_chu_de_ids(self, mock_create):
+        self.mock_reply(mock_create)
+
+        response = self.post({"chu_de_ids": [self.chu_de.id, 9999]})
+        data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["results"][0], {"id": self.chu_de.id, "status": "success", "title": "Tiêu đề", "summary": "Tóm tắt"})
+        self.assertEqual(data["results"][1]["error"], "Không tìm thấy chủ đề")
+
+    @patch("api.views.client.chat.completions.create")
+    def test_batch_chu_de_ids_as_strings(self, mock_create):
+        self.mock_reply(mock_create)
+
+        response = self.post({"chu_de_ids": [str(self.chu_de.id)]})
+        data = json.loads(response.content)
+
+        self.assertEqual(data["results"], [{"id": self.chu_de.id, "status": "success", "title": "Tiêu đề", "summary": "Tóm tắt"}])
+
+    def test_batch_rejects_non_integer_ids(self):
+        for ids in [["abc"], ["1.5"], [1.5], [True], [None]]:
+            response = self.post({"chu_de_ids": ids})
+            self.assertEqual(response.status_code, 400, ids)
+            self.assertEqual(json.loads(response.content)["error"], "chu_de_ids chỉ được chứa số nguyên")
 
-        self.assertEqual(title, "")
-        self.assertEqual(summary, "Lỗi khi tóm tắt văn bản")
\ No newline at end of file
+    def test_batch_validation(self):
+        self.assertEqual(self.post({}).status_code, 400)
+        self.assertEqual(self.post({"texts": []}).status_code, 400)
+        with patch("api.views.SUMMARY_BATCH_MAX_ITEMS", 2):
+            self.assertEqual(self.post({"texts": ["a", "b", "c"]}).status_code, 400)
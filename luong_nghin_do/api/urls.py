@@ -5,6 +5,11 @@ from .views import summarize_text_hierarchical, generate_exercises, summarize_te
 from .views import UserDetailViewSet, ChuDeViewSet, FileViewSet, DanhGiaViewSet
 from .views import check_user
 from .views import register_user
+from .views import llm_cache_stats, summarize_text_short_batch
+from .async_views import (
+    summarize_text_hierarchical_async, generate_exercises_async, summarize_text_async,
+    summarize_text_short_async, chat_with_ai_async,
+)
 router = DefaultRouter()
 router.register(r'users', UserDetailViewSet)
 router.register(r'chude', ChuDeViewSet)
@@ -19,5 +24,13 @@ urlpatterns = [
     path('generate-exercise/', generate_exercises, name='generate-exercise'),
     path('summarize-text/', summarize_text, name='summarize-text'),
     path('summarize-text-short/', summarize_text_short, name='summarize-text-short'),
+    path('summarize-text-short/batch/', summarize_text_short_batch, name='summarize-text-short-batch'),
     path('chat-with-ai/', chat_with_ai, name='chat-with-ai'),
+    path('llm-cache-stats/', llm_cache_stats, name='llm-cache-stats'),
+    # ⚡ Bản async (chạy qua ASGI để không giữ thread trong lúc chờ OpenAI)
+    path('async/summarize/', summarize_text_hierarchical_async, name='summarize-text-async'),
+    path('async/generate-exercise/', generate_exercises_async, name='generate-exercise-async'),
+    path('async/summarize-text/', summarize_text_async, name='summarize-text-full-async'),
+    path('async/summarize-text-short/', summarize_text_short_async, name='summarize-text-short-async'),
+    path('async/chat-with-ai/', chat_with_ai_async, name='chat-with-ai-async'),
 ]
\ No newline at end of file
@@ -1,14 +1,20 @@
 from rest_framework import viewsets
 from .models import UserDetail
 from .serializers import UserDetailSerializer
+from .cache import ContentCache, make_key, normalize_text
+from .chunking import iter_text_chunks, count_tokens
+from .streaming import is_asgi, streaming_response
 import openai
 import json
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+from django.db import close_old_connections
 import re
 import time
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from rest_framework.response import Response
 from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
 
@@ -19,27 +25,116 @@ class UserViewSet(viewsets.ModelViewSet):
     # 🔹 Khởi tạo client OpenAI theo chuẩn mới nhất
 client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
 
-@csrf_exempt
-def summarize_text_hierarchical(request):
+# 📌 Pool dùng chung trong process, giới hạn số request OpenAI chạy song song
+OPENAI_MAX_CONCURRENCY = getattr(settings, "OPENAI_MAX_CONCURRENCY", 8)
+openai_executor = ThreadPoolExecutor(max_workers=OPENAI_MAX_CONCURRENCY, thread_name_prefix="openai")
+
+OPENAI_MODEL = "gpt-4o-mini"
+
+# 📌 Cache kết quả LLM theo hash nội dung, dùng chung giữa các worker (lưu trong DB)
+llm_cache = ContentCache(
+    "llm",
+    max_entries=getattr(settings, "LLM_CACHE_MAX_ENTRIES", 5000),
+    ttl=getattr(settings, "LLM_CACHE_TTL", 7 * 24 * 3600),
+)
+
+# 📌 Chỉ mục bản tóm tắt từng đoạn cho tóm tắt tăng dần: namespace riêng, không hết hạn
+# và có giới hạn riêng để các API khác dùng llm_cache không đẩy các đoạn đã tóm tắt ra ngoài
+chunk_index = ContentCache(
+    "chunk",
+    max_entries=getattr(settings, "CHUNK_INDEX_MAX_ENTRIES", 100000),
+    ttl=None,
+)
+
+# 📌 Ngân sách token cho mỗi đoạn khi chia văn bản dài để tóm tắt
+SUMMARY_CHUNK_TOKENS = getattr(settings, "SUMMARY_CHUNK_TOKENS", 2000)
+
+# 📌 Chế độ map_reduce: gộp các bản tóm tắt đến khi còn một bản không quá số token này
+SUMMARY_TARGET_TOKENS = getattr(settings, "SUMMARY_TARGET_TOKENS", 500)
+SUMMARY_MAX_LEVELS = 8
+SUMMARY_MODES = ["concat", "map_reduce"]
+
+def llm_cache_key(prompt, kind, max_tokens, model=OPENAI_MODEL):
     """
-    API nhận văn bản dài từ request, gửi đến OpenAI và trả về JSON phân cấp.
-    Hỗ trợ 3 chế độ tóm tắt: basic, normal, detailed.
+    Khóa cache = hash(prompt đã chuẩn hóa, model, loại/chế độ, max_tokens).
     """
-    if request.method != "POST":
-        return JsonResponse({"error": "Invalid request method"}, status=400)
+    return make_key(normalize_text(prompt), model, kind, max_tokens)
 
-    try:
-        # 🔹 Lấy nội dung từ request
-        data = json.loads(request.body)
-        input_text = data.get("text", "").strip()
-        mode = data.get("mode", "normal").strip().lower()  # Default: normal
+def completion_kwargs(prompt, max_tokens, json_object=False):
+    """
+    Tham số gọi chat.completions.create cho một prompt (dùng chung cho bản sync, async và streaming).
+    """
+    kwargs = {"model": OPENAI_MODEL, "messages": [{"role": "user", "content": prompt}], "max_tokens": max_tokens}
+    if json_object:
+        kwargs["response_format"] = {"type": "json_object"}  # ✅ Định dạng đúng kiểu JSON
+    return kwargs
+
+# 📌 Đối tượng async gắn với event loop (kết nối httpx của AsyncOpenAI, asyncio.Semaphore) không dùng lại được
+# trên loop khác. Dưới ASGI cả process chạy một loop nên chúng được dùng chung giữa các request;
+# dưới WSGI / runserver mỗi request vào view async chạy trên một loop mới (async_to_sync).
+_async_clients = {}
+_openai_semaphores = {}
+
+def loop_local(registry, factory):
+    """
+    Đối tượng của event loop đang chạy trong registry, chưa có thì tạo bằng factory().
+    Đối tượng của các loop đã đóng được bỏ đi để registry không phình theo số request.
+    """
+    loop = asyncio.get_running_loop()
+    value = registry.get(loop)
+    if value is None:
+        for closed in [other for other in registry if other.is_closed()]:
+            del registry[closed]
+        value = registry[loop] = factory()
+    return value
+
+def get_async_client():
+    """
+    Client OpenAI bất đồng bộ của event loop đang chạy: khi chạy qua ASGI, request chờ OpenAI không chiếm thread nào.
+    """
+    return loop_local(_async_clients, lambda: openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY))
 
-        if not input_text:
-            return JsonResponse({"error": "Vui lòng nhập văn bản!"}, status=400)
+def openai_semaphore():
+    """
+    Giới hạn số request OpenAI async chạy cùng lúc (OPENAI_MAX_CONCURRENCY), dùng chung giữa các request của một loop.
+    """
+    return loop_local(_openai_semaphores, lambda: asyncio.Semaphore(OPENAI_MAX_CONCURRENCY))
 
-        # 📌 Chọn prompt tùy theo chế độ
-        if mode == "basic":
-            prompt = f"""
+def complete(cache_key, create_kwargs, parse, cache=None):
+    """
+    Một lời gọi OpenAI có cache: kết quả đã có trong cache (mặc định llm_cache) thì lấy luôn,
+    chưa có thì gọi, parse rồi lưu lại.
+    Lỗi OpenAI / json.JSONDecodeError được ném ra cho nơi gọi xử lý (e.doc là phản hồi đã bỏ dấu ```json).
+    """
+    cache = llm_cache if cache is None else cache
+    result = cache.get(cache_key)
+    if result is None:
+        response = client.chat.completions.create(**create_kwargs)
+        logger.info(f"🔹 Response từ AI: {response}")
+        result = parse(response.choices[0].message.content)
+        cache.set(cache_key, result)
+    return result
+
+async def complete_async(cache_key, create_kwargs, parse, cache=None):
+    """
+    Bản async của complete dùng get_async_client(), số lời gọi cùng lúc giới hạn bởi openai_semaphore().
+    """
+    cache = llm_cache if cache is None else cache
+    result = await cache.aget(cache_key)
+    if result is None:
+        async with openai_semaphore():
+            response = await get_async_client().chat.completions.create(**create_kwargs)
+        logger.info(f"🔹 Response từ AI: {response}")
+        result = parse(response.choices[0].message.content)
+        await cache.aset(cache_key, result)
+    return result
+
+def build_hierarchical_prompt(input_text, mode):
+    """
+    Tạo prompt tóm tắt phân cấp theo chế độ: basic, normal, detailed.
+    """
+    if mode == "basic":
+        return f"""
             Hãy tóm tắt nội dung sau theo cách ngắn gọn nhất, chỉ giữ lại những ý chính lớn.
             
             Nội dung:
@@ -56,8 +151,8 @@ def summarize_text_hierarchical(request):
             }}
             ```
             """
-        elif mode == "detailed":
-            prompt = f"""
+    elif mode == "detailed":
+        return f"""
             Hãy tóm tắt nội dung sau một cách chi tiết, có phân cấp đầy đủ, giải thích từng ý và đưa ví dụ nếu cần.
             
             Nội dung:
@@ -86,8 +181,8 @@ def summarize_text_hierarchical(request):
             }}
             ```
             """
-        else:  # Default: normal
-            prompt = f"""
+    else:  # Default: normal
+        return f"""
             Hãy tóm tắt nội dung sau theo dạng phân cấp, đầy đủ nhưng không quá chi tiết.
             
             Nội dung:
@@ -117,56 +212,174 @@ def summarize_text_hierarchical(request):
             ```
             """
 
-        # 📌 Gửi yêu cầu đến OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1500  # Giới hạn số token để đảm bảo phản hồi đầy đủ
-        )
+def hierarchical_completion(input_text, mode):
+    """
+    (cache_key, tham số gọi OpenAI) của API tóm tắt phân cấp.
+    """
+    prompt = build_hierarchical_prompt(input_text, mode)
+    return llm_cache_key(prompt, f"hierarchical:{mode}", 1500), completion_kwargs(prompt, 1500)
 
-        # 📌 Lấy nội dung phản hồi từ API
-        summary_json = response.choices[0].message.content.strip()
+def parse_json_response(content):
+    """
+    Bỏ dấu ```json ... ``` rồi chuyển phản hồi của OpenAI thành dictionary.
+    Ném json.JSONDecodeError nếu không phải JSON hợp lệ.
+    """
+    return json.loads(re.sub(r"```json|```", "", content.strip()).strip())
 
-        # 🔍 Loại bỏ dấu ```json ... ```
-        summary_json_cleaned = re.sub(r"```json|```", "", summary_json).strip()
+def invalid_json_response(error):
+    """
+    Response khi OpenAI trả về không đúng JSON, kèm phản hồi đã bỏ dấu ```json (error từ parse_json_response).
+    """
+    return JsonResponse({"error": "OpenAI trả về dữ liệu không đúng JSON", "raw_response": error.doc}, status=500)
 
-        # 📌 Chuyển kết quả từ chuỗi JSON về dạng Python dictionary
-        try:
-            summary_dict = json.loads(summary_json_cleaned)
-        except json.JSONDecodeError:
-            return JsonResponse({"error": "OpenAI trả về dữ liệu không đúng JSON", "raw_response": summary_json_cleaned}, status=500)
+def wants_stream(request, data):
+    """
+    Client bật chế độ streaming bằng "stream": true hoặc header Accept: text/event-stream.
+    """
+    return data.get("stream") is True or "text/event-stream" in request.headers.get("Accept", "")
 
-        return JsonResponse({"status": "success", "summary": summary_dict, "mode": mode}, json_dumps_params={'ensure_ascii': False})
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-    except json.JSONDecodeError:
-        return JsonResponse({"error": "Invalid JSON format"}, status=400)
+def stream_delta(chunk):
+    """
+    Phần nội dung mới trong một chunk streaming của OpenAI (None nếu chunk không có nội dung).
+    """
+    if not chunk.choices:
+        return None
+    return chunk.choices[0].delta.content
+
+def stream_error_event(error, parts):
+    """
+    Event "error" cho lỗi khi streaming, gọi trong khối except.
+    """
+    if isinstance(error, json.JSONDecodeError):
+        logger.error("⚠️ Phản hồi từ AI không phải JSON hợp lệ!")
+        return sse_event("error", {"error": "Phản hồi từ AI không phải JSON hợp lệ", "raw_response": "".join(parts)})
+    logger.exception(f"⚠️ Lỗi khi streaming từ OpenAI: {str(error)}")
+    return sse_event("error", {"error": str(error)})
+
+def stream_completion(cache_key, create_kwargs, parse, to_payload):
+    """
+    Generator Server-Sent Events cho một lời gọi OpenAI:
+    - "token": từng phần nội dung ngay khi model sinh ra.
+    - "done": kết quả JSON đã parse (giống response khi không streaming).
+    - "error": lỗi khi gọi OpenAI hoặc phản hồi không phải JSON hợp lệ.
+    """
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        yield sse_event("done", to_payload(cached))
+        return
+
+    parts = []
+    try:
+        stream = client.chat.completions.create(stream=True, **create_kwargs)
+        for chunk in stream:
+            delta = stream_delta(chunk)
+            if delta:
+                parts.append(delta)
+                yield sse_event("token", {"content": delta})
+
+        result = parse("".join(parts))
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        yield stream_error_event(e, parts)
+        return
+
+    llm_cache.set(cache_key, result)
+    yield sse_event("done", to_payload(result))
+
+async def stream_completion_async(cache_key, create_kwargs, parse, to_payload):
+    """
+    Bản async của stream_completion (cùng các event) dùng get_async_client(): dưới ASGI mỗi token được gửi ngay
+    mà không chiếm thread nào trong lúc chờ OpenAI. Tính vào giới hạn OPENAI_MAX_CONCURRENCY như complete_async.
+    """
+    cached = await llm_cache.aget(cache_key)
+    if cached is not None:
+        yield sse_event("done", to_payload(cached))
+        return
+
+    parts = []
+    try:
+        # ➜ Giữ một suất của openai_semaphore() suốt lúc stream, như mọi lời gọi OpenAI async khác
+        async with openai_semaphore():
+            stream = await get_async_client().chat.completions.create(stream=True, **create_kwargs)
+            async for chunk in stream:
+                delta = stream_delta(chunk)
+                if delta:
+                    parts.append(delta)
+                    yield sse_event("token", {"content": delta})
+
+        result = parse("".join(parts))
+    except Exception as e:
+        yield stream_error_event(e, parts)
+        return
+
+    await llm_cache.aset(cache_key, result)
+    yield sse_event("done", to_payload(result))
+
+def sse_response(request, events):
+    return streaming_response(request, events, "text/event-stream")
+
+def stream_completion_response(request, cache_key, create_kwargs, parse, to_payload):
+    """
+    Response SSE cho một lời gọi OpenAI: dưới ASGI dùng stream_completion_async, dưới WSGI dùng stream_completion.
+    """
+    stream = stream_completion_async if is_asgi(request) else stream_completion
+    return sse_response(request, stream(cache_key, create_kwargs, parse, to_payload))
 
 @csrf_exempt
-def generate_exercises(request):
+def summarize_text_hierarchical(request):
     """
-    API nhận văn bản và loại bài tập (multiple_choice, fill_in_the_blank, short_answer)
-    và tạo bài tập tương ứng.
+    API nhận văn bản dài từ request, gửi đến OpenAI và trả về JSON phân cấp.
+    Hỗ trợ 3 chế độ tóm tắt: basic, normal, detailed.
+    Gửi "stream": true (hoặc Accept: text/event-stream) để nhận kết quả dạng SSE.
     """
     if request.method != "POST":
         return JsonResponse({"error": "Invalid request method"}, status=400)
 
     try:
-        # 🔹 Nhận dữ liệu từ body JSON
+        # 🔹 Lấy nội dung từ request
         data = json.loads(request.body)
-        text = data.get("text", "").strip()
-        exercise_type = data.get("type", "").strip().lower()  # Loại bài tập
+        input_text = data.get("text", "").strip()
+        mode = data.get("mode", "normal").strip().lower()  # Default: normal
 
-        if not text:
-            return JsonResponse({"error": "Vui lòng nhập nội dung để tạo bài tập"}, status=400)
+        if not input_text:
+            return JsonResponse({"error": "Vui lòng nhập văn bản!"}, status=400)
 
-        if exercise_type not in ["multiple_choice", "fill_in_the_blank", "short_answer"]:
-            return JsonResponse({"error": "Loại bài tập không hợp lệ"}, status=400)
+        # 📌 Chọn prompt tùy theo chế độ
+        cache_key, create_kwargs = hierarchical_completion(input_text, mode)
+
+        # 📌 Chế độ streaming: trả từng token qua SSE
+        if wants_stream(request, data):
+            return stream_completion_response(
+                request,
+                cache_key,
+                create_kwargs,
+                parse_json_response,
+                lambda summary_dict: {"status": "success", "summary": summary_dict, "mode": mode},
+            )
+
+        # 📌 Văn bản đã tóm tắt trước đó thì lấy luôn từ cache, chưa có thì gửi đến OpenAI
+        try:
+            summary_dict = complete(cache_key, create_kwargs, parse_json_response)
+        except json.JSONDecodeError as e:
+            return invalid_json_response(e)
+
+        return JsonResponse({"status": "success", "summary": summary_dict, "mode": mode}, json_dumps_params={'ensure_ascii': False})
 
-        # 📌 Tạo prompt tương ứng với từng loại bài tập
-        if exercise_type == "multiple_choice":
-            prompt = f"""
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON format"}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+EXERCISE_TYPES = ["multiple_choice", "fill_in_the_blank", "short_answer"]
+
+def build_exercise_prompt(text, exercise_type):
+    """
+    Tạo prompt tương ứng với từng loại bài tập.
+    """
+    if exercise_type == "multiple_choice":
+        return f"""
             Tạo nhiều bài tập trắc nghiệm (multiple choice) dựa trên nội dung sau:
             
             {text}
@@ -183,8 +396,8 @@ def generate_exercises(request):
             Chỉ trả về JSON hợp lệ.
             """
 
-        elif exercise_type == "fill_in_the_blank":
-            prompt = f"""
+    elif exercise_type == "fill_in_the_blank":
+        return f"""
             Tạo nhiều bài tập điền vào chỗ trống (fill in the blank) dựa trên nội dung sau:
             
             {text}
@@ -200,8 +413,8 @@ def generate_exercises(request):
             Chỉ trả về JSON hợp lệ.
             """
 
-        elif exercise_type == "short_answer":
-            prompt = f"""
+    elif exercise_type == "short_answer":
+        return f"""
             Tạo nhiều câu hỏi tự luận ngắn (short answer) dựa trên nội dung sau:
             
             {text}
@@ -217,17 +430,37 @@ def generate_exercises(request):
             Chỉ trả về JSON hợp lệ.
             """
 
-        # 📌 Gửi yêu cầu lên OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500
-        )
+def exercise_completion(text, exercise_type):
+    """
+    (cache_key, tham số gọi OpenAI) của API tạo bài tập.
+    """
+    prompt = build_exercise_prompt(text, exercise_type)
+    return llm_cache_key(prompt, f"exercise:{exercise_type}", 500), completion_kwargs(prompt, 500)
+
+@csrf_exempt
+def generate_exercises(request):
+    """
+    API nhận văn bản và loại bài tập (multiple_choice, fill_in_the_blank, short_answer)
+    và tạo bài tập tương ứng.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+
+    try:
+        # 🔹 Nhận dữ liệu từ body JSON
+        data = json.loads(request.body)
+        text = data.get("text", "").strip()
+        exercise_type = data.get("type", "").strip().lower()  # Loại bài tập
+
+        if not text:
+            return JsonResponse({"error": "Vui lòng nhập nội dung để tạo bài tập"}, status=400)
 
-        # 🔹 Lấy kết quả từ OpenAI và xử lý JSON
-        exercises_json = response.choices[0].message.content.strip()
-        exercises_json_cleaned = re.sub(r"```json|```", "", exercises_json).strip()
-        exercises_dict = json.loads(exercises_json_cleaned)
+        if exercise_type not in EXERCISE_TYPES:
+            return JsonResponse({"error": "Loại bài tập không hợp lệ"}, status=400)
+
+        # 📌 Tạo prompt tương ứng với từng loại bài tập.
+        # Bài tập đã tạo cho cùng nội dung thì lấy từ cache, chưa có thì gửi lên OpenAI
+        exercises_dict = complete(*exercise_completion(text, exercise_type), parse_json_response)
 
         return JsonResponse({"status": "success", "exercise": exercises_dict}, json_dumps_params={'ensure_ascii': False})
 
@@ -241,24 +474,11 @@ import logging
 
 logger = logging.getLogger(__name__)  # 📌 Khởi tạo logger
 
-@csrf_exempt
-def summarize_text_short(request):
+def build_short_prompt(input_text):
     """
-    API nhận văn bản dài từ request, gửi đến OpenAI và trả về nội dung đã được tóm tắt.
+    Prompt tóm tắt ngắn + tạo tiêu đề.
     """
-    if request.method != "POST":
-        return JsonResponse({"error": "Invalid request method"}, status=400)
-
-    try:
-        # 📌 Lấy nội dung từ request
-        data = json.loads(request.body)
-        input_text = data.get("text", "").strip()
-
-        if not input_text:
-            return JsonResponse({"error": "Vui lòng nhập văn bản!"}, status=400)
-
-        # 📌 Prompt tóm tắt văn bản + tạo tiêu đề
-        prompt = f"""
+    return f"""
         Bạn là một chuyên gia tóm tắt. 
         Hãy tóm tắt nội dung sau đầy đủ ý chính, không bỏ qua thông tin quan trọng.
 
@@ -272,34 +492,66 @@ def summarize_text_short(request):
         Chỉ trả về JSON hợp lệ, không có văn bản nào khác.
         """
 
-        # 📌 Gửi yêu cầu đến OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=300,  # Giới hạn độ dài tóm tắt
-            response_format={"type": "json_object"}  # ✅ Định dạng đúng kiểu JSON
-        )
+def short_completion(input_text):
+    """
+    (cache_key, tham số gọi OpenAI) của API tóm tắt ngắn.
+    """
+    prompt = build_short_prompt(input_text)
+    return llm_cache_key(prompt, "short", 300), completion_kwargs(prompt, 300, json_object=True)
 
-        # 📌 Ghi log phản hồi gốc từ OpenAI
-        logger.info(f"🔹 Response từ AI: {response}")
+def parse_short_summary(content):
+    """
+    Lấy title, summary từ phản hồi JSON của OpenAI. Ném json.JSONDecodeError nếu không hợp lệ.
+    """
+    parsed_data = json.loads(content)
+    return {
+        "title": parsed_data.get("title", "").strip(),
+        "summary": parsed_data.get("summary", "").strip(),
+    }
 
-        # 📌 Lấy nội dung phản hồi (chuỗi JSON)
-        response_data = response.choices[0].message.content
-        logger.info(f"🔹 Nội dung phản hồi AI: {response_data}")  # Log chi tiết phản hồi
+def request_short_summary(input_text):
+    """
+    Tóm tắt ngắn + tạo tiêu đề cho một văn bản, trả về {"title", "summary"}.
+    Văn bản đã tóm tắt trước đó thì lấy luôn từ cache. Lỗi OpenAI / JSON được ném ra cho nơi gọi xử lý.
+    """
+    return complete(*short_completion(input_text), parse_short_summary)
+
+@csrf_exempt
+def summarize_text_short(request):
+    """
+    API nhận văn bản dài từ request, gửi đến OpenAI và trả về nội dung đã được tóm tắt.
+    Gửi "stream": true (hoặc Accept: text/event-stream) để nhận kết quả dạng SSE.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+
+    try:
+        # 📌 Lấy nội dung từ request
+        data = json.loads(request.body)
+        input_text = data.get("text", "").strip()
+
+        if not input_text:
+            return JsonResponse({"error": "Vui lòng nhập văn bản!"}, status=400)
+
+        # 📌 Chế độ streaming: trả từng token qua SSE
+        if wants_stream(request, data):
+            return stream_completion_response(
+                request,
+                *short_completion(input_text),
+                parse_short_summary,
+                lambda result: {"status": "success", **result},
+            )
 
-        # 📌 Chuyển chuỗi JSON thành dictionary
         try:
-            parsed_data = json.loads(response_data)
-            title = parsed_data.get("title", "").strip()
-            summary = parsed_data.get("summary", "").strip()
+            result = request_short_summary(input_text)
         except json.JSONDecodeError:
             logger.error("⚠️ Phản hồi từ AI không phải JSON hợp lệ!")  # Ghi log lỗi
             return JsonResponse({"error": "Phản hồi từ AI không phải JSON hợp lệ"}, status=500)
 
         return JsonResponse({
             "status": "success",
-            "title": title,
-            "summary": summary
+            "title": result["title"],
+            "summary": result["summary"]
         }, json_dumps_params={'ensure_ascii': False})
 
     except json.JSONDecodeError:
@@ -308,10 +560,186 @@ def summarize_text_short(request):
     except Exception as e:
         logger.exception(f"⚠️ Lỗi không xác định: {str(e)}")  # Ghi log lỗi chi tiết
         return JsonResponse({"error": str(e)}, status=500)
+
+SUMMARY_BATCH_MAX_ITEMS = getattr(settings, "SUMMARY_BATCH_MAX_ITEMS", 100)
+
+def load_batch_items(data):
+    """
+    Lấy danh sách cần tóm tắt từ body: "texts" (danh sách văn bản) hoặc "chu_de_ids" (id các ChuDe).
+    Trả về list các (id, văn bản); văn bản None nghĩa là không tìm thấy chủ đề.
+    """
+    if "chu_de_ids" in data:
+        ids = data["chu_de_ids"]
+        if not isinstance(ids, list):
+            raise ValueError("chu_de_ids phải là danh sách")
+        # ➜ Id gửi dạng chuỗi ("5") vẫn được nhận, khóa trả về từ DB là số nguyên
+        if any(isinstance(chu_de_id, bool) or not isinstance(chu_de_id, (int, str)) for chu_de_id in ids):
+            raise ValueError("chu_de_ids chỉ được chứa số nguyên")
+        try:
+            ids = [int(chu_de_id) for chu_de_id in ids]
+        except ValueError:
+            raise ValueError("chu_de_ids chỉ được chứa số nguyên")
+        contents = dict(ChuDe.objects.filter(id__in=ids).values_list("id", "noi_dung"))
+        return [(chu_de_id, contents.get(chu_de_id)) for chu_de_id in ids]
+
+    texts = data.get("texts")
+    if not isinstance(texts, list):
+        raise ValueError("Vui lòng gửi danh sách texts hoặc chu_de_ids!")
+    return [(index, text if isinstance(text, str) else "") for index, text in enumerate(texts)]
+
+def summarize_short_batch(items):
+    """
+    Tóm tắt ngắn nhiều văn bản qua openai_executor (giới hạn OPENAI_MAX_CONCURRENCY, dùng chung
+    client/connection pool). Văn bản trùng nhau chỉ gửi một lần. Lỗi ở một mục không ảnh hưởng mục khác.
+    """
+    futures = {}
+    for _, text in items:
+        key = normalize_text(text) if text else ""
+        if key and key not in futures:
+            futures[key] = openai_executor.submit(run_in_worker, request_short_summary, text.strip())
+
+    results = []
+    for item_id, text in items:
+        if text is None:
+            results.append({"id": item_id, "status": "error", "error": "Không tìm thấy chủ đề"})
+            continue
+        key = normalize_text(text)
+        if not key:
+            results.append({"id": item_id, "status": "error", "error": "Vui lòng nhập văn bản!"})
+            continue
+        try:
+            result = futures[key].result()
+            results.append({"id": item_id, "status": "success", "title": result["title"], "summary": result["summary"]})
+        except json.JSONDecodeError:
+            results.append({"id": item_id, "status": "error", "error": "Phản hồi từ AI không phải JSON hợp lệ"})
+        except Exception as e:
+            logger.exception(f"⚠️ Lỗi khi tóm tắt mục {item_id}: {str(e)}")
+            results.append({"id": item_id, "status": "error", "error": "Lỗi khi tóm tắt văn bản"})
+    return results
+
+@csrf_exempt
+def summarize_text_short_batch(request):
+    """
+    API tóm tắt ngắn nhiều văn bản trong một request, thay cho việc gọi summarize-text-short/ nhiều lần.
+    Body: {"texts": ["...", ...]} hoặc {"chu_de_ids": [1, 2, ...]}.
+    Trả về kết quả / lỗi của từng mục theo đúng thứ tự gửi lên.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+
+    try:
+        data = json.loads(request.body)
+        items = load_batch_items(data)
+
+        if not items:
+            return JsonResponse({"error": "Danh sách cần tóm tắt đang trống!"}, status=400)
+        if len(items) > SUMMARY_BATCH_MAX_ITEMS:
+            return JsonResponse({"error": f"Tối đa {SUMMARY_BATCH_MAX_ITEMS} mục mỗi lần"}, status=400)
+
+        results = summarize_short_batch(items)
+        failed = sum(1 for result in results if result["status"] == "error")
+
+        return JsonResponse({
+            "status": "success",
+            "total": len(results),
+            "failed": failed,
+            "results": results,
+        }, json_dumps_params={'ensure_ascii': False})
+
+    except json.JSONDecodeError:
+        logger.error("⚠️ Lỗi JSON từ request!")
+        return JsonResponse({"error": "Invalid JSON format"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        logger.exception(f"⚠️ Lỗi không xác định: {str(e)}")
+        return JsonResponse({"error": str(e)}, status=500)
       
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)      
       
+def build_chat_context(chu_de):
+    """
+    Tin nhắn mở đầu thread: giới hạn gia sư trong phạm vi chủ đề.
+    """
+    return f"""
+            Bạn là một gia sư thông minh, hỗ trợ sinh viên về chủ đề: {chu_de.name_chu_de}.
+            Nội dung chủ đề: {chu_de.noi_dung}
+
+            ✅ Trả lời NGẮN GỌN, tối đa 2-3 câu.
+            ✅ Không lan man, chỉ nói về chủ đề này.
+            ✅ Nếu câu hỏi nằm ngoài phạm vi chủ đề, hãy từ chối trả lời.
+            
+            📌 Sau khi sinh viên hỏi 4 câu, hãy đưa ra nhận xét:
+            - Điểm mạnh trong câu trả lời của sinh viên.
+            - Nội dung còn yếu cần cải thiện.
+            - Mức độ tiến bộ so với trước.
+            - Động viên và hướng dẫn cách cải thiện.
+            """
+
+# ⏳ Trạng thái run còn đang chạy, và thời gian chờ tối đa (giây)
+RUN_PENDING_STATUSES = ["queued", "in_progress", "cancelling"]
+OPENAI_RUN_TIMEOUT = getattr(settings, "OPENAI_RUN_TIMEOUT", 60)
+
+def run_poll_intervals(start=0.1, factor=1.5, maximum=1.0):
+    """
+    Khoảng chờ giữa các lần kiểm tra run: bắt đầu nhanh rồi giãn dần, tối đa `maximum` giây.
+    """
+    delay = start
+    while True:
+        yield delay
+        delay = min(delay * factor, maximum)
+
+def wait_for_run(thread_id, run, timeout=OPENAI_RUN_TIMEOUT):
+    """
+    Chờ run của Assistant kết thúc bằng polling thích ứng.
+    Quá `timeout` giây thì hủy run và ném TimeoutError.
+    """
+    deadline = time.monotonic() + timeout
+    intervals = run_poll_intervals()
+    while run.status in RUN_PENDING_STATUSES:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            cancel_run(thread_id, run.id)
+            raise TimeoutError(f"Run {run.id} chưa xong sau {timeout} giây")
+        time.sleep(min(next(intervals), remaining))
+        run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+    return run
+
+def cancel_run(thread_id, run_id):
+    try:
+        client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except Exception as e:
+        logger.warning(f"⚠️ Không hủy được run {run_id}: {str(e)}")
+
+def run_error_response(run):
+    """
+    Chuyển trạng thái kết thúc của run thành JsonResponse lỗi, None nếu run đã completed.
+    """
+    if run.status == "completed":
+        return None
+    if run.status == "failed":
+        error_message = run.last_error.message if hasattr(run.last_error, "message") else "Không có chi tiết lỗi."
+        return JsonResponse({"error": f"AI không thể xử lý yêu cầu! Chi tiết: {error_message}"}, status=500)
+    if run.status == "requires_action":
+        return JsonResponse({"error": "AI yêu cầu gọi công cụ không được hỗ trợ"}, status=500)
+    if run.status == "expired":
+        return JsonResponse({"error": "AI phản hồi quá thời gian cho phép"}, status=504)
+    if run.status == "cancelled":
+        return JsonResponse({"error": "Yêu cầu tới AI đã bị hủy"}, status=500)
+    if run.status == "incomplete":
+        reason = getattr(run.incomplete_details, "reason", None) or "Không có chi tiết lỗi."
+        return JsonResponse({"error": f"AI trả lời chưa hoàn chỉnh! Chi tiết: {reason}"}, status=500)
+    return JsonResponse({"error": f"Trạng thái run không hợp lệ: {run.status}"}, status=500)
+
+FEEDBACK_MESSAGE = """
+            Đánh giá tổng quan sau 4 câu hỏi:
+            - Điểm mạnh trong câu trả lời của sinh viên.
+            - Nội dung còn yếu cần cải thiện.
+            - Mức độ tiến bộ so với trước.
+            - Động viên và hướng dẫn cách cải thiện.
+            """
+
 @csrf_exempt
 def chat_with_ai(request):
     if request.method != "POST":
@@ -347,25 +775,10 @@ def chat_with_ai(request):
             danh_gia.save()
 
             # 🏷 Gửi tin nhắn SYSTEM với nội dung chủ đề
-            context_message = f"""
-            Bạn là một gia sư thông minh, hỗ trợ sinh viên về chủ đề: {chu_de.name_chu_de}.
-            Nội dung chủ đề: {chu_de.noi_dung}
-
-            ✅ Trả lời NGẮN GỌN, tối đa 2-3 câu.
-            ✅ Không lan man, chỉ nói về chủ đề này.
-            ✅ Nếu câu hỏi nằm ngoài phạm vi chủ đề, hãy từ chối trả lời.
-            
-            📌 Sau khi sinh viên hỏi 4 câu, hãy đưa ra nhận xét:
-            - Điểm mạnh trong câu trả lời của sinh viên.
-            - Nội dung còn yếu cần cải thiện.
-            - Mức độ tiến bộ so với trước.
-            - Động viên và hướng dẫn cách cải thiện.
-            """
-
             client.beta.threads.messages.create(
                 thread_id=thread.id,
                 role="assistant",
-                content=context_message
+                content=build_chat_context(chu_de)
             )
 
         thread_id = danh_gia.idThread  # 📌 Lấy thread_id hiện tại
@@ -373,18 +786,10 @@ def chat_with_ai(request):
         # 📌 Kiểm tra số câu hỏi để quyết định có nhận xét hay không
         if danh_gia.soCauHoi >= 4:
             # 🎯 Yêu cầu AI đánh giá sinh viên
-            feedback_message = """
-            Đánh giá tổng quan sau 4 câu hỏi:
-            - Điểm mạnh trong câu trả lời của sinh viên.
-            - Nội dung còn yếu cần cải thiện.
-            - Mức độ tiến bộ so với trước.
-            - Động viên và hướng dẫn cách cải thiện.
-            """
-            
             client.beta.threads.messages.create(
                 thread_id=thread_id,
                 role="user",
-                content=feedback_message
+                content=FEEDBACK_MESSAGE
             )
 
             danh_gia.soCauHoi = 0  # 🔄 Reset số câu hỏi sau khi đánh giá
@@ -408,16 +813,23 @@ def chat_with_ai(request):
         )
 
         # ⏳ Chờ phản hồi từ AI
-        while run.status in ["queued", "in_progress"]:
-            time.sleep(1)
-            run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+        try:
+            run = wait_for_run(thread_id, run)
+        except TimeoutError:
+            return JsonResponse({"error": "AI phản hồi quá thời gian cho phép"}, status=504)
 
-        if run.status == "failed":
-            error_message = run.last_error.message if hasattr(run.last_error, "message") else "Không có chi tiết lỗi."
-            return JsonResponse({"error": f"AI không thể xử lý yêu cầu! Chi tiết: {error_message}"}, status=500)
+        if run.status == "requires_action":
+            # 🔹 Assistant này không dùng tool, hủy run để thread không bị khóa
+            cancel_run(thread_id, run.id)
 
-        # 📌 Lấy phản hồi AI
-        messages = client.beta.threads.messages.list(thread_id=thread_id)
+        error_response = run_error_response(run)
+        if error_response is not None:
+            return error_response
+
+        # 📌 Lấy phản hồi AI: chỉ tin nhắn mới nhất của run vừa chạy, không tải cả thread
+        messages = client.beta.threads.messages.list(
+            thread_id=thread_id, run_id=run.id, order="desc", limit=1
+        )
         ai_messages = [msg for msg in messages.data if msg.role == "assistant"]
         if not ai_messages:
             return JsonResponse({"error": "AI không phản hồi!"}, status=500)
@@ -493,33 +905,11 @@ def register_user(request):
 
     return Response({'message': 'Đăng ký thành công', 'id': user.idUser}, status=201)
 
-def split_text(text, max_length=1000):
-    """
-    Chia văn bản thành các đoạn nhỏ để tránh bị cắt khi tóm tắt.
-    """
-    if not text.strip():
-        return []
-
-    sentences = text.split('. ')
-    chunks, chunk = [], ""
-    for i, sentence in enumerate(sentences):
-        # Thêm dấu chấm nếu không phải câu cuối cùng do split đã loại bỏ
-        if i < len(sentences) - 1:
-            sentence += "."
-        if len(chunk) + len(sentence) + 1 <= max_length:
-            chunk += sentence + " "
-        else:
-            chunks.append(chunk.strip())
-            chunk = sentence + " "
-    if chunk.strip():
-        chunks.append(chunk.strip())
-    return chunks
-
-def summarize_chunk(text_chunk):
+def build_chunk_prompt(text_chunk):
     """
-    Gửi đoạn văn bản nhỏ đến OpenAI để tóm tắt.
+    Prompt tóm tắt một đoạn văn bản nhỏ.
     """
-    prompt = f"""
+    return f"""
     Bạn là một chuyên gia ngôn ngữ. Hãy tóm tắt văn bản sau một cách súc tích nhưng giữ nguyên các ý chính quan trọng.
 
     📌 **Yêu cầu:**
@@ -535,33 +925,208 @@ def summarize_chunk(text_chunk):
     Văn bản: {text_chunk}
     """
 
+def request_chunk_summary(text_chunk):
+    """
+    Gọi OpenAI tóm tắt một đoạn (có cache), trả về (title, summary).
+    Ném lỗi nếu OpenAI lỗi hoặc phản hồi không phải JSON hợp lệ.
+    """
+    # 📌 Đoạn văn bản đã tóm tắt trước đó thì lấy luôn từ chỉ mục
+    result = complete(*chunk_completion(text_chunk), parse_short_summary, cache=chunk_index)
+    return result["title"], result["summary"]
+
+def run_in_worker(func, *args):
+    """
+    Chạy task trong thread của openai_executor. Thread này không đi qua vòng đời request
+    nên phải tự dọn kết nối DB (cache dùng DB) trước và sau mỗi task.
+    """
+    close_old_connections()
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1000,  # Tăng giới hạn để tóm tắt tốt hơn
-            response_format={"type": "json_object"}
-        )
+        return func(*args)
+    finally:
+        close_old_connections()
 
-        # 📌 Ghi log phản hồi
-        logger.info(f"🔹 Response từ AI: {response}")
+def request_chunk_summaries(text_chunks):
+    """
+    Tóm tắt song song các đoạn văn bản qua openai_executor, kết quả giữ đúng thứ tự các đoạn.
+    Lỗi ở một đoạn không ảnh hưởng các đoạn khác: đoạn lỗi trả về None để nơi gọi bỏ đoạn đó đi.
+    """
+    futures = [openai_executor.submit(run_in_worker, request_chunk_summary, chunk) for chunk in text_chunks]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.exception(f"⚠️ Lỗi khi tóm tắt đoạn văn bản: {str(e)}")
+            results.append(None)
+    return results
+
+def chunk_cache_key(text_chunk):
+    """
+    Khóa trong chunk_index của bản tóm tắt một đoạn.
+    """
+    return llm_cache_key(build_chunk_prompt(text_chunk), "chunk", 1000)
 
-        # 📌 Lấy nội dung phản hồi JSON
-        response_data = response.choices[0].message.content
-        parsed_data = json.loads(response_data)
+def chunk_completion(text_chunk):
+    """
+    (cache_key, tham số gọi OpenAI) khi tóm tắt một đoạn.
+    """
+    return chunk_cache_key(text_chunk), completion_kwargs(build_chunk_prompt(text_chunk), 1000, json_object=True)
 
-        return parsed_data.get("title", "").strip(), parsed_data.get("summary", "").strip()
+def load_chunk_summaries(keys):
+    """
+    Đọc các bản tóm tắt đoạn đã có trong chunk_index bằng một truy vấn, trả về dict khóa -> (title, summary).
+    """
+    return {key: (value["title"], value["summary"]) for key, value in chunk_index.get_many(keys).items()}
+
+def missing_chunks(keys, text_chunks, known):
+    """
+    Các đoạn chưa có bản tóm tắt (khóa -> đoạn), đoạn trùng nội dung chỉ lấy một lần.
+    """
+    missing = {}
+    for key, chunk in zip(keys, text_chunks):
+        if key not in known:
+            missing.setdefault(key, chunk)
+    return missing
+
+def summarize_chunks_incremental(text_chunks, on_progress=None):
+    """
+    Tóm tắt các đoạn nhưng chỉ gọi OpenAI cho những đoạn chưa có bản tóm tắt trong chunk_index
+    (sửa một đoạn văn thì chỉ tóm tắt lại đoạn đó). Trả về (kết quả theo thứ tự, số đoạn dùng lại),
+    đoạn tóm tắt lỗi có kết quả là None.
+    on_progress(done, total) được gọi mỗi khi xong thêm một đoạn.
+    """
+    keys = [chunk_cache_key(chunk) for chunk in text_chunks]
+    known = load_chunk_summaries(keys)
+    reused = sum(1 for key in keys if key in known)
+
+    # 📌 Các đoạn mới được tóm tắt song song (request_chunk_summary tự ghi vào chunk_index)
+    pending = {
+        key: openai_executor.submit(run_in_worker, request_chunk_summary, chunk)
+        for key, chunk in missing_chunks(keys, text_chunks, known).items()
+    }
+
+    for done, (key, future) in enumerate(pending.items(), start=1):
+        try:
+            known[key] = future.result()
+        except Exception as e:
+            logger.exception(f"⚠️ Lỗi khi tóm tắt đoạn văn bản: {str(e)}")
+        if on_progress is not None:
+            on_progress(done, len(pending))
+
+    results = [known.get(key) for key in keys]
+    return results, reused
+
+def plan_reduce_level(summaries, target_tokens=None, max_tokens=None):
+    """
+    Nhóm các bản tóm tắt của một tầng để tóm tắt lại ở tầng kế tiếp (map-reduce).
+    Trả về None khi chỉ còn một bản tóm tắt đủ ngắn.
+    """
+    target_tokens = target_tokens or SUMMARY_TARGET_TOKENS
+    max_tokens = max_tokens or SUMMARY_CHUNK_TOKENS
+    if len(summaries) <= 1 and (not summaries or count_tokens(summaries[0]) <= target_tokens):
+        return None
+
+    groups = list(iter_text_chunks("\n".join(summaries), max_tokens=max_tokens))
+    if len(summaries) > 1 and len(groups) >= len(summaries):
+        # 🔹 Các bản tóm tắt quá dài để gom theo ngân sách, ghép từng cặp để tầng sau chắc chắn ít hơn
+        groups = ["\n".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+    return groups
+
+def reduce_steps(summaries):
+    """
+    Các bước gộp tóm tắt theo cây, dùng chung cho bản sync và async: yield các nhóm của một tầng,
+    nhận lại kết quả tóm tắt qua send() (nhóm lỗi là None), kết thúc trả về (title, summary, levels, số nhóm lỗi).
+    """
+    title, levels, failed = "", 0, 0
+    summaries = [summary for summary in summaries if summary]
+
+    while levels < SUMMARY_MAX_LEVELS:
+        groups = plan_reduce_level(summaries)
+        if groups is None:
+            break
+
+        results = yield groups
+        levels += 1
+        succeeded = [result for result in results if result is not None]
+        failed += len(results) - len(succeeded)
+        if not succeeded:
+            raise RuntimeError("Không tóm tắt được văn bản")
+
+        reduced = [summary for _, summary in succeeded]
+        if len(reduced) == 1:
+            title = succeeded[0][0]
+            if len(summaries) == 1 and count_tokens(reduced[0]) >= count_tokens(summaries[0]):
+                break  # ➜ Tóm tắt lại không ngắn hơn, dừng để tránh lặp vô hạn
+        summaries = reduced
+
+    return title, " ".join(summaries), levels, failed
+
+def reduce_summaries(summaries):
+    """
+    Gộp các bản tóm tắt theo cây: mỗi tầng tóm tắt lại các nhóm song song,
+    nên số tầng (và độ trễ) tăng theo log(độ dài văn bản). Trả về (title, summary, levels, số nhóm lỗi).
+    Nhóm tóm tắt lỗi bị bỏ khỏi tầng kế tiếp; cả tầng đều lỗi thì ném RuntimeError.
+    """
+    steps = reduce_steps(summaries)
+    try:
+        groups = next(steps)
+        while True:
+            groups = steps.send(request_chunk_summaries(groups))
+    except StopIteration as done:
+        return done.value
+
+def split_document(input_text):
+    """
+    Chia nhỏ theo ngân sách token, không cắt giữa câu.
+    Ranh giới đoạn theo nội dung nên sửa một chỗ chỉ làm thay đổi các đoạn quanh chỗ sửa.
+    """
+    return list(iter_text_chunks(input_text, max_tokens=SUMMARY_CHUNK_TOKENS, content_defined=True))
+
+def chunk_summaries(text_chunks, results, reused):
+    """
+    Các bản tóm tắt đoạn thành công (theo thứ tự) và thống kê; không đoạn nào thành công thì ném RuntimeError.
+    """
+    summaries = [result[1] for result in results if result is not None]
+    if not summaries:
+        raise RuntimeError("Không tóm tắt được văn bản")
+    return summaries, {"chunks": len(text_chunks), "reused_chunks": reused, "failed_chunks": len(results) - len(summaries)}
+
+def document_result(summaries, stats, reduced=None):
+    """
+    Kết quả tóm tắt văn bản: reduced là kết quả của reduce_summaries (map_reduce), None thì nối các bản tóm tắt.
+    """
+    if reduced is not None:
+        title, final_summary, levels, failed_groups = reduced
+        return {
+            "title": title or "Tóm tắt văn bản", "summary": final_summary, "levels": levels,
+            "failed_groups": failed_groups, **stats,
+        }
+
+    # 📌 Gộp các đoạn tóm tắt thành một đoạn hoàn chỉnh
+    return {"title": "Tóm tắt văn bản", "summary": " ".join(summaries), **stats}
+
+def summarize_document(input_text, mode="concat", on_progress=None):
+    """
+    Tóm tắt văn bản dài: chia đoạn theo ngân sách token, tóm tắt song song rồi gộp.
+    - concat: nối các bản tóm tắt theo thứ tự.
+    - map_reduce: gộp các bản tóm tắt theo cây đến khi còn một bản ngắn.
+    Đoạn tóm tắt lỗi bị bỏ qua và được đếm trong "failed_chunks"; không đoạn nào thành công thì ném RuntimeError.
+    on_progress(done, total): tiến độ tóm tắt các đoạn (dùng cho job chạy nền).
+    """
+    text_chunks = split_document(input_text)
+
+    # 📌 Tóm tắt song song các đoạn chưa có trong chỉ mục, thứ tự kết quả giữ nguyên
+    results, reused = summarize_chunks_incremental(text_chunks, on_progress)
+    summaries, stats = chunk_summaries(text_chunks, results, reused)
+
+    reduced = reduce_summaries(summaries) if mode == "map_reduce" else None
+    return document_result(summaries, stats, reduced)
 
-    except json.JSONDecodeError:
-        logger.error("⚠️ Phản hồi từ AI không phải JSON hợp lệ!")
-        return "", "Phản hồi từ AI không hợp lệ"
-    except Exception as e:
-        logger.exception(f"⚠️ Lỗi OpenAI: {str(e)}")
-        return "", "Lỗi khi tóm tắt văn bản"
 @csrf_exempt
 def summarize_text(request):
     """
     API nhận văn bản dài từ request, chia nhỏ nếu cần, gửi đến OpenAI và trả về nội dung đã được tóm tắt.
+    "mode": "map_reduce" để gộp các đoạn tóm tắt theo cây thay vì nối lại (mặc định "concat").
     """
     if request.method != "POST":
         return JsonResponse({"error": "Invalid request method"}, status=400)
@@ -570,26 +1135,17 @@ def summarize_text(request):
         # 📌 Nhận văn bản từ request
         data = json.loads(request.body)
         input_text = data.get("text", "").strip()
+        mode = data.get("mode", "concat").strip().lower()
 
         if not input_text:
             return JsonResponse({"error": "Vui lòng nhập văn bản!"}, status=400)
 
-        # 📌 Chia nhỏ nếu quá dài
-        text_chunks = split_text(input_text, max_length=1000)
-        summaries = []
+        if mode not in SUMMARY_MODES:
+            return JsonResponse({"error": "Chế độ tóm tắt không hợp lệ"}, status=400)
 
-        for chunk in text_chunks:
-            title, summary = summarize_chunk(chunk)
-            summaries.append(summary)
+        result = summarize_document(input_text, mode)
 
-        # 📌 Gộp các đoạn tóm tắt thành một đoạn hoàn chỉnh
-        final_summary = " ".join(summaries)
-
-        return JsonResponse({
-            "status": "success",
-            "title": "Tóm tắt văn bản",
-            "summary": final_summary
-        }, json_dumps_params={'ensure_ascii': False})
+        return JsonResponse({"status": "success", **result}, json_dumps_params={'ensure_ascii': False})
 
     except json.JSONDecodeError:
         logger.error("⚠️ Lỗi JSON từ request!")
@@ -597,4 +1153,12 @@ def summarize_text(request):
     except Exception as e:
         logger.exception(f"⚠️ Lỗi không xác định: {str(e)}")
         return JsonResponse({"error": str(e)}, status=500)
-    
+
+def llm_cache_stats(request):
+    """
+    API xem thống kê cache LLM (số lần hit/miss, số entry hiện có), kèm thống kê chỉ mục tóm tắt từng đoạn.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+
+    return JsonResponse({"status": "success", **llm_cache.stats(), "chunk_index": chunk_index.stats()})
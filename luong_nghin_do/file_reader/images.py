@@ -0,0 +1,61 @@
+import io
+import logging
+import os
+
+from django.conf import settings
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# 📌 Ảnh được thu nhỏ để cạnh dài nhất không vượt quá mức này trước khi upload
+IMAGE_MAX_DIMENSION = getattr(settings, "IMAGE_MAX_DIMENSION", 2048)
+IMAGE_JPEG_QUALITY = getattr(settings, "IMAGE_JPEG_QUALITY", 85)
+
+
+def has_transparency(image):
+    return image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def has_metadata(image):
+    """
+    Ảnh có EXIF (GPS, hướng xoay, máy chụp...) hoặc XMP cần bỏ đi trước khi upload.
+    """
+    return bool(image.getexif()) or "xmp" in image.info or "XML:com.adobe.xmp" in image.info
+
+
+def preprocess_image(file, max_dimension=None):
+    """
+    Thu nhỏ ảnh về cạnh dài tối đa `max_dimension`, xoay theo EXIF rồi mã hóa lại
+    (không giữ EXIF / GPS / metadata khác). Ảnh có nền trong suốt giữ PNG, còn lại dùng JPEG.
+    Trả về (buffer, tên file mới), hoặc None để nơi gọi upload file gốc khi không xử lý được
+    (không phải ảnh, ảnh động...) hoặc không cần xử lý (ảnh đã đủ nhỏ và không có metadata:
+    mã hóa lại chỉ làm ảnh chụp màn hình PNG thành JPEG mất chất lượng, có khi còn nặng hơn).
+    """
+    max_dimension = max_dimension or IMAGE_MAX_DIMENSION
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            if getattr(image, "is_animated", False):
+                return None
+            if max(image.size) <= max_dimension and not has_metadata(image):
+                file.seek(0)
+                return None
+
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            if has_transparency(image):
+                image_format, extension = "PNG", ".png"
+                image.save(buffer, format=image_format, optimize=True)
+            else:
+                image_format, extension = "JPEG", ".jpg"
+                image.convert("RGB").save(buffer, format=image_format, quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        logger.warning(f"⚠️ Không xử lý được ảnh, upload file gốc: {str(e)}")
+        file.seek(0)
+        return None
+
+    buffer.seek(0)
+    name = os.path.splitext(getattr(file, "name", None) or "image")[0] + extension
+    return buffer, name
@@ -0,0 +1,67 @@
+"""
+Đọc text PDF song song theo trang bằng nhiều process.
+Module này không import Django để process con (spawn) khởi động nhanh.
+"""
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+
+def open_document(source):
+    """
+    source: đường dẫn file hoặc nội dung PDF (bytes).
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def extract_page_range(source, start, stop):
+    """
+    Chạy trong process con: tự mở tài liệu và đọc các trang [start, stop).
+    """
+    with open_document(source) as pdf:
+        return [pdf[index].get_text("text") for index in range(start, stop)]
+
+
+def page_ranges(page_count, shards):
+    """
+    Chia [0, page_count) thành tối đa `shards` khoảng liên tiếp có kích thước gần bằng nhau.
+    """
+    shards = max(1, min(shards, page_count))
+    size, extra = divmod(page_count, shards)
+    ranges, start = [], 0
+    for index in range(shards):
+        stop = start + size + (1 if index < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+@functools.lru_cache(maxsize=None)
+def get_executor(workers):
+    # 📌 Dùng chung pool giữa các request; "spawn" để process con không kế thừa thread / kết nối của server
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def extract_pdf_text(source, page_count, workers):
+    """
+    Đọc text của toàn bộ tài liệu, mỗi process một dải trang, ghép kết quả một lần.
+    Pool hỏng (vd: process con bị kill) thì đọc tuần tự.
+    """
+    ranges = page_ranges(page_count, workers)
+    try:
+        executor = get_executor(workers)
+        futures = [executor.submit(extract_page_range, source, start, stop) for start, stop in ranges]
+        pages = [text for future in futures for text in future.result()]
+    except BrokenProcessPool as e:
+        logger.warning(f"⚠️ Pool đọc PDF bị lỗi, chuyển sang đọc tuần tự: {str(e)}")
+        get_executor.cache_clear()
+        pages = extract_page_range(source, 0, page_count)
+    return "".join(pages)
@@ -24,10 +24,10 @@ class FileUploadAPIViewTest(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.data['error'], 'Unsupported file type')
 
-    @patch('file_reader.views.fitz.open')  # Mock PyMuPDF
-    def test_upload_pdf_file(self, mock_fitz_open):
+    @patch('file_reader.views.open_document')  # Mock PyMuPDF
+    def test_upload_pdf_file(self, mock_open_document):
         # Giả lập trang PDF có text
-        mock_pdf = mock_fitz_open.return_value.__enter__.return_value
+        mock_pdf = mock_open_document.return_value.__enter__.return_value
         mock_pdf.__iter__.return_value = [mock_page := mock_pdf.page()]
         mock_page.get_text.return_value = "Mock PDF Text"
 
@@ -79,4 +79,512 @@ class UploadImageViewTest(TestCase):
         response = self.client.post(self.url, {'file': file}, format='multipart')
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data['url'], 'https://mocked.cloudinary.url/image.jpg')
\ No newline at end of file
+        self.assertEqual(response.data['url'], 'https://mocked.cloudinary.url/image.jpg')
+
+import os
+import docx
+import fitz
+from django.conf import settings
+from .pdf_parallel import open_document
+from django.test import override_settings
+
+
+def make_pdf(text):
+    pdf = fitz.open()
+    page = pdf.new_page()
+    page.insert_text((72, 72), text)
+    data = pdf.tobytes()
+    pdf.close()
+    return data
+
+
+class InMemoryParsingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = "/api/upload/"
+
+    def media_files(self):
+        return sorted(os.listdir(settings.MEDIA_ROOT)) if os.path.isdir(settings.MEDIA_ROOT) else []
+
+    def test_pdf_parsed_without_writing_to_storage(self):
+        before = self.media_files()
+        file = SimpleUploadedFile("bai_giang.pdf", make_pdf("Hoc may co ban"), content_type="application/pdf")
+
+        with patch('file_reader.views.open_document', wraps=open_document) as mock_open:
+            response = self.client.post(self.url, {'file': file}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Hoc may co ban", response.data['content'])
+        self.assertIsInstance(mock_open.call_args.args[0], bytes)
+        self.assertEqual(self.media_files(), before)
+
+    def test_docx_parsed_from_memory(self):
+        document = docx.Document()
+        document.add_paragraph("Đoạn văn một")
+        buffer = io.BytesIO()
+        document.save(buffer)
+        file = SimpleUploadedFile("bai_giang.docx", buffer.getvalue())
+
+        response = self.client.post(self.url, {'file': file}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Đoạn văn một", response.data['content'])
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_large_upload_read_from_temp_file(self):
+        file = SimpleUploadedFile("bai_giang.pdf", make_pdf("Tai lieu lon"), content_type="application/pdf")
+
+        with patch('file_reader.views.open_document', wraps=open_document) as mock_open:
+            response = self.client.post(self.url, {'file': file}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Tai lieu lon", response.data['content'])
+        self.assertIsInstance(mock_open.call_args.args[0], str)
+
+
+from .pdf_parallel import extract_pdf_text, page_ranges
+
+
+def make_multipage_pdf(pages):
+    pdf = fitz.open()
+    for index in range(pages):
+        pdf.new_page().insert_text((72, 72), f"Trang {index}")
+    data = pdf.tobytes()
+    pdf.close()
+    return data
+
+
+class ParallelPdfExtractionTest(TestCase):
+
+    def test_page_ranges_cover_all_pages(self):
+        self.assertEqual(page_ranges(10, 3), [(0, 4), (4, 7), (7, 10)])
+        self.assertEqual(page_ranges(2, 8), [(0, 1), (1, 2)])
+
+    def test_parallel_extraction_keeps_page_order(self):
+        data = make_multipage_pdf(12)
+        with fitz.open(stream=data, filetype="pdf") as pdf:
+            expected = "".join(page.get_text("text") for page in pdf)
+
+        self.assertEqual(extract_pdf_text(data, 12, 3), expected)
+
+    @patch('file_reader.views.PDF_PARALLEL_WORKERS', 2)
+    @patch('file_reader.views.PDF_PARALLEL_MIN_PAGES', 5)
+    @patch('file_reader.views.extract_pdf_text')
+    def test_large_pdf_uses_parallel_extraction(self, mock_extract):
+        mock_extract.return_value = "Nội dung song song"
+        file = SimpleUploadedFile("sach.pdf", make_multipage_pdf(6), content_type="application/pdf")
+
+        response = APIClient().post("/api/upload/", {'file': file}, format='multipart')
+
+        self.assertEqual(response.data['content'], "Nội dung song song")
+        self.assertEqual(mock_extract.call_args.args[1:], (6, 2))
+
+
+import json
+import pptx
+
+
+class StreamingExtractionTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = "/api/upload/"
+
+    def read_lines(self, response):
+        return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+    def test_pdf_streams_one_record_per_page(self):
+        file = SimpleUploadedFile("sach.pdf", make_multipage_pdf(3), content_type="application/pdf")
+        response = self.client.post(self.url + "?stream=1", {'file': file}, format='multipart')
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = self.read_lines(response)
+        self.assertEqual([line["page"] for line in lines[:-1]], [1, 2, 3])
+        self.assertIn("Trang 2", lines[2]["text"])
+        self.assertEqual(lines[-1], {"done": True, "filename": "sach.pdf", "count": 3})
+
+    @patch('file_reader.views.DOCX_BLOCK_PARAGRAPHS', 2)
+    def test_docx_streams_paragraph_blocks(self):
+        document = docx.Document()
+        for index in range(5):
+            document.add_paragraph(f"Đoạn {index}")
+        buffer = io.BytesIO()
+        document.save(buffer)
+        file = SimpleUploadedFile("bai.docx", buffer.getvalue())
+
+        response = self.client.post(self.url, {'file': file, 'stream': 'true'}, format='multipart')
+
+        lines = self.read_lines(response)
+        self.assertEqual([line["text"] for line in lines[:-1]], ["Đoạn 0\nĐoạn 1", "Đoạn 2\nĐoạn 3", "Đoạn 4"])
+
+    def test_pptx_streams_slides(self):
+        presentation = pptx.Presentation()
+        for title in ["Slide một", "Slide hai"]:
+            slide = presentation.slides.add_slide(presentation.slide_layouts[0])
+            slide.shapes.title.text = title
+        buffer = io.BytesIO()
+        presentation.save(buffer)
+        file = SimpleUploadedFile("bai.pptx", buffer.getvalue())
+
+        response = self.client.post(self.url, {'file': file}, format='multipart', HTTP_ACCEPT="application/x-ndjson")
+
+        lines = self.read_lines(response)
+        self.assertEqual(lines[1]["slide"], 2)
+        self.assertIn("Slide hai", lines[1]["text"])
+
+    def test_broken_file_reports_error_line(self):
+        file = SimpleUploadedFile("hong.docx", b"not-a-docx")
+        response = self.client.post(self.url + "?stream=1", {'file': file}, format='multipart')
+
+        self.assertIn("error", self.read_lines(response)[-1])
+
+    def test_stream_unsupported_type(self):
+        file = SimpleUploadedFile("test.txt", b"Hello", content_type="text/plain")
+        response = self.client.post(self.url + "?stream=1", {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+
+import threading
+import time
+from django.test import SimpleTestCase
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from api.tests import asgi_post
+
+
+class AsgiStreamingExtractionTest(SimpleTestCase):
+
+    @patch('file_reader.views.extraction_cache.set')
+    @patch('file_reader.views.extraction_cache.get', return_value=None)
+    @patch('file_reader.views.FileUploadAPIView.iter_records')
+    async def test_first_page_arrives_before_file_is_read(self, mock_iter_records, mock_cache_get, mock_cache_set):
+        first_sent = threading.Event()
+        sent_early = []
+
+        def pages(source, file_ext):
+            yield {"page": 1, "text": "Trang 1"}
+            # ➜ Trang sau chỉ được đọc khi dòng đầu đã tới client; nếu body bị gom lại thì chờ hết timeout
+            sent_early.append(first_sent.wait(5))
+            yield {"page": 2, "text": "Trang 2"}
+
+        mock_iter_records.side_effect = pages
+        body = encode_multipart(BOUNDARY, {"file": SimpleUploadedFile("sach.pdf", b"%PDF-1.4"), "stream": "true"})
+
+        response = await asgi_post(
+            "/api/upload/", body, first_sent.set, headers=[(b"content-type", MULTIPART_CONTENT.encode())]
+        )
+
+        self.assertEqual(sent_early, [True])
+        lines = [json.loads(line) for line in response.decode().splitlines()]
+        self.assertEqual(lines[-1], {"done": True, "filename": "sach.pdf", "count": 2})
+        mock_cache_set.assert_called_once()
+
+    @patch('file_reader.views.SUMMARY_CHUNK_TOKENS', 40)
+    @patch('file_reader.views.request_chunk_summary')
+    @patch('file_reader.views.extraction_cache.set')
+    @patch('file_reader.views.extraction_cache.get', return_value=None)
+    @patch('file_reader.views.FileUploadAPIView.iter_records')
+    async def test_summary_arrives_while_file_is_read(self, mock_iter_records, mock_cache_get, mock_cache_set, mock_summary):
+        first_sent = threading.Event()
+        sent_early = []
+        page = lambda number: f"Trang {number} nói về học máy và dữ liệu lớn trong giáo dục hiện đại.\n" * 3
+
+        def pages(source, file_ext):
+            yield {"page": 1, "text": page(1)}
+            # ➜ Trang sau chỉ được đọc khi bản tóm tắt đầu tiên đã tới client
+            sent_early.append(first_sent.wait(5))
+            yield {"page": 2, "text": page(2)}
+
+        mock_iter_records.side_effect = pages
+
+        def summarize(chunk):
+            # ➜ Tóm tắt xong sau khi đã đọc hết trang 1: chỉ gửi được nếu pipeline chờ cả hai việc cùng lúc
+            time.sleep(0.2)
+            return "Tiêu đề", "Tóm tắt"
+
+        mock_summary.side_effect = summarize
+        body = encode_multipart(BOUNDARY, {"file": SimpleUploadedFile("sach.pdf", b"%PDF-1.4")})
+
+        response = await asgi_post(
+            "/api/upload-summarize/", body, first_sent.set, headers=[(b"content-type", MULTIPART_CONTENT.encode())]
+        )
+
+        self.assertEqual(sent_early, [True])
+        lines = [json.loads(line) for line in response.decode().splitlines()]
+        self.assertEqual(lines[-1], {"done": True, "filename": "sach.pdf", "count": len(lines) - 1})
+        self.assertEqual(sorted(line["chunk"] for line in lines[:-1]), list(range(len(lines) - 1)))
+
+import hashlib
+from django.http import HttpRequest
+from .upload_handlers import HashingUploadHandler, upload_sha256
+
+
+class ExtractionCacheTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = "/api/upload/"
+
+    def upload(self, name, data, **extra):
+        file = SimpleUploadedFile(name, data, content_type="application/pdf")
+        return self.client.post(self.url, {'file': file}, format='multipart', **extra)
+
+    def test_reupload_skips_parsing(self):
+        data = make_pdf("Giao trinh chung")
+
+        with patch('file_reader.views.open_document', wraps=open_document) as mock_open:
+            first = self.upload("sv1.pdf", data)
+            second = self.upload("sv2.pdf", data)
+
+        self.assertEqual(mock_open.call_count, 1)
+        self.assertEqual(second.data, {"filename": "sv2.pdf", "content": first.data["content"]})
+
+    def test_different_content_is_parsed(self):
+        first, second = make_pdf("Noi dung A"), make_pdf("Noi dung B")
+        with patch('file_reader.views.open_document', wraps=open_document) as mock_open:
+            self.upload("a.pdf", first)
+            response = self.upload("b.pdf", second)
+
+        self.assertEqual(mock_open.call_count, 2)
+        self.assertIn("Noi dung B", response.data["content"])
+
+    def stream(self, name, data):
+        response = self.upload(name, data, HTTP_ACCEPT="application/x-ndjson")
+        return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+    def test_streaming_reupload_served_from_cache(self):
+        data = make_multipage_pdf(3)
+        first = self.stream("sv1.pdf", data)
+
+        with patch('file_reader.views.open_document') as mock_open:
+            second = self.stream("sv2.pdf", data)
+
+        mock_open.assert_not_called()
+        # ➜ Cache hit gửi đúng các bản ghi như lần đọc file
+        self.assertEqual(second[:-1], first[:-1])
+        self.assertEqual([line["page"] for line in second[:-1]], [1, 2, 3])
+        self.assertEqual(second[-1], {"done": True, "filename": "sv2.pdf", "count": 3})
+
+    def test_streaming_after_plain_upload_keeps_record_shape(self):
+        data = make_multipage_pdf(2)
+        plain = self.upload("sv1.pdf", data)
+
+        lines = self.stream("sv2.pdf", data)
+
+        self.assertEqual([line["page"] for line in lines[:-1]], [1, 2])
+        self.assertEqual("".join(line["text"] for line in lines[:-1]), plain.data["content"])
+
+    def test_streamed_upload_fills_cache(self):
+        data = make_multipage_pdf(3)
+        lines = self.stream("sv1.pdf", data)
+
+        with patch('file_reader.views.FileUploadAPIView.read_file') as mock_read:
+            response = self.upload("sv2.pdf", data)
+
+        mock_read.assert_not_called()
+        self.assertEqual(response.data["content"], "".join(line["text"] for line in lines[:-1]))
+
+    def test_hashing_handler_matches_sha256(self):
+        request = HttpRequest()
+        handler = HashingUploadHandler(request)
+        handler.new_file("file", "a.pdf", "application/pdf", 10)
+        for chunk in [b"abc", b"def"]:
+            self.assertEqual(handler.receive_data_chunk(chunk, 0), chunk)
+        self.assertIsNone(handler.file_complete(6))
+
+        self.assertEqual(request.upload_sha256["file"], hashlib.sha256(b"abcdef").hexdigest())
+        # ➜ Không có hash từ handler thì tự tính từ file
+        file = SimpleUploadedFile("a.pdf", b"abcdef")
+        self.assertEqual(upload_sha256(HttpRequest(), "file", file), hashlib.sha256(b"abcdef").hexdigest())
+
+
+import threading
+from api.views import llm_cache
+from .views import aiter_pipeline_summaries, iter_pipeline_summaries
+
+
+class UploadSummarizePipelineTest(TestCase):
+    def setUp(self):
+        llm_cache.clear()
+        self.client = APIClient()
+        self.url = "/api/upload-summarize/"
+
+    @patch('file_reader.views.SUMMARY_CHUNK_TOKENS', 40)
+    def test_chunks_dispatched_while_extraction_continues(self):
+        events = []
+        first_summary_started = threading.Event()
+
+        def pieces():
+            for page in range(6):
+                events.append(f"page {page}")
+                if page == 3:
+                    # ➜ Trang 3 chỉ được đọc sau khi đoạn đầu tiên đã bắt đầu tóm tắt
+                    self.assertTrue(first_summary_started.wait(timeout=5))
+                yield f"Trang {page} nói về học máy và dữ liệu lớn trong giáo dục hiện đại.\n" * 3
+
+        def summarize(chunk):
+            first_summary_started.set()
+            return "Tiêu đề", f"Tóm tắt: {chunk[:10]}"
+
+        with patch('file_reader.views.request_chunk_summary', side_effect=summarize):
+            records = list(iter_pipeline_summaries(pieces()))
+
+        self.assertEqual(events, [f"page {page}" for page in range(6)])
+        self.assertGreater(len(records), 1)
+        self.assertEqual(sorted(record["chunk"] for record in records), list(range(len(records))))
+
+    @patch('file_reader.views.SUMMARY_CHUNK_TOKENS', 20)
+    @patch('file_reader.views.request_chunk_summary')
+    def test_upload_summarize_streams_ndjson(self, mock_summary):
+        mock_summary.side_effect = lambda chunk: ("Tiêu đề", "Tóm tắt")
+        file = SimpleUploadedFile("sach.pdf", make_multipage_pdf(4), content_type="application/pdf")
+
+        response = self.client.post(self.url, {'file': file}, format='multipart')
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(lines[-1], {"done": True, "filename": "sach.pdf", "count": len(lines) - 1})
+        self.assertEqual(mock_summary.call_count, len(lines) - 1)
+        self.assertTrue(all(line["summary"] == "Tóm tắt" for line in lines[:-1]))
+
+    @patch('file_reader.views.request_chunk_summary')
+    def test_failed_chunk_reported_per_record(self, mock_summary):
+        mock_summary.side_effect = Exception("OpenAI lỗi")
+
+        records = list(iter_pipeline_summaries(["Một câu ngắn."]))
+
+        self.assertEqual(records, [{"chunk": 0, "error": "Lỗi khi tóm tắt văn bản"}])
+
+    @patch('file_reader.views.request_chunk_summary')
+    async def test_async_pipeline_reports_failed_chunk(self, mock_summary):
+        mock_summary.side_effect = Exception("OpenAI lỗi")
+
+        records = [record async for record in aiter_pipeline_summaries(["Một câu ngắn."])]
+
+        self.assertEqual(records, [{"chunk": 0, "error": "Lỗi khi tóm tắt văn bản"}])
+
+    def test_unsupported_type(self):
+        file = SimpleUploadedFile("test.txt", b"Hello", content_type="text/plain")
+        response = self.client.post(self.url, {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+
+from PIL import Image
+
+
+def make_image(size, mode="RGB", image_format="JPEG", exif=True):
+    image = Image.new(mode, size, (200, 100, 50, 128)[:len(mode)])
+    buffer = io.BytesIO()
+    if exif:
+        metadata = Image.Exif()
+        metadata[0x010F] = "Phone Maker"  # ➜ Make
+        image.save(buffer, format=image_format, exif=metadata)
+    else:
+        image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+class ImagePreprocessingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = "/api/uploadFile/"
+
+    def uploaded_image(self, mock_upload):
+        uploaded = mock_upload.call_args.args[0]
+        uploaded.seek(0)
+        return Image.open(uploaded)
+
+    @patch('file_reader.views.cloudinary.uploader.upload')
+    def test_large_photo_is_downscaled_and_stripped(self, mock_upload):
+        mock_upload.return_value = {'secure_url': 'https://mocked.cloudinary.url/photo.jpg'}
+        file = SimpleUploadedFile("photo.jpg", make_image((4000, 3000)), content_type="image/jpeg")
+
+        response = self.client.post(self.url, {'file': file}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        image = self.uploaded_image(mock_upload)
+        self.assertEqual(image.size, (2048, 1536))
+        self.assertEqual(image.format, "JPEG")
+        self.assertEqual(len(image.getexif()), 0)
+        self.assertEqual(mock_upload.call_args.kwargs["filename"], "photo.jpg")
+
+    @patch('file_reader.views.cloudinary.uploader.upload')
+    def test_transparent_png_stays_png(self, mock_upload):
+        mock_upload.return_value = {'secure_url': 'https://mocked.cloudinary.url/logo.png'}
+        file = SimpleUploadedFile("logo.png", make_image((3000, 2400), "RGBA", "PNG", exif=False), content_type="image/png")
+
+        self.client.post(self.url, {'file': file}, format='multipart')
+
+        image = self.uploaded_image(mock_upload)
+        self.assertEqual((image.format, image.mode, image.size), ("PNG", "RGBA", (2048, 1638)))
+
+    @patch('file_reader.views.cloudinary.uploader.upload')
+    def test_optimize_false_uploads_original(self, mock_upload):
+        uploaded = []
+        mock_upload.side_effect = lambda file, **options: uploaded.append(file.read()) or {'secure_url': 'https://mocked.cloudinary.url/photo.jpg'}
+        data = make_image((3000, 2000))
+        file = SimpleUploadedFile("photo.jpg", data, content_type="image/jpeg")
+
+        self.client.post(self.url, {'file': file, 'optimize': 'false'}, format='multipart')
+
+        self.assertEqual(uploaded, [data])
+
+    @patch('file_reader.views.cloudinary.uploader.upload')
+    def test_small_image_without_metadata_is_not_reencoded(self, mock_upload):
+        uploaded = []
+        mock_upload.side_effect = lambda file, **options: uploaded.append((file.read(), options["filename"])) or {'secure_url': 'https://mocked.cloudinary.url/screen.png'}
+        data = make_image((800, 600), "RGB", "PNG", exif=False)
+        file = SimpleUploadedFile("screen.png", data, content_type="image/png")
+
+        self.client.post(self.url, {'file': file}, format='multipart')
+
+        # ➜ Ảnh chụp màn hình PNG giữ nguyên, không bị đổi sang JPEG
+        self.assertEqual(uploaded, [(data, "screen.png")])
+
+    @patch('file_reader.views.IMAGE_CHUNKED_UPLOAD_THRESHOLD', 100)
+    @patch('file_reader.views.cloudinary.uploader.upload_large')
+    def test_large_file_uses_chunked_upload(self, mock_upload_large):
+        mock_upload_large.return_value = {'secure_url': 'https://mocked.cloudinary.url/big.jpg'}
+        file = SimpleUploadedFile("big.jpg", make_image((500, 500)), content_type="image/jpeg")
+
+        response = self.client.post(self.url, {'file': file}, format='multipart')
+
+        self.assertEqual(response.data['url'], 'https://mocked.cloudinary.url/big.jpg')
+        self.assertIn("chunk_size", mock_upload_large.call_args.kwargs)
+
+
+from api.models import ImageUpload
+
+
+class ImageUploadDeduplicationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = "/api/uploadFile/"
+        self.data = make_image((300, 200))
+
+    def upload(self, **data):
+        file = SimpleUploadedFile("photo.jpg", self.data, content_type="image/jpeg")
+        return self.client.post(self.url, {'file': file, **data}, format='multipart')
+
+    @patch('file_reader.views.cloudinary.uploader.upload')
+    def test_duplicate_upload_reuses_secure_url(self, mock_upload):
+        mock_upload.return_value = {
+            'secure_url': 'https://res.cloudinary.com/demo/image/upload/v1/abc.jpg',
+            'public_id': 'abc', 'format': 'jpg', 'version': 1, 'type': 'upload', 'resource_type': 'image',
+        }
+
+        first = self.upload()
+        second = self.upload()
+
+        self.assertEqual(mock_upload.call_count, 1)
+        self.assertEqual(second.data['url'], first.data['url'])
+        saved = ImageUpload.objects.get()
+        self.assertEqual(len(saved.content_hash), 64)
+        self.assertEqual(saved.image.public_id, 'abc')
+
+    @patch('file_reader.views.cloudinary.uploader.upload')
+    def test_original_and_optimized_are_separate(self, mock_upload):
+        mock_upload.return_value = {'secure_url': 'https://mocked.cloudinary.url/image.jpg'}
+
+        self.upload()
+        self.upload(optimize='false')
+
+        self.assertEqual(mock_upload.call_count, 2)
+        self.assertEqual(ImageUpload.objects.values("content_hash").distinct().count(), 2)
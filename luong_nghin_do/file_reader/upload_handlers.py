@@ -0,0 +1,41 @@
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Tính SHA-256 của từng file ngay trong lúc upload được nhận (không phải đọc lại file sau đó).
+    Handler này chỉ quan sát dữ liệu rồi chuyển tiếp nguyên vẹn cho các handler phía sau
+    (MemoryFileUploadHandler / TemporaryFileUploadHandler), nên phải đứng đầu FILE_UPLOAD_HANDLERS.
+    Kết quả nằm ở request.upload_sha256[<tên field>].
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, "upload_sha256"):
+            self.request.upload_sha256 = {}
+        self.request.upload_sha256[self.field_name] = self.digest.hexdigest()
+        return None
+
+
+def upload_sha256(request, field_name, file):
+    """
+    SHA-256 của file upload: lấy từ HashingUploadHandler, hoặc tự đọc lại file nếu handler chưa được cấu hình.
+    """
+    digest = getattr(request, "upload_sha256", {}).get(field_name)
+    if digest:
+        return digest
+
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
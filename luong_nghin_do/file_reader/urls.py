@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import FileUploadAPIView
+from .views import FileUploadAPIView, UploadSummarizeAPIView
 from .views import UploadImageView
 urlpatterns = [
     path("upload/", FileUploadAPIView.as_view(), name="file-upload"),
+    path("upload-summarize/", UploadSummarizeAPIView.as_view(), name="upload-summarize"),
     path('uploadFile/', UploadImageView.as_view(), name='upload_image'),
 ]
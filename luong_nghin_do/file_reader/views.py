@@ -1,13 +1,174 @@
+import asyncio
 import os
-import fitz  # PyMuPDF
+import json
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
 import docx
 import pptx
 import cloudinary.uploader
+from cloudinary import CloudinaryResource
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.core.files.storage import default_storage
 from django.conf import settings
+from api.cache import ContentCache, make_key
+from api.models import ImageUpload
+from api.chunking import iter_text_chunks
+from api.streaming import aiter_in_thread, is_asgi, streaming_response
+from api.views import (
+    openai_executor, run_in_worker, request_chunk_summary, SUMMARY_CHUNK_TOKENS, OPENAI_MAX_CONCURRENCY,
+)
+from .pdf_parallel import extract_pdf_text, open_document
+from .upload_handlers import upload_sha256
+from .images import preprocess_image, IMAGE_MAX_DIMENSION, IMAGE_JPEG_QUALITY
+
+# 📌 PDF từ số trang này trở lên được đọc song song bằng nhiều process
+PDF_PARALLEL_MIN_PAGES = getattr(settings, "PDF_PARALLEL_MIN_PAGES", 50)
+PDF_PARALLEL_WORKERS = getattr(settings, "PDF_PARALLEL_WORKERS", os.cpu_count() or 1)
+
+# 📌 Chế độ streaming: mỗi bản ghi DOCX gồm tối đa chừng này đoạn văn
+DOCX_BLOCK_PARAGRAPHS = 50
+RECORD_KEYS = {".pdf": "page", ".docx": "block", ".pptx": "slide"}  # ➜ Trường đánh số bản ghi theo loại file
+
+# 📌 Cache nội dung đã đọc theo SHA-256 của file: cùng một file upload lại không cần đọc lại.
+# Dung lượng tối đa ~ EXTRACTION_CACHE_MAX_ENTRIES x EXTRACTION_CACHE_MAX_CHARS, entry ít dùng nhất bị xóa trước.
+EXTRACTION_CACHE_MAX_ENTRIES = getattr(settings, "EXTRACTION_CACHE_MAX_ENTRIES", 1000)
+EXTRACTION_CACHE_MAX_CHARS = getattr(settings, "EXTRACTION_CACHE_MAX_CHARS", 2_000_000)
+extraction_cache = ContentCache("extraction", max_entries=EXTRACTION_CACHE_MAX_ENTRIES)
+
+SUPPORTED_EXTENSIONS = [".pdf", ".docx", ".pptx"]
+
+# 📌 Upload ảnh: xử lý cục bộ (thu nhỏ, bỏ metadata) trước khi gửi lên Cloudinary,
+# ảnh vẫn lớn hơn ngưỡng thì upload theo từng phần (chunked)
+IMAGE_PREPROCESS = getattr(settings, "IMAGE_PREPROCESS", True)
+IMAGE_CHUNKED_UPLOAD_THRESHOLD = getattr(settings, "IMAGE_CHUNKED_UPLOAD_THRESHOLD", 20 * 1024 * 1024)
+IMAGE_UPLOAD_CHUNK_SIZE = getattr(settings, "IMAGE_UPLOAD_CHUNK_SIZE", 6 * 1024 * 1024)
+
+logger = logging.getLogger(__name__)
+
+def ndjson_line(record):
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+def ndjson_error_line(filename, error):
+    logger.exception(f"⚠️ Lỗi khi đọc file {filename}: {str(error)}")
+    return ndjson_line({"error": str(error)})
+
+def ndjson_response(request, records, filename):
+    """
+    Trả về từng bản ghi dạng NDJSON (mỗi dòng một JSON) ngay khi đọc xong,
+    kết thúc bằng {"done": true, ...} hoặc {"error": ...} nếu lỗi giữa chừng.
+    records là generator đồng bộ hoặc async generator (chỉ dùng dưới ASGI). Dưới ASGI generator đồng bộ
+    chạy trong thread riêng (api.streaming) để từng dòng vẫn tới client ngay.
+    """
+    def lines():
+        count = 0
+        try:
+            for record in records:
+                count += 1
+                yield ndjson_line(record)
+            yield ndjson_line({"done": True, "filename": filename, "count": count})
+        except Exception as e:
+            yield ndjson_error_line(filename, e)
+
+    async def alines():
+        count = 0
+        try:
+            async for record in records:
+                count += 1
+                yield ndjson_line(record)
+            yield ndjson_line({"done": True, "filename": filename, "count": count})
+        except Exception as e:
+            yield ndjson_error_line(filename, e)
+
+    content = alines() if hasattr(records, "__aiter__") else lines()
+    return streaming_response(request, content, "application/x-ndjson")
+
+def summary_record(index, future):
+    """
+    Bản ghi NDJSON cho bản tóm tắt của một đoạn (future đã xong, của concurrent.futures hoặc asyncio).
+    """
+    try:
+        title, summary = future.result()
+        return {"chunk": index, "title": title, "summary": summary}
+    except Exception as e:
+        logger.exception(f"⚠️ Lỗi khi tóm tắt đoạn {index}: {str(e)}")
+        return {"chunk": index, "error": "Lỗi khi tóm tắt văn bản"}
+
+def iter_pipeline_summaries(pieces):
+    """
+    Pipeline đọc file -> chia đoạn -> tóm tắt: mỗi phần văn bản vừa đọc được (trang / khối đoạn / slide)
+    đi thẳng vào bộ chia đoạn, đoạn nào đủ thì gửi tóm tắt ngay trong lúc các trang sau vẫn đang được đọc.
+    Yield bản tóm tắt của từng đoạn ngay khi xong (kèm số thứ tự "chunk" để client sắp xếp).
+    Số đoạn đang chờ tóm tắt được giới hạn để bộ nhớ không tăng theo độ dài tài liệu.
+    """
+    max_pending = OPENAI_MAX_CONCURRENCY * 2
+    pending = deque()
+
+    def collect(block):
+        # ➜ block=True: chờ ít nhất một đoạn xong (khi đã quá nhiều đoạn đang chờ)
+        done, _ = wait([future for _, future in pending], timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for item in [item for item in pending if item[1] in done]:
+            pending.remove(item)
+            yield summary_record(*item)
+
+    try:
+        chunks = iter_text_chunks(pieces, max_tokens=SUMMARY_CHUNK_TOKENS, content_defined=True)
+        for index, chunk in enumerate(chunks):
+            pending.append((index, openai_executor.submit(run_in_worker, request_chunk_summary, chunk)))
+            yield from collect(block=len(pending) >= max_pending)
+
+        while pending:
+            yield from collect(block=True)
+    finally:
+        # ➜ Client ngắt kết nối giữa chừng: bỏ các đoạn chưa kịp chạy
+        for _, future in pending:
+            future.cancel()
+
+async def aiter_pipeline_summaries(pieces):
+    """
+    Bản async của iter_pipeline_summaries (cùng bản ghi) dùng dưới ASGI. File được đọc và chia đoạn trong
+    thread riêng, tóm tắt vẫn chạy trên openai_executor. Chờ đoạn kế tiếp và chờ các bản tóm tắt cùng lúc,
+    nên bản tóm tắt nào xong là gửi ngay kể cả khi trang sau còn đang được đọc.
+    """
+    max_pending = OPENAI_MAX_CONCURRENCY * 2
+    pending = {}  # ➜ asyncio future -> số thứ tự đoạn
+    reader = aiter_in_thread(iter_text_chunks(pieces, max_tokens=SUMMARY_CHUNK_TOKENS, content_defined=True))
+    next_chunk = None
+    reading = True
+    index = 0
+
+    try:
+        while True:
+            # ➜ Chỉ đọc tiếp khi số đoạn đang chờ tóm tắt chưa tới giới hạn
+            if reading and next_chunk is None and len(pending) < max_pending:
+                next_chunk = asyncio.ensure_future(anext(reader))
+            waiting = set(pending) if next_chunk is None else {next_chunk, *pending}
+            if not waiting:
+                return
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+            if next_chunk in done:
+                try:
+                    chunk = next_chunk.result()
+                except StopAsyncIteration:
+                    reading = False
+                else:
+                    future = asyncio.wrap_future(openai_executor.submit(run_in_worker, request_chunk_summary, chunk))
+                    pending[future] = index
+                    index += 1
+                next_chunk = None
+
+            for future in sorted((future for future in done if future in pending), key=pending.get):
+                yield summary_record(pending.pop(future), future)
+    finally:
+        # ➜ Client ngắt kết nối giữa chừng: bỏ các đoạn chưa kịp chạy và dừng việc đọc file
+        for future in pending:
+            future.cancel()
+        if next_chunk is not None:
+            next_chunk.cancel()
+            await asyncio.wait([next_chunk])
+        await reader.aclose()
 
 class FileUploadAPIView(APIView):
     parser_classes = (MultiPartParser, FormParser)
@@ -19,52 +180,253 @@ class FileUploadAPIView(APIView):
             return Response({"error": "No file uploaded"}, status=400)
 
         file_ext = os.path.splitext(file.name)[1].lower()
+        if file_ext not in SUPPORTED_EXTENSIONS:
+            return Response({"error": "Unsupported file type"}, status=400)
 
-        # Lưu file tạm thời
-        file_path = default_storage.save(file.name, file)
-        full_file_path = default_storage.path(file_path)
+        # 📌 File đã được đọc trước đó (cùng SHA-256) thì trả luôn nội dung đã lưu
+        cache_key = make_key(upload_sha256(request, "file", file), file_ext)
+        cached = extraction_cache.get(cache_key)
 
-        print(f"📂 File path: {full_file_path}")  # Debug
-        try:
-            if file_ext == ".pdf":
-                text = self.read_pdf(file_path)
-            elif file_ext == ".docx":
-                text = self.read_docx(file_path)
-            elif file_ext == ".pptx":
-                text = self.read_pptx(file_path)
-            else:
-                return Response({"error": "Unsupported file type"}, status=400)
-        finally:
-            # Xóa file sau khi đọc xong
-            default_storage.delete(file_path)
+        # 📌 Đọc thẳng từ bộ nhớ, không ghi file ra đĩa rồi đọc lại.
+        # File lớn hơn FILE_UPLOAD_MAX_MEMORY_SIZE đã được Django ghi ra file tạm thì đọc từ file tạm đó.
+        source = self.upload_source(file)
+
+        # 📌 Chế độ streaming: mỗi trang PDF / khối đoạn DOCX / slide PPTX là một dòng NDJSON.
+        # Cache hit gửi lại đúng các bản ghi đó; bản lưu từ chế độ thường không có từng phần thì đọc lại file
+        if self.wants_ndjson(request):
+            if cached is not None and "parts" in cached:
+                return ndjson_response(request, self.cached_records(cached, file_ext), file.name)
+            return ndjson_response(request, self.cache_records(self.iter_records(source, file_ext), cache_key, file_ext), file.name)
+
+        if cached is not None:
+            return Response({"filename": file.name, "content": self.cached_content(cached, file_ext)})
+
+        text = self.read_file(source, file_ext)
+        if len(text) <= EXTRACTION_CACHE_MAX_CHARS:
+            extraction_cache.set(cache_key, {"content": text})
 
         return Response({"filename": file.name, "content": text})
 
-    def read_pdf(self, file_path):
-        text = ""
-        with fitz.open(file_path) as pdf:
-            for page in pdf:
-                text += page.get_text("text")
-        return text
+    def upload_source(self, file):
+        """
+        Nguồn đọc của file upload: đường dẫn file tạm (upload lớn) hoặc chính file trong bộ nhớ.
+        """
+        if hasattr(file, "temporary_file_path"):
+            return file.temporary_file_path()
+        file.seek(0)
+        return file
+
+    def perform_content_negotiation(self, request, force=False):
+        # ➜ Không có renderer nào cho application/x-ndjson (view tự trả về StreamingHttpResponse),
+        # nên không để DRF trả lỗi 406 cho header Accept này
+        return super().perform_content_negotiation(request, force=True)
+
+    def wants_ndjson(self, request):
+        """
+        Client bật streaming bằng "stream"=true (form hoặc query) hoặc header Accept: application/x-ndjson.
+        """
+        value = str(request.data.get("stream") or request.query_params.get("stream") or "").lower()
+        return value in ("1", "true") or "application/x-ndjson" in request.headers.get("Accept", "")
+
+    def iter_records(self, source, file_ext):
+        """
+        Generator các bản ghi theo trang / khối đoạn / slide, trả về None nếu không hỗ trợ.
+        """
+        if file_ext == ".pdf":
+            return self.iter_pdf_pages(source)
+        elif file_ext == ".docx":
+            return self.iter_docx_blocks(source)
+        elif file_ext == ".pptx":
+            return self.iter_pptx_slides(source)
+        return None
+
+    def cache_records(self, records, cache_key, file_ext):
+        """
+        Trả lại từng bản ghi như cũ; đọc hết file không lỗi thì lưu toàn văn vào extraction_cache
+        (giống chế độ thường) để lần upload sau không phải đọc lại.
+        """
+        texts = []
+        for record in records:
+            texts.append(record["text"])
+            yield record
+
+        # ➜ Lưu từng phần (không lưu thêm toàn văn) để cache hit ở chế độ streaming gửi lại đúng các bản ghi
+        if len(self.join_parts(texts, file_ext)) <= EXTRACTION_CACHE_MAX_CHARS:
+            extraction_cache.set(cache_key, {"parts": texts})
 
-    def read_docx(self, file_path):
-        doc = docx.Document(file_path)
+    def join_parts(self, texts, file_ext):
+        """
+        Ghép các phần lại giống read_file: các trang PDF nối liền, khối đoạn / slide cách nhau một dòng.
+        """
+        return ("" if file_ext == ".pdf" else "\n").join(texts)
+
+    def cached_content(self, cached, file_ext):
+        """
+        Toàn văn của một entry trong extraction_cache (lưu từ chế độ thường hoặc streaming).
+        """
+        if "parts" in cached:
+            return self.join_parts(cached["parts"], file_ext)
+        return cached["content"]
+
+    def cached_records(self, cached, file_ext):
+        """
+        Các bản ghi NDJSON dựng lại từ entry lưu ở chế độ streaming, cùng dạng với khi đọc file.
+        """
+        key = RECORD_KEYS[file_ext]
+        for index, text in enumerate(cached["parts"], start=1):
+            yield {key: index, "text": text}
+
+    def iter_pdf_pages(self, source):
+        if not isinstance(source, (str, os.PathLike)):
+            source = source.read()
+        with open_document(source) as pdf:
+            for index, page in enumerate(pdf, start=1):
+                yield {"page": index, "text": page.get_text("text")}
+
+    def iter_docx_blocks(self, source):
+        paragraphs = [para.text for para in docx.Document(source).paragraphs]
+        for index, start in enumerate(range(0, len(paragraphs), DOCX_BLOCK_PARAGRAPHS), start=1):
+            yield {"block": index, "text": "\n".join(paragraphs[start:start + DOCX_BLOCK_PARAGRAPHS])}
+
+    def iter_pptx_slides(self, source):
+        ppt = pptx.Presentation(source)
+        for index, slide in enumerate(ppt.slides, start=1):
+            texts = [shape.text for shape in slide.shapes if hasattr(shape, "text")]
+            yield {"slide": index, "text": "\n".join(texts)}
+
+    def read_file(self, source, file_ext):
+        """
+        Đọc nội dung file theo phần mở rộng, trả về None nếu không hỗ trợ
+        (dùng chung cho API upload và job chạy nền).
+        source: đường dẫn file hoặc file-like object (vd: file upload trong bộ nhớ).
+        """
+        if file_ext == ".pdf":
+            return self.read_pdf(source)
+        elif file_ext == ".docx":
+            return self.read_docx(source)
+        elif file_ext == ".pptx":
+            return self.read_pptx(source)
+        return None
+
+    def read_pdf(self, source):
+        # ➜ Process con cần tự mở tài liệu: truyền đường dẫn hoặc bytes của file
+        if not isinstance(source, (str, os.PathLike)):
+            source = source.read()
+
+        with open_document(source) as pdf:
+            page_count = len(pdf)
+            if page_count < PDF_PARALLEL_MIN_PAGES or PDF_PARALLEL_WORKERS < 2:
+                return "".join(page.get_text("text") for page in pdf)
+
+        return extract_pdf_text(source, page_count, PDF_PARALLEL_WORKERS)
+
+    def read_docx(self, source):
+        doc = docx.Document(source)
         return "\n".join([para.text for para in doc.paragraphs])
 
-    def read_pptx(self, file_path):
-        ppt = pptx.Presentation(file_path)
+    def read_pptx(self, source):
+        ppt = pptx.Presentation(source)
         text = []
         for slide in ppt.slides:
             for shape in slide.shapes:
                 if hasattr(shape, "text"):
                     text.append(shape.text)
         return "\n".join(text)
+
+class UploadSummarizeAPIView(FileUploadAPIView):
+    """
+    Upload file và nhận ngay các bản tóm tắt từng đoạn dạng NDJSON, thay cho việc gọi upload/
+    rồi gửi lại toàn bộ văn bản lên summarize-text/. Đọc file, chia đoạn và tóm tắt chạy chồng lên nhau.
+    """
+
+    def post(self, request, *args, **kwargs):
+        file = request.FILES.get('file')
+
+        if not file:
+            return Response({"error": "No file uploaded"}, status=400)
+
+        file_ext = os.path.splitext(file.name)[1].lower()
+        if file_ext not in SUPPORTED_EXTENSIONS:
+            return Response({"error": "Unsupported file type"}, status=400)
+
+        cache_key = make_key(upload_sha256(request, "file", file), file_ext)
+        cached = extraction_cache.get(cache_key)
+        if cached is not None:
+            pieces = [self.cached_content(cached, file_ext)]
+        else:
+            records = self.cache_records(self.iter_records(self.upload_source(file), file_ext), cache_key, file_ext)
+            # ➜ Thêm xuống dòng giữa các phần để câu cuối trang này không dính vào câu đầu trang sau
+            pieces = (record["text"] + "\n" for record in records)
+
+        pipeline = aiter_pipeline_summaries if is_asgi(request) else iter_pipeline_summaries
+        return ndjson_response(request, pipeline(pieces), file.name)
+
 class UploadImageView(APIView):
     parser_classes = (MultiPartParser, FormParser)
 
     def post(self, request, *args, **kwargs):
         file = request.FILES.get('file')
         if file:
-            upload_result = cloudinary.uploader.upload(file)
+            optimize = self.wants_optimize(request)
+            content_hash = self.image_hash(request, file, optimize)
+
+            # 📌 Ảnh đã upload trước đó (cùng nội dung) thì trả luôn URL cũ, không gọi Cloudinary
+            existing = ImageUpload.objects.filter(content_hash=content_hash).exclude(secure_url="").first()
+            if existing is not None:
+                return Response({'url': existing.secure_url})
+
+            upload_result = self.upload_image(file, optimize)
+            self.save_image_upload(content_hash, upload_result)
             return Response({'url': upload_result['secure_url']})
-        return Response({'error': 'No file provided'}, status=400)
\ No newline at end of file
+        return Response({'error': 'No file provided'}, status=400)
+
+    def image_hash(self, request, file, optimize):
+        """
+        Khóa chống trùng: SHA-256 của file gốc, kèm cấu hình xử lý ảnh khi có thu nhỏ
+        (đổi kích thước / chất lượng thì ảnh được upload lại).
+        """
+        digest = upload_sha256(request, "file", file)
+        if not optimize:
+            return digest
+        return make_key(digest, IMAGE_MAX_DIMENSION, IMAGE_JPEG_QUALITY)
+
+    def save_image_upload(self, content_hash, upload_result):
+        try:
+            image = ""
+            if upload_result.get("public_id"):
+                image = CloudinaryResource(
+                    upload_result["public_id"],
+                    format=upload_result.get("format"),
+                    version=upload_result.get("version"),
+                    type=upload_result.get("type"),
+                    resource_type=upload_result.get("resource_type"),
+                    metadata=upload_result,
+                )
+            ImageUpload.objects.create(image=image, content_hash=content_hash, secure_url=upload_result["secure_url"])
+        except Exception as e:
+            logger.warning(f"⚠️ Không lưu được chỉ mục ảnh đã upload: {str(e)}")
+
+    def wants_optimize(self, request):
+        """
+        Mặc định ảnh được thu nhỏ / bỏ metadata trước khi upload, gửi "optimize"=false để giữ nguyên ảnh gốc.
+        """
+        value = str(request.data.get("optimize", "")).lower()
+        return IMAGE_PREPROCESS if value == "" else value in ("1", "true")
+
+    def upload_image(self, file, optimize=True):
+        """
+        Upload ảnh lên Cloudinary: xử lý cục bộ trước (nếu bật), file lớn thì upload theo từng phần.
+        """
+        processed = preprocess_image(file) if optimize else None
+        if processed is not None:
+            file, name = processed
+            size = file.getbuffer().nbytes
+        else:
+            file.seek(0)
+            name, size = file.name, file.size
+
+        # ⚠️ Ảnh đã thu nhỏ về IMAGE_MAX_DIMENSION (mặc định 2048px) gần như không thể vượt ngưỡng này:
+        # upload theo từng phần thực tế chỉ dùng tới khi gửi optimize=false (hoặc tắt IMAGE_PREPROCESS)
+        if size > IMAGE_CHUNKED_UPLOAD_THRESHOLD:
+            return cloudinary.uploader.upload_large(file, chunk_size=IMAGE_UPLOAD_CHUNK_SIZE, filename=name)
+        return cloudinary.uploader.upload(file, filename=name)
@@ -0,0 +1,57 @@
+import os
+
+from pydub import AudioSegment
+
+from api.views import summarize_document, SUMMARY_MODES
+from file_reader.views import FileUploadAPIView
+from speech_to_text.views import AudioToTextView, SPEECH_TRIM_SILENCE, normalize_audio, trim_silence
+
+
+def summarize_text(job, report_progress):
+    """
+    Tóm tắt văn bản dài (giống API summarize-text/), tiến độ theo số đoạn đã tóm tắt.
+    """
+    text = job.payload.get("text", "").strip()
+    mode = job.payload.get("mode", "concat")
+    if not text:
+        raise ValueError("Vui lòng nhập văn bản!")
+    if mode not in SUMMARY_MODES:
+        raise ValueError("Chế độ tóm tắt không hợp lệ")
+
+    # ➜ 90% cho bước tóm tắt từng đoạn, phần còn lại là bước gộp
+    return summarize_document(text, mode, on_progress=lambda done, total: report_progress(90 * done // total))
+
+
+def extract_file(job, report_progress):
+    """
+    Đọc nội dung file PDF / DOCX / PPTX (giống API upload/).
+    """
+    file_ext = os.path.splitext(job.input_file.name)[1].lower()
+    text = FileUploadAPIView().read_file(job.input_file.path, file_ext)
+    if text is None:
+        raise ValueError("Unsupported file type")
+    return {"filename": job.payload.get("filename", os.path.basename(job.input_file.name)), "content": text}
+
+
+def audio_to_text(job, report_progress):
+    """
+    Nhận diện giọng nói từ file audio (giống API audio-to-text/).
+    """
+    file_ext = os.path.splitext(job.input_file.name)[1].lower()
+    if file_ext not in [".wav", ".mp3", ".ogg"]:
+        raise ValueError("Unsupported audio format")
+    audio = normalize_audio(AudioSegment.from_file(job.input_file.path, format=file_ext[1:]))
+    if SPEECH_TRIM_SILENCE:
+        audio = trim_silence(audio)
+    return {"text": AudioToTextView().convert_audio_to_text(audio, file_ext)}
+
+
+# 📌 Loại job -> hàm xử lý. Hàm nhận (job, report_progress) và trả về kết quả dạng JSON.
+JOB_HANDLERS = {
+    "summarize_text": summarize_text,
+    "extract_file": extract_file,
+    "audio_to_text": audio_to_text,
+}
+
+# 📌 Các loại job cần file đầu vào
+FILE_JOB_TYPES = {"extract_file", "audio_to_text"}
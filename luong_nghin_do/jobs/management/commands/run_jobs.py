@@ -0,0 +1,57 @@
+import multiprocessing
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.worker import work
+
+
+def stop_workers(signum, frame):
+    raise SystemExit(0)
+
+
+class Command(BaseCommand):
+    help = "Chạy các worker xử lý job nền (tóm tắt văn bản dài, đọc file, nhận diện giọng nói)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=getattr(settings, "JOB_WORKERS", 2),
+            help="Số process worker chạy song song",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Xử lý hết các job đang chờ rồi thoát",
+        )
+
+    def handle(self, *args, **options):
+        workers = max(options["workers"], 1)
+        once = options["once"]
+
+        if workers == 1:
+            processed = work(once=once)
+            self.stdout.write(f"✅ Đã xử lý {processed} job")
+            return
+
+        # 📌 Đóng kết nối DB trước khi fork, mỗi process con tự mở kết nối riêng
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=work, kwargs={"once": once}) for _ in range(workers)]
+
+        # ➜ docker stop gửi SIGTERM: dừng cả các worker con (job dở dang sẽ được chạy lại sau)
+        signal.signal(signal.SIGTERM, stop_workers)
+        for process in processes:
+            process.start()
+        self.stdout.write(f"🚀 Đã chạy {workers} worker")
+
+        try:
+            for process in processes:
+                process.join()
+        except (KeyboardInterrupt, SystemExit):
+            self.stdout.write("⏹️ Đang dừng các worker...")
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
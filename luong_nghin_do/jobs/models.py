@@ -0,0 +1,43 @@
+import uuid
+
+from django.db import models
+
+
+class Job(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    TYPE_CHOICES = [
+        ("summarize_text", "Summarize text"),
+        ("extract_file", "Extract file"),
+        ("audio_to_text", "Audio to text"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    type = models.CharField(max_length=50, choices=TYPE_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    payload = models.JSONField(default=dict, blank=True)  # ➜ Tham số của job (vd: text, mode)
+    input_file = models.FileField(upload_to="jobs/", blank=True)  # ➜ File đầu vào (PDF/DOCX/audio...)
+    progress = models.PositiveSmallIntegerField(default=0)  # ➜ 0 - 100
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)  # ➜ Worker đang / đã xử lý job
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # ➜ Worker cập nhật định kỳ khi đang chạy job
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"{self.type} ({self.status})"
@@ -0,0 +1,7 @@
+from rest_framework import serializers
+from .models import Job
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'type', 'status', 'progress', 'result', 'error', 'attempts', 'created_at', 'started_at', 'finished_at']
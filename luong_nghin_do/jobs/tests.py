@@ -0,0 +1,159 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .models import Job
+from .worker import claim_next_job, requeue_stale_jobs, run_job, work
+
+
+class JobSubmitViewTest(APITestCase):
+    url = "/api/jobs/"
+
+    def test_submit_summarize_returns_job_id(self):
+        response = self.client.post(self.url, {"type": "summarize_text", "text": "Văn bản dài.", "mode": "map_reduce"}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = Job.objects.get(id=response.data["job_id"])
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.payload, {"text": "Văn bản dài.", "mode": "map_reduce"})
+        self.assertEqual(response.data["status_url"], f"/api/jobs/{job.id}/")
+
+    def test_submit_file_job(self):
+        file = SimpleUploadedFile("test.pdf", b"%PDF-1.4", content_type="application/pdf")
+        response = self.client.post(self.url, {"type": "extract_file", "file": file}, format="multipart")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = Job.objects.get(id=response.data["job_id"])
+        self.assertTrue(job.input_file.name.startswith("jobs/"))
+        job.input_file.delete(save=False)
+
+    def test_submit_invalid(self):
+        self.assertEqual(self.client.post(self.url, {"type": "unknown"}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(self.url, {"type": "summarize_text"}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(self.url, {"type": "audio_to_text"}, format="multipart").status_code, 400)
+
+    def test_submit_invalid_mode(self):
+        response = self.client.post(self.url, {"type": "summarize_text", "text": "Văn bản.", "mode": "sai"}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"error": "Chế độ tóm tắt không hợp lệ"})
+        self.assertFalse(Job.objects.exists())
+
+    def test_status_not_found(self):
+        response = self.client.get("/api/jobs/00000000-0000-0000-0000-000000000000/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class JobWorkerTest(APITestCase):
+
+    @patch("jobs.handlers.summarize_document")
+    def test_worker_runs_job_and_reports_progress(self, mock_summarize):
+        progress_seen = []
+
+        def summarize(text, mode, on_progress=None):
+            on_progress(1, 2)
+            progress_seen.append(Job.objects.get(id=job.id).progress)
+            on_progress(2, 2)
+            return {"title": "Tóm tắt văn bản", "summary": "Tóm tắt", "chunks": 2, "reused_chunks": 0}
+
+        mock_summarize.side_effect = summarize
+        job = Job.objects.create(type="summarize_text", payload={"text": "Văn bản.", "mode": "concat"})
+
+        self.assertEqual(work(worker_name="test", once=True), 1)
+
+        response = self.client.get(f"/api/jobs/{job.id}/")
+        self.assertEqual(response.data["status"], Job.SUCCEEDED)
+        self.assertEqual(response.data["progress"], 100)
+        self.assertEqual(response.data["result"]["summary"], "Tóm tắt")
+        self.assertEqual(progress_seen, [45])
+        mock_summarize.assert_called_once()
+
+    def test_failed_job_records_error(self):
+        job = Job.objects.create(type="summarize_text", payload={"text": "Văn bản.", "mode": "sai"})
+
+        work(worker_name="test", once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.error, "Chế độ tóm tắt không hợp lệ")
+
+    @patch("jobs.handlers.FileUploadAPIView.read_file")
+    def test_extract_file_job(self, mock_read_file):
+        mock_read_file.return_value = "Nội dung file"
+        job = Job(type="extract_file", payload={"filename": "bai_giang.pdf"})
+        job.input_file.save("bai_giang.pdf", SimpleUploadedFile("bai_giang.pdf", b"%PDF-1.4"), save=True)
+        file_name = job.input_file.name
+
+        work(worker_name="test", once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.result, {"filename": "bai_giang.pdf", "content": "Nội dung file"})
+        self.assertEqual(mock_read_file.call_args[0][1], ".pdf")
+        # ➜ File đầu vào được xóa sau khi job kết thúc
+        self.assertFalse(job.input_file.storage.exists(file_name))
+
+    def test_claim_is_exclusive(self):
+        job = Job.objects.create(type="summarize_text", payload={"text": "Văn bản."})
+
+        self.assertEqual(claim_next_job("a").id, job.id)
+        self.assertIsNone(claim_next_job("b"))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.attempts), (Job.RUNNING, "a", 1))
+
+    def test_stale_job_is_requeued(self):
+        started_at = timezone.now() - timedelta(days=1)
+        retry = Job.objects.create(
+            type="summarize_text", status=Job.RUNNING, attempts=1, started_at=started_at, heartbeat_at=started_at
+        )
+        give_up = Job.objects.create(type="summarize_text", status=Job.RUNNING, attempts=3, started_at=started_at)
+        # ➜ Chạy đã lâu nhưng worker vẫn heartbeat: không được nhận lại
+        alive = Job.objects.create(
+            type="summarize_text", status=Job.RUNNING, attempts=1, started_at=started_at, heartbeat_at=timezone.now()
+        )
+
+        requeue_stale_jobs()
+
+        retry.refresh_from_db()
+        give_up.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual(retry.status, Job.QUEUED)
+        self.assertEqual(give_up.status, Job.FAILED)
+        self.assertEqual(alive.status, Job.RUNNING)
+
+    @patch("jobs.handlers.FileUploadAPIView.read_file")
+    def test_requeued_run_keeps_input_file(self, mock_read_file):
+        job = Job(type="extract_file", payload={"filename": "tai_lieu.pdf"})
+        job.input_file.save("tai_lieu.pdf", SimpleUploadedFile("tai_lieu.pdf", b"%PDF-1.4"), save=True)
+        first = claim_next_job("a")
+        file_name = first.input_file.name
+
+        def requeue_while_running(*args):
+            # ➜ Lần chạy đầu bị coi là chết và worker khác nhận lại job giữa chừng
+            Job.objects.filter(id=first.id).update(status=Job.QUEUED, worker="")
+            claim_next_job("b")
+            return "Nội dung"
+
+        mock_read_file.side_effect = requeue_while_running
+        self.assertFalse(run_job(first))
+
+        job = Job.objects.get(id=first.id)
+        self.assertEqual((job.status, job.worker, job.attempts), (Job.RUNNING, "b", 2))
+        self.assertIsNone(job.result)
+        # ➜ Lần chạy mới vẫn đang dùng file đầu vào
+        self.assertTrue(job.input_file.storage.exists(file_name))
+        job.input_file.delete(save=False)
+
+    def test_run_jobs_command_once(self):
+        Job.objects.create(type="summarize_text", payload={"text": "Văn bản.", "mode": "sai"})
+        out = StringIO()
+        call_command("run_jobs", "--workers", "1", "--once", stdout=out)
+
+        self.assertIn("1 job", out.getvalue())
+        self.assertFalse(Job.objects.filter(status=Job.QUEUED).exists())
@@ -0,0 +1,66 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from api.views import SUMMARY_MODES
+
+from .handlers import JOB_HANDLERS, FILE_JOB_TYPES
+from .models import Job
+from .serializers import JobSerializer
+
+
+class JobSubmitView(APIView):
+    """
+    Gửi job chạy nền, trả về job_id ngay (202) thay vì giữ request đến khi xử lý xong.
+    - summarize_text: {"type": "summarize_text", "text": "...", "mode": "concat" | "map_reduce"}
+    - extract_file / audio_to_text: multipart với "type" và "file"
+    """
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
+
+    def post(self, request, *args, **kwargs):
+        job_type = request.data.get("type")
+        if job_type not in JOB_HANDLERS:
+            return Response({"error": "Loại job không hợp lệ"}, status=status.HTTP_400_BAD_REQUEST)
+
+        payload = {}
+        file = None
+        if job_type in FILE_JOB_TYPES:
+            file = request.FILES.get("file")
+            if not file:
+                return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
+            payload["filename"] = file.name
+        else:
+            text = (request.data.get("text") or "").strip()
+            if not text:
+                return Response({"error": "Vui lòng nhập văn bản!"}, status=status.HTTP_400_BAD_REQUEST)
+            mode = str(request.data.get("mode") or "concat").strip().lower()
+            # ➜ Kiểm tra ngay khi gửi, không để job vào hàng đợi rồi mới thất bại ở worker
+            if mode not in SUMMARY_MODES:
+                return Response({"error": "Chế độ tóm tắt không hợp lệ"}, status=status.HTTP_400_BAD_REQUEST)
+            payload["text"] = text
+            payload["mode"] = mode
+
+        job = Job(type=job_type, payload=payload)
+        if file:
+            job.input_file.save(file.name, file, save=False)
+        job.save()
+
+        return Response({
+            "job_id": str(job.id),
+            "status": job.status,
+            "status_url": reverse("job-status", kwargs={"job_id": job.id}),
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class JobStatusView(APIView):
+    """
+    Xem trạng thái, tiến độ (0 - 100) và kết quả của job.
+    """
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = Job.objects.filter(id=job_id).first()
+        if job is None:
+            return Response({"error": "Không tìm thấy job"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(JobSerializer(job).data)
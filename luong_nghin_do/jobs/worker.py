@@ -0,0 +1,150 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .handlers import JOB_HANDLERS
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_POLL_INTERVAL = getattr(settings, "JOB_POLL_INTERVAL", 1.0)  # ➜ Giây chờ khi hàng đợi trống
+JOB_MAX_ATTEMPTS = getattr(settings, "JOB_MAX_ATTEMPTS", 3)
+JOB_HEARTBEAT_INTERVAL = getattr(settings, "JOB_HEARTBEAT_INTERVAL", 30)  # ➜ Giây giữa hai lần báo còn sống
+JOB_STALE_AFTER = getattr(settings, "JOB_STALE_AFTER", 300)  # ➜ Không có heartbeat quá mức này coi như worker đã chết
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def requeue_stale_jobs():
+    """
+    Job đang "running" mà không có heartbeat quá JOB_STALE_AFTER giây (worker bị kill / container restart
+    giữa chừng) được đưa lại hàng đợi, hoặc đánh dấu failed nếu đã hết số lần thử.
+    Job chạy lâu nhưng worker còn sống vẫn heartbeat đều nên không bị nhận lại.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=JOB_STALE_AFTER)
+    stale = Job.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff), status=Job.RUNNING
+    )
+    stale.filter(attempts__gte=JOB_MAX_ATTEMPTS).update(
+        status=Job.FAILED, error="Worker dừng khi đang xử lý job", finished_at=now
+    )
+    stale.filter(attempts__lt=JOB_MAX_ATTEMPTS).update(status=Job.QUEUED, worker="")
+
+
+def claim_next_job(worker_name):
+    """
+    Nhận job "queued" cũ nhất. Việc nhận là một UPDATE có điều kiện status="queued" nên hai worker
+    không bao giờ nhận trùng một job (chạy được trên cả MySQL lẫn SQLite, không cần khóa dòng).
+    Trả về None khi hàng đợi trống.
+    """
+    candidates = Job.objects.filter(status=Job.QUEUED).order_by("created_at").values_list("id", flat=True)[:10]
+    for job_id in candidates:
+        claimed = Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            worker=worker_name,
+            progress=0,
+            attempts=F("attempts") + 1,
+            started_at=timezone.now(),
+            heartbeat_at=timezone.now(),
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def current_run(job):
+    """
+    Queryset chỉ khớp khi lần chạy này vẫn giữ job: cùng worker và cùng lượt thử (attempts tăng mỗi lần nhận).
+    Job đã bị coi là chết và được nhận lại thì lần chạy cũ không được ghi đè kết quả hay xóa file đầu vào.
+    """
+    return Job.objects.filter(id=job.id, status=Job.RUNNING, worker=job.worker, attempts=job.attempts)
+
+
+def heartbeat(job, stop):
+    """
+    Chạy trong thread riêng: cập nhật heartbeat_at mỗi JOB_HEARTBEAT_INTERVAL giây cho tới khi job kết thúc
+    hoặc lần chạy này không còn giữ job.
+    """
+    try:
+        while not stop.wait(JOB_HEARTBEAT_INTERVAL):
+            if not current_run(job).update(heartbeat_at=timezone.now()):
+                return
+    except Exception as e:
+        logger.warning(f"⚠️ Không cập nhật được heartbeat của job {job.id}: {str(e)}")
+    finally:
+        connection.close()
+
+
+def run_job(job):
+    """
+    Chạy job bằng hàm xử lý tương ứng rồi lưu kết quả / lỗi. Trả về True nếu thành công.
+    """
+    def report_progress(percent):
+        current_run(job).update(progress=min(max(int(percent), 0), 100), heartbeat_at=timezone.now())
+
+    stop = threading.Event()
+    threading.Thread(target=heartbeat, args=(job, stop), daemon=True).start()
+
+    handler = JOB_HANDLERS.get(job.type)
+    try:
+        if handler is None:
+            raise ValueError(f"Loại job không hợp lệ: {job.type}")
+        result = handler(job, report_progress)
+    except Exception as e:
+        logger.exception(f"⚠️ Job {job.id} ({job.type}) lỗi: {str(e)}")
+        finished = current_run(job).update(status=Job.FAILED, error=str(e), finished_at=timezone.now())
+        succeeded = False
+    else:
+        finished = current_run(job).update(
+            status=Job.SUCCEEDED, result=result, progress=100, error="", finished_at=timezone.now()
+        )
+        succeeded = True
+    finally:
+        stop.set()
+
+    if not finished:
+        # ➜ Job đã được nhận lại bởi lần chạy khác, file đầu vào thuộc về lần chạy đó
+        logger.warning(f"⚠️ Job {job.id} đã được nhận lại, bỏ kết quả của lần chạy này")
+        return False
+
+    # 📌 Job đã kết thúc thì không cần giữ file đầu vào nữa
+    if job.input_file:
+        job.input_file.delete(save=False)
+    return succeeded
+
+
+def work(worker_name=None, once=False, poll_interval=None):
+    """
+    Vòng lặp của một worker: nhận job, chạy, lặp lại. once=True thì dừng khi hàng đợi trống.
+    Trả về số job đã xử lý.
+    """
+    worker_name = worker_name or default_worker_name()
+    poll_interval = JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    processed = 0
+
+    while True:
+        # 📌 Worker chạy lâu, không qua vòng đời request nên tự dọn kết nối DB cũ / hỏng
+        close_old_connections()
+        requeue_stale_jobs()
+        job = claim_next_job(worker_name)
+
+        if job is None:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+            continue
+
+        logger.info(f"🔹 {worker_name} nhận job {job.id} ({job.type})")
+        run_job(job)
+        processed += 1
@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'luong_nghin_do.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# ➜ Import sau khi Django đã được setup (speech_to_text.live dùng settings)
+from speech_to_text.backends import preload_backends  # noqa: E402
+from speech_to_text.live import websocket_router  # noqa: E402
+
+# 📌 Nạp sẵn model nhận diện giọng nói một lần cho mỗi worker (chỉ process server, không chạy cho lệnh manage.py)
+preload_backends()
+
+# 📌 WebSocket /ws/audio-to-text/ (phụ đề trực tiếp) đi thẳng vào speech_to_text.live
+application = websocket_router(django_application)
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'file_reader',
     'speech_to_text',
     'text_to_speech',
+    'jobs',
     'corsheaders',
 ]
 
@@ -146,7 +147,89 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# 📌 File upload / file sinh ra (mp3, file đầu vào của job nền), dùng chung giữa web và worker
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# 📌 Số request OpenAI tối đa chạy song song trong mỗi process
+OPENAI_MAX_CONCURRENCY = 8
+
+# 📌 Cache kết quả LLM (lưu trong DB, dùng chung giữa các worker)
+LLM_CACHE_MAX_ENTRIES = 5000
+LLM_CACHE_TTL = 7 * 24 * 3600  # giây
+CHUNK_INDEX_MAX_ENTRIES = 100000  # ➜ Chỉ mục bản tóm tắt từng đoạn (không hết hạn, chỉ xóa theo LRU)
+
+# 📌 Thời gian tối đa (giây) chờ một run của Assistant trong chat_with_ai
+OPENAI_RUN_TIMEOUT = 60
+
+# 📌 Số token tối đa của mỗi đoạn khi chia văn bản dài để tóm tắt
+SUMMARY_CHUNK_TOKENS = 2000
+
+# 📌 Chế độ map_reduce của summarize_text: độ dài (token) tối đa của bản tóm tắt cuối
+SUMMARY_TARGET_TOKENS = 500
+
+# 📌 Số văn bản tối đa trong một request summarize-text-short/batch/
+SUMMARY_BATCH_MAX_ITEMS = 100
+
+# 📌 Hàng đợi job chạy nền (python manage.py run_jobs)
+JOB_WORKERS = 2  # ➜ Số process worker
+JOB_POLL_INTERVAL = 1.0  # ➜ Giây chờ khi hàng đợi trống
+JOB_MAX_ATTEMPTS = 3  # ➜ Số lần chạy lại job khi worker dừng giữa chừng
+JOB_HEARTBEAT_INTERVAL = 30  # ➜ Giây giữa hai lần worker báo còn sống khi đang chạy job
+JOB_STALE_AFTER = 300  # ➜ Job "running" không có heartbeat quá số giây này coi như worker đã chết
+
+# 📌 Upload nhỏ hơn mức này được đọc thẳng trong bộ nhớ, lớn hơn thì Django ghi ra file tạm
+FILE_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024
+
+# 📌 PDF từ số trang này trở lên được đọc song song theo trang bằng nhiều process
+PDF_PARALLEL_MIN_PAGES = 50
+PDF_PARALLEL_WORKERS = 4  # ➜ Nên đặt bằng số nhân CPU của máy chủ
+
+# 📌 Tính SHA-256 của file ngay khi upload (dùng làm khóa cache nội dung file)
+FILE_UPLOAD_HANDLERS = [
+    'file_reader.upload_handlers.HashingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# 📌 Cache nội dung file đã đọc (PDF/DOCX/PPTX) theo SHA-256
+EXTRACTION_CACHE_MAX_ENTRIES = 1000
+EXTRACTION_CACHE_MAX_CHARS = 2_000_000  # ➜ File có nội dung dài hơn thì không lưu cache
+
+# 📌 Upload ảnh (uploadFile/): thu nhỏ + bỏ metadata trước khi gửi Cloudinary
+IMAGE_PREPROCESS = True
+IMAGE_MAX_DIMENSION = 2048  # ➜ Cạnh dài tối đa (px)
+IMAGE_JPEG_QUALITY = 85
+IMAGE_CHUNKED_UPLOAD_THRESHOLD = 20 * 1024 * 1024  # ➜ Lớn hơn thì dùng upload_large (chia phần)
+IMAGE_UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+
+# 📌 Nhận diện giọng nói bản ghi dài (audio-to-text/ với long_audio=true)
+SPEECH_MAX_CONCURRENCY = 4  # ➜ Số đoạn nhận diện song song
+SPEECH_SEGMENT_MAX_MS = 50_000  # ➜ Độ dài tối đa mỗi đoạn gửi đi (ms)
+SPEECH_MIN_SILENCE_MS = 700  # ➜ Khoảng lặng tối thiểu để cắt (ms)
+SPEECH_SILENCE_THRESH_DB = 16  # ➜ Thấp hơn âm lượng trung bình bao nhiêu dB thì coi là lặng
+
+# 📌 Phụ đề trực tiếp qua WebSocket (/ws/audio-to-text/)
+LIVE_SILENCE_MS = 600  # ➜ Lặng lâu như vậy (ms) thì kết thúc câu
+LIVE_MAX_WINDOW_MS = 15_000  # ➜ Câu dài hơn thì cắt luôn
+LIVE_PARTIAL_MS = 2_000  # ➜ Bao lâu gửi bản nháp một lần (0 = tắt)
+LIVE_SPEECH_RMS = 300  # ➜ Âm lượng tối thiểu coi là có tiếng
+
+# 📌 Cache kết quả nhận diện giọng nói theo dấu vân tay audio
+TRANSCRIPT_CACHE_MAX_ENTRIES = 2000
+TRANSCRIPT_CACHE_TTL = 30 * 24 * 3600  # giây
+
+# 📌 Engine nhận diện giọng nói: "google" (Google Web Speech, cần internet) hoặc "vosk" (offline trên CPU,
+# cần `pip install vosk` và tải model tiếng Việt, vd: vosk-model-small-vn). Request có thể chọn riêng qua trường backend.
+SPEECH_BACKEND = "google"
+SPEECH_PRELOAD_BACKENDS = [SPEECH_BACKEND]  # ➜ Nạp sẵn model khi mỗi worker khởi động
+SPEECH_VOSK_MODEL_PATH = BASE_DIR / "models" / "vosk-model-small-vn"
+
+# 📌 Tiền xử lý audio trước khi nhận diện (luôn đưa về mono 16 kHz)
+SPEECH_TRIM_SILENCE = True  # ➜ Cắt khoảng lặng đầu / cuối
+SPEECH_VAD_THRESH_DBFS = -40  # ➜ To hơn mức này (dBFS) thì coi là có tiếng
@@ -9,5 +9,6 @@ urlpatterns = [
     path('api/', include('file_reader.urls')),
     path('api/', include('speech_to_text.urls')),
     path('api/', include('text_to_speech.urls')),
+    path('api/', include('jobs.urls')),
     path('api/', include('speech_to_text.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
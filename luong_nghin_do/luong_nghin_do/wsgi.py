@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'luong_nghin_do.settings')
 
 application = get_wsgi_application()
+
+# 📌 Nạp sẵn model nhận diện giọng nói một lần cho mỗi worker (chỉ process server, không chạy cho lệnh manage.py)
+from speech_to_text.backends import preload_backends  # noqa: E402
+
+preload_backends()
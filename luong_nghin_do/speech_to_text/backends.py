@@ -0,0 +1,142 @@
+"""
+Các engine nhận diện giọng nói. Engine mặc định chọn theo SPEECH_BACKEND, từng request có thể chọn riêng.
+Mỗi engine được tạo một lần cho mỗi process (model offline nạp sẵn lúc khởi động) và dùng chung giữa các request.
+"""
+import io
+import json
+import logging
+import threading
+
+import speech_recognition as sr
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SPEECH_BACKEND = getattr(settings, "SPEECH_BACKEND", "google")
+SPEECH_PRELOAD_BACKENDS = getattr(settings, "SPEECH_PRELOAD_BACKENDS", [SPEECH_BACKEND])
+SPEECH_VOSK_MODEL_PATH = getattr(settings, "SPEECH_VOSK_MODEL_PATH", "")
+
+
+class BackendUnavailable(Exception):
+    """
+    Engine không dùng được (chưa cài thư viện, thiếu model...).
+    """
+
+
+class SpeechBackend:
+    """
+    Engine nhận diện: transcribe() nhận AudioSegment, trả về text.
+    Không nhận diện được thì ném sr.UnknownValueError, lỗi kết nối / engine thì ném sr.RequestError.
+    """
+    name = ""
+
+    def load(self):
+        """
+        Nạp model (nếu có). Được gọi một lần lúc khởi động hoặc ở lần dùng đầu tiên.
+        """
+
+    def transcribe(self, audio, language="vi-VN"):
+        raise NotImplementedError
+
+
+class GoogleBackend(SpeechBackend):
+    """
+    Google Web Speech API qua speech_recognition (cần internet).
+    """
+    name = "google"
+
+    def transcribe(self, audio, language="vi-VN"):
+        buffer = io.BytesIO()
+        audio.export(buffer, format="wav")
+        buffer.seek(0)
+
+        recognizer = sr.Recognizer()
+        with sr.AudioFile(buffer) as source:
+            audio_data = recognizer.record(source)
+        return recognizer.recognize_google(audio_data, language=language)
+
+
+class VoskBackend(SpeechBackend):
+    """
+    Vosk (Kaldi) chạy offline trên CPU. Cần `pip install vosk` và model tiếng Việt
+    (vd: vosk-model-small-vn) tại SPEECH_VOSK_MODEL_PATH.
+    Model dùng chung giữa các thread, mỗi lần nhận diện tạo một KaldiRecognizer riêng.
+    """
+    name = "vosk"
+    sample_rate = 16000
+    chunk_bytes = 16000 * 2  # ➜ Đưa vào recognizer từng giây audio
+
+    def __init__(self, model_path=None):
+        self.model_path = model_path or SPEECH_VOSK_MODEL_PATH
+        self.model = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.model is not None:
+                return
+            try:
+                import vosk
+            except ImportError:
+                raise BackendUnavailable("Chưa cài thư viện vosk")
+            if not self.model_path:
+                raise BackendUnavailable("Chưa cấu hình SPEECH_VOSK_MODEL_PATH")
+            try:
+                vosk.SetLogLevel(-1)
+                self.model = vosk.Model(str(self.model_path))
+            except Exception as e:
+                raise BackendUnavailable(f"Không nạp được model Vosk: {str(e)}")
+            logger.info(f"🔹 Đã nạp model Vosk từ {self.model_path}")
+
+    def transcribe(self, audio, language="vi-VN"):
+        import vosk
+
+        self.load()
+        pcm = audio.set_channels(1).set_frame_rate(self.sample_rate).set_sample_width(2).raw_data
+        recognizer = vosk.KaldiRecognizer(self.model, self.sample_rate)
+        for offset in range(0, len(pcm), self.chunk_bytes):
+            recognizer.AcceptWaveform(pcm[offset:offset + self.chunk_bytes])
+
+        text = json.loads(recognizer.FinalResult()).get("text", "").strip()
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+BACKENDS = {
+    "google": GoogleBackend,
+    "vosk": VoskBackend,
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_backend(name=None):
+    """
+    Engine theo tên (mặc định SPEECH_BACKEND), mỗi process chỉ tạo và nạp một lần.
+    Ném BackendUnavailable nếu không dùng được.
+    """
+    name = name or SPEECH_BACKEND
+    if name not in BACKENDS:
+        raise BackendUnavailable(f"Không có engine nhận diện {name}")
+
+    with _instances_lock:
+        backend = _instances.get(name)
+        if backend is None:
+            backend = BACKENDS[name]()
+            _instances[name] = backend
+    backend.load()
+    return backend
+
+
+def preload_backends():
+    """
+    Nạp sẵn model của các engine cấu hình trong SPEECH_PRELOAD_BACKENDS khi worker khởi động,
+    để request đầu tiên không phải chờ nạp model. Lỗi chỉ ghi log.
+    """
+    for name in SPEECH_PRELOAD_BACKENDS:
+        try:
+            get_backend(name)
+        except BackendUnavailable as e:
+            logger.warning(f"⚠️ Không nạp sẵn được engine nhận diện {name}: {str(e)}")
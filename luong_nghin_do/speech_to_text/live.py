@@ -0,0 +1,199 @@
+"""
+Phụ đề trực tiếp qua WebSocket (ASGI thuần, không cần Django Channels).
+
+Client kết nối ws://<host>/ws/audio-to-text/?sample_rate=16000 rồi gửi liên tục các frame
+PCM 16-bit little-endian mono (binary). Server gom frame thành từng câu nói (cắt khi gặp khoảng lặng
+hoặc khi cửa sổ quá dài) và gửi về các message JSON:
+- {"type": "partial", "text": ..., "start": ...}: bản nháp của câu đang nói
+- {"type": "final", "text": ..., "start": ..., "end": ...}: câu đã nói xong (thời gian tính bằng giây)
+Gửi text {"type": "stop"} để kết thúc: câu đang dở được nhận diện nốt rồi server đóng kết nối.
+"""
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from pydub import AudioSegment
+
+from .views import recognize_segment, speech_executor
+
+logger = logging.getLogger(__name__)
+
+LIVE_PATH = "/ws/audio-to-text/"
+LIVE_SAMPLE_WIDTH = 2  # ➜ PCM 16-bit
+LIVE_FRAME_MS = 20  # ➜ Độ phân giải khi phát hiện khoảng lặng
+LIVE_SILENCE_MS = getattr(settings, "LIVE_SILENCE_MS", 600)  # ➜ Lặng lâu như vậy thì kết thúc câu
+LIVE_MAX_WINDOW_MS = getattr(settings, "LIVE_MAX_WINDOW_MS", 15_000)  # ➜ Câu dài hơn thì cắt luôn
+LIVE_PARTIAL_MS = getattr(settings, "LIVE_PARTIAL_MS", 2_000)  # ➜ Bao lâu gửi bản nháp một lần (0 = tắt)
+LIVE_SPEECH_RMS = getattr(settings, "LIVE_SPEECH_RMS", 300)  # ➜ Âm lượng (RMS) tối thiểu coi là có tiếng
+
+
+class LiveTranscriber:
+    """
+    Gom các frame PCM thành cửa sổ cỡ một câu nói. feed() / flush() trả về các sự kiện
+    ("partial" | "final", AudioSegment, start_ms, end_ms) cần nhận diện.
+    """
+
+    def __init__(self, sample_rate, silence_ms=None, max_window_ms=None, partial_ms=None, speech_rms=None):
+        self.sample_rate = sample_rate
+        self.silence_ms = silence_ms or LIVE_SILENCE_MS
+        self.max_window_ms = max_window_ms or LIVE_MAX_WINDOW_MS
+        self.partial_ms = LIVE_PARTIAL_MS if partial_ms is None else partial_ms
+        self.speech_rms = speech_rms or LIVE_SPEECH_RMS
+        self.frame_bytes = sample_rate * LIVE_SAMPLE_WIDTH * LIVE_FRAME_MS // 1000
+
+        self.pending = bytearray()  # ➜ Phần chưa đủ một frame
+        self.window = bytearray()
+        self.window_start_ms = 0
+        self.position_ms = 0
+        self.trailing_silence_ms = 0
+        self.since_partial_ms = 0
+
+    def segment(self, data):
+        return AudioSegment(
+            data=bytes(data), sample_width=LIVE_SAMPLE_WIDTH, frame_rate=self.sample_rate, channels=1
+        )
+
+    def window_ms(self):
+        return len(self.window) * 1000 // (self.sample_rate * LIVE_SAMPLE_WIDTH)
+
+    def close_window(self):
+        event = ("final", self.segment(self.window), self.window_start_ms, self.position_ms)
+        self.window = bytearray()
+        self.trailing_silence_ms = 0
+        self.since_partial_ms = 0
+        return event
+
+    def feed(self, data):
+        events = []
+        self.pending.extend(data)
+        while len(self.pending) >= self.frame_bytes:
+            frame = bytes(self.pending[:self.frame_bytes])
+            del self.pending[:self.frame_bytes]
+            self.position_ms += LIVE_FRAME_MS
+            is_speech = self.segment(frame).rms >= self.speech_rms
+
+            if not self.window:
+                if not is_speech:
+                    continue  # ➜ Bỏ khoảng lặng giữa các câu
+                self.window_start_ms = self.position_ms - LIVE_FRAME_MS
+
+            self.window.extend(frame)
+            self.trailing_silence_ms = 0 if is_speech else self.trailing_silence_ms + LIVE_FRAME_MS
+            self.since_partial_ms += LIVE_FRAME_MS
+
+            if self.trailing_silence_ms >= self.silence_ms or self.window_ms() >= self.max_window_ms:
+                events.append(self.close_window())
+            elif self.partial_ms and self.since_partial_ms >= self.partial_ms:
+                self.since_partial_ms = 0
+                events.append(("partial", self.segment(self.window), self.window_start_ms, self.position_ms))
+        return events
+
+    def flush(self):
+        return [self.close_window()] if self.window else []
+
+
+async def send_results(outbox, send):
+    """
+    Gửi kết quả theo đúng thứ tự câu, dù việc nhận diện các câu chạy song song.
+    """
+    while True:
+        item = await outbox.get()
+        if item is None:
+            return
+        kind, future, start_ms, end_ms = item
+        try:
+            text, error = await future
+        except Exception as e:
+            logger.exception(f"⚠️ Lỗi nhận diện giọng nói trực tiếp: {str(e)}")
+            text, error = "", "Không thể nhận diện giọng nói"
+
+        if not text and not error:
+            continue  # ➜ Đoạn không có lời nói
+
+        message = {"type": kind, "text": text, "start": start_ms / 1000}
+        if kind == "final":
+            message["end"] = end_ms / 1000
+        if error:
+            message["error"] = error
+        await send({"type": "websocket.send", "text": json.dumps(message, ensure_ascii=False)})
+
+
+async def live_transcription(scope, receive, send):
+    """
+    ASGI app cho WebSocket LIVE_PATH.
+    """
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+
+    params = parse_qs(scope.get("query_string", b"").decode())
+    try:
+        sample_rate = int(params.get("sample_rate", ["16000"])[0])
+    except ValueError:
+        sample_rate = 0
+    if params.get("encoding", ["pcm16"])[0] != "pcm16" or not 8000 <= sample_rate <= 48000:
+        # ➜ Chỉ nhận PCM16 (trình duyệt lấy được qua AudioWorklet), chưa giải mã Opus
+        await send({"type": "websocket.close", "code": 1003})
+        return
+
+    await send({"type": "websocket.accept"})
+
+    loop = asyncio.get_running_loop()
+    transcriber = LiveTranscriber(sample_rate)
+    outbox = asyncio.Queue()
+    sender = asyncio.create_task(send_results(outbox, send))
+    partial_future = None
+    connected = True
+
+    def dispatch(events):
+        nonlocal partial_future
+        for kind, audio, start_ms, end_ms in events:
+            if kind == "partial" and partial_future is not None and not partial_future.done():
+                continue  # ➜ Bản nháp trước chưa xong thì bỏ qua, không dồn request
+            future = loop.run_in_executor(speech_executor, recognize_segment, audio)
+            if kind == "partial":
+                partial_future = future
+            outbox.put_nowait((kind, future, start_ms, end_ms))
+
+    try:
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                connected = False
+                break
+            if message.get("bytes"):
+                dispatch(transcriber.feed(message["bytes"]))
+            elif message.get("text"):
+                try:
+                    command = json.loads(message["text"])
+                except json.JSONDecodeError:
+                    command = {}
+                if command.get("type") == "stop":
+                    # ➜ Chỉ nhận diện nốt câu đang dở khi client chủ động kết thúc,
+                    # client đã ngắt kết nối thì kết quả không gửi đi đâu được nữa
+                    dispatch(transcriber.flush())
+                    break
+    finally:
+        outbox.put_nowait(None)
+        if connected:
+            await sender
+            await send({"type": "websocket.close", "code": 1000})
+        else:
+            sender.cancel()
+
+
+def websocket_router(http_application):
+    """
+    Bọc ASGI app của Django: WebSocket LIVE_PATH đi vào live_transcription, còn lại giữ nguyên.
+    """
+    async def application(scope, receive, send):
+        if scope["type"] == "websocket":
+            if scope["path"] == LIVE_PATH:
+                return await live_transcription(scope, receive, send)
+            await receive()
+            return await send({"type": "websocket.close", "code": 1000})
+        return await http_application(scope, receive, send)
+
+    return application
@@ -0,0 +1,53 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from pydub import AudioSegment
+
+from speech_to_text.backends import BACKENDS, BackendUnavailable
+from speech_to_text.views import recognize_segment
+
+
+class Command(BaseCommand):
+    help = "Đo thời gian nhận diện một file audio với từng engine (chạy offline, không qua HTTP)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="File audio (.wav, .mp3, .ogg)")
+        parser.add_argument(
+            "--backend", action="append", choices=list(BACKENDS),
+            help="Engine cần đo (lặp lại để đo nhiều engine), mặc định đo tất cả",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Số lần nhận diện mỗi engine")
+
+    def handle(self, *args, **options):
+        path = options["file"]
+        try:
+            audio = AudioSegment.from_file(path, format=os.path.splitext(path)[1][1:].lower())
+        except Exception as e:
+            raise CommandError(f"Không đọc được file audio {path}: {str(e)}")
+        self.stdout.write(f"🔹 {path}: {len(audio) / 1000:.1f}s audio")
+
+        for name in options["backend"] or list(BACKENDS):
+            # ➜ Thời gian nạp model tính riêng, không lẫn vào thời gian nhận diện.
+            # Tạo engine mới thay vì get_backend(): bản dùng chung có thể đã được nạp sẵn, sẽ đo ra ~0s
+            started = time.perf_counter()
+            try:
+                backend = BACKENDS[name]()
+                backend.load()
+            except BackendUnavailable as e:
+                self.stdout.write(f"⚠️ {name}: bỏ qua ({str(e)})")
+                continue
+            load_seconds = time.perf_counter() - started
+
+            timings = []
+            for _ in range(max(options["repeat"], 1)):
+                started = time.perf_counter()
+                text, error = recognize_segment(audio, backend)
+                timings.append(time.perf_counter() - started)
+
+            best = min(timings)
+            self.stdout.write(
+                f"✅ {name}: nạp {load_seconds:.2f}s, nhận diện tốt nhất {best:.2f}s "
+                f"(RTF {best / max(len(audio) / 1000, 0.001):.2f}), trung bình {sum(timings) / len(timings):.2f}s"
+            )
+            self.stdout.write(f"   ➜ {error or text}")
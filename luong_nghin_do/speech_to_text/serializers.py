@@ -1,4 +1,7 @@
 from rest_framework import serializers
+from .backends import BACKENDS
 
 class AudioUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
+    long_audio = serializers.BooleanField(required=False, default=False)  # ➜ Bản ghi dài: cắt theo khoảng lặng
+    backend = serializers.ChoiceField(choices=list(BACKENDS), required=False)  # ➜ Bỏ trống: dùng SPEECH_BACKEND
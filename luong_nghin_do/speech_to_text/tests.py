@@ -35,4 +35,352 @@ class AudioToTextViewTest(APITestCase):
     def test_no_file_uploaded(self):
         response = self.client.post(self.url, {}, format='multipart')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertIn('file', response.data)  # Expect serializer error for missing 'file'
\ No newline at end of file
+        self.assertIn('file', response.data)  # Expect serializer error for missing 'file'
+
+import os
+import threading
+import speech_recognition as sr
+from pydub.generators import Sine
+
+
+class ConvertAudioToTextTest(APITestCase):
+
+    def make_audio(self, frequency, duration):
+        return Sine(frequency).to_audio_segment(duration=duration).set_frame_rate(16000)
+
+    @patch('speech_to_text.views.sr.Recognizer.recognize_google')
+    @patch('speech_to_text.views.AudioSegment.from_file')
+    def test_conversion_happens_in_memory(self, mock_from_file, mock_recognize):
+        mock_from_file.return_value = self.make_audio(440, 500)
+        mock_recognize.return_value = "Xin chào"
+
+        text = AudioToTextView().convert_audio_to_text(io.BytesIO(b"fake-mp3"), ".mp3")
+
+        self.assertEqual(text, "Xin chào")
+        self.assertFalse(os.path.exists("temp_audio.wav"))
+
+    @patch('speech_to_text.views.AudioSegment.from_file')
+    def test_concurrent_conversions_do_not_interfere(self, mock_from_file):
+        durations = {"a.mp3": 300, "b.mp3": 900}
+        mock_from_file.side_effect = lambda file, format: self.make_audio(440, durations[file.name])
+        barrier = threading.Barrier(2)
+        results = {}
+
+        def recognize(recognizer, audio_data, language):
+            barrier.wait(timeout=5)  # ➜ Hai request cùng đang nhận diện một lúc
+            return f"{len(audio_data.frame_data) // 32} ms"
+
+        def convert(name):
+            file = io.BytesIO(b"fake-mp3")
+            file.name = name
+            results[name] = AudioToTextView().convert_audio_to_text(file, ".mp3")
+
+        with patch('speech_to_text.views.sr.Recognizer.recognize_google', autospec=True, side_effect=recognize):
+            threads = [threading.Thread(target=convert, args=(name,)) for name in durations]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(results, {"a.mp3": "300 ms", "b.mp3": "900 ms"})
+
+
+from pydub import AudioSegment as Segment
+from .views import silence_segments
+
+
+class LongAudioTranscriptionTest(APITestCase):
+
+    def make_lecture(self):
+        tone = lambda ms: Sine(440).to_audio_segment(duration=ms).set_frame_rate(16000).apply_gain(-3)
+        silence = lambda ms: Segment.silent(duration=ms, frame_rate=16000)
+        return tone(2000) + silence(1500) + tone(1000) + silence(1500) + tone(1500)
+
+    @patch('speech_to_text.views.SPEECH_SEGMENT_MAX_MS', 3000)
+    def test_silence_segments(self):
+        segments = silence_segments(self.make_lecture())
+
+        self.assertEqual(len(segments), 3)
+        starts = [start for start, _ in segments]
+        self.assertEqual(starts, sorted(starts))
+        self.assertAlmostEqual(segments[1][0], 3500 - 200, delta=20)
+
+    def test_long_range_is_cut(self):
+        tone = Sine(440).to_audio_segment(duration=5000).set_frame_rate(16000)
+        self.assertEqual(silence_segments(tone, max_ms=2000), [(0, 2000), (2000, 4000), (4000, 5000)])
+
+    @patch('speech_to_text.views.SPEECH_SEGMENT_MAX_MS', 3000)
+    def test_long_audio_endpoint_stitches_in_order(self):
+        buffer = io.BytesIO()
+        self.make_lecture().export(buffer, format="wav")
+        buffer.seek(0)
+        buffer.name = "bai_giang.wav"
+
+        def recognize(recognizer, audio_data, language):
+            duration = len(audio_data.frame_data) // 32
+            if duration < 1600:
+                raise sr.UnknownValueError()
+            return f"đoạn {duration // 100}"
+
+        with patch('speech_to_text.views.sr.Recognizer.recognize_google', autospec=True, side_effect=recognize):
+            response = self.client.post(reverse('audio-to-text'), {'file': buffer, 'long_audio': 'true'}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        segments = response.data["segments"]
+        self.assertEqual(len(segments), 3)
+        self.assertEqual(segments[0]["start"], 0)
+        self.assertEqual(segments[1]["text"], "")
+        self.assertEqual(response.data["text"], f"{segments[0]['text']} {segments[2]['text']}")
+
+
+import asyncio
+import json
+from django.test import SimpleTestCase
+from .live import LiveTranscriber, live_transcription
+
+
+def pcm(ms, loud=True, sample_rate=16000):
+    if loud:
+        audio = Sine(440, sample_rate=sample_rate).to_audio_segment(duration=ms)
+    else:
+        audio = Segment.silent(duration=ms, frame_rate=sample_rate)
+    return audio.set_channels(1).set_sample_width(2).raw_data
+
+
+class LiveTranscriberTest(SimpleTestCase):
+
+    def test_utterance_closed_on_silence(self):
+        transcriber = LiveTranscriber(16000, silence_ms=400, partial_ms=0)
+
+        events = transcriber.feed(pcm(300, loud=False) + pcm(1000) + pcm(500, loud=False))
+
+        self.assertEqual(len(events), 1)
+        kind, audio, start_ms, end_ms = events[0]
+        self.assertEqual((kind, start_ms, end_ms), ("final", 300, 1700))
+        self.assertEqual(len(audio), 1400)
+        self.assertEqual(transcriber.flush(), [])
+
+    def test_partials_and_max_window(self):
+        transcriber = LiveTranscriber(16000, max_window_ms=3000, partial_ms=1000)
+
+        # ➜ Gửi từng frame nhỏ lẻ như client thật
+        data = pcm(3500)
+        events = []
+        for offset in range(0, len(data), 1000):
+            events += transcriber.feed(data[offset:offset + 1000])
+
+        self.assertEqual([kind for kind, *_ in events], ["partial", "partial", "final"])
+        self.assertEqual(events[-1][2:], (0, 3000))
+        self.assertEqual(transcriber.flush()[0][2:], (3000, 3500))
+
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LiveTranscriptionSocketTest(SimpleTestCase):
+
+    def run_socket(self, messages, query_string=b"sample_rate=16000"):
+        sent = []
+
+        async def main():
+            incoming = asyncio.Queue()
+            for message in [{"type": "websocket.connect"}] + messages:
+                incoming.put_nowait(message)
+
+            async def send(message):
+                sent.append(message)
+
+            await live_transcription({"type": "websocket", "path": "/ws/audio-to-text/", "query_string": query_string}, incoming.get, send)
+
+        asyncio.run(main())
+        return sent
+
+    @patch('speech_to_text.live.LIVE_PARTIAL_MS', 0)
+    @patch('speech_to_text.live.recognize_segment')
+    def test_final_transcripts_in_order(self, mock_recognize):
+        mock_recognize.side_effect = lambda audio: (f"câu dài {len(audio)} ms", None)
+
+        sent = self.run_socket([
+            {"type": "websocket.receive", "bytes": pcm(800) + pcm(700, loud=False)},
+            {"type": "websocket.receive", "bytes": pcm(1200)},
+            {"type": "websocket.receive", "text": json.dumps({"type": "stop"})},
+        ])
+
+        self.assertEqual(sent[0], {"type": "websocket.accept"})
+        results = [json.loads(message["text"]) for message in sent if message["type"] == "websocket.send"]
+        self.assertEqual([result["type"] for result in results], ["final", "final"])
+        self.assertEqual(results[0]["start"], 0)
+        self.assertEqual(results[1]["text"], "câu dài 1200 ms")
+        self.assertEqual(sent[-1], {"type": "websocket.close", "code": 1000})
+
+    @patch('speech_to_text.live.LIVE_PARTIAL_MS', 0)
+    @patch('speech_to_text.live.recognize_segment')
+    def test_disconnect_skips_pending_utterance(self, mock_recognize):
+        mock_recognize.side_effect = lambda audio: (f"câu dài {len(audio)} ms", None)
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        with patch('speech_to_text.live.speech_executor', executor):
+            sent = self.run_socket([
+                {"type": "websocket.receive", "bytes": pcm(800) + pcm(700, loud=False)},
+                {"type": "websocket.receive", "bytes": pcm(1200)},
+                {"type": "websocket.disconnect", "code": 1001},
+            ])
+        executor.shutdown(wait=True)
+
+        # ➜ Chỉ câu đã kết thúc trước khi ngắt được nhận diện, câu đang dở thì bỏ
+        self.assertEqual(mock_recognize.call_count, 1)
+        self.assertNotIn({"type": "websocket.close", "code": 1000}, sent)
+
+    def test_unsupported_encoding_rejected(self):
+        sent = self.run_socket([], query_string=b"encoding=opus")
+        self.assertEqual(sent, [{"type": "websocket.close", "code": 1003}])
+
+
+from .views import transcript_cache
+
+
+class TranscriptCacheTest(APITestCase):
+
+    def setUp(self):
+        transcript_cache.clear()
+        self.audio = Sine(440, sample_rate=16000).to_audio_segment(duration=1000).set_sample_width(2)
+
+    def wav_upload(self, audio, name):
+        buffer = io.BytesIO()
+        audio.export(buffer, format="wav")
+        buffer.seek(0)
+        buffer.name = name
+        return buffer
+
+    @patch('speech_to_text.views.sr.Recognizer.recognize_google')
+    def test_same_audio_is_transcribed_once(self, mock_recognize):
+        mock_recognize.return_value = "Xin chào các em"
+
+        first = self.client.post(reverse('audio-to-text'), {'file': self.wav_upload(self.audio, "mono.wav")}, format='multipart')
+        # ➜ Cùng âm thanh nhưng file khác (stereo, tên khác) vẫn dùng chung một entry
+        stereo = self.audio.set_channels(2)
+        second = self.client.post(reverse('audio-to-text'), {'file': self.wav_upload(stereo, "stereo.wav")}, format='multipart')
+
+        self.assertEqual(first.data, {"text": "Xin chào các em"})
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(mock_recognize.call_count, 1)
+
+    @patch('speech_to_text.views.sr.Recognizer.recognize_google')
+    def test_request_errors_are_not_cached(self, mock_recognize):
+        mock_recognize.side_effect = [sr.RequestError("mất mạng"), "Xin chào"]
+
+        first = self.client.post(reverse('audio-to-text'), {'file': self.wav_upload(self.audio, "a.wav")}, format='multipart')
+        second = self.client.post(reverse('audio-to-text'), {'file': self.wav_upload(self.audio, "a.wav")}, format='multipart')
+
+        self.assertEqual(first.data["text"], "Lỗi kết nối đến dịch vụ nhận diện giọng nói")
+        self.assertEqual(second.data["text"], "Xin chào")
+
+
+
+import tempfile
+from django.core.management import call_command
+from .backends import BACKENDS, SpeechBackend, get_backend
+
+
+class FakeOfflineBackend(SpeechBackend):
+    name = "fake"
+
+    def transcribe(self, audio, language="vi-VN"):
+        return f"offline {len(audio)} ms"
+
+
+@patch('speech_to_text.backends._instances', {})
+@patch.dict(BACKENDS, {"fake": FakeOfflineBackend})
+@patch('speech_to_text.backends.SPEECH_BACKEND', "fake")
+class SpeechBackendTest(APITestCase):
+
+    def setUp(self):
+        transcript_cache.clear()
+        self.audio = Sine(440, sample_rate=16000).to_audio_segment(duration=1000).set_sample_width(2)
+
+    def wav_upload(self, name="a.wav"):
+        buffer = io.BytesIO()
+        self.audio.export(buffer, format="wav")
+        buffer.seek(0)
+        buffer.name = name
+        return buffer
+
+    def test_backend_instance_is_reused(self):
+        backend = get_backend()
+        self.assertIsInstance(backend, FakeOfflineBackend)
+        self.assertIs(get_backend("fake"), backend)
+
+    @patch('speech_to_text.views.sr.Recognizer.recognize_google')
+    def test_default_and_per_request_backend(self, mock_recognize):
+        mock_recognize.return_value = "Xin chào"
+        url = reverse('audio-to-text')
+
+        default = self.client.post(url, {'file': self.wav_upload()}, format='multipart')
+        google = self.client.post(url, {'file': self.wav_upload(), 'backend': 'google'}, format='multipart')
+
+        self.assertEqual(default.data, {"text": "offline 1000 ms"})
+        # ➜ Cùng audio nhưng khác engine thì không dùng chung cache
+        self.assertEqual(google.data, {"text": "Xin chào"})
+        self.assertEqual(mock_recognize.call_count, 1)
+
+    def test_benchmark_times_fresh_load(self):
+        loads = []
+        with patch.object(FakeOfflineBackend, "load", autospec=True, side_effect=loads.append):
+            cached = get_backend("fake")  # ➜ Giống worker đã nạp sẵn model
+            with tempfile.NamedTemporaryFile(suffix=".wav") as f:
+                self.audio.export(f.name, format="wav")
+                out = io.StringIO()
+                call_command("benchmark_speech", f.name, backend=["fake"], repeat=1, stdout=out)
+
+        self.assertEqual(len(loads), 2)
+        self.assertIsNot(loads[1], cached)
+        self.assertIn("✅ fake: nạp", out.getvalue())
+
+    @patch('speech_to_text.backends.SPEECH_VOSK_MODEL_PATH', "")
+    def test_unavailable_backend(self):
+        response = self.client.post(reverse('audio-to-text'), {'file': self.wav_upload(), 'backend': 'vosk'}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+from .views import normalize_audio, trim_silence
+
+
+class AudioPreprocessingTest(APITestCase):
+
+    def setUp(self):
+        transcript_cache.clear()
+        tone = Sine(440, sample_rate=44100).to_audio_segment(duration=1000).apply_gain(-6)
+        silence = Segment.silent(duration=1000, frame_rate=44100)
+        self.audio = (silence + tone + silence).set_channels(2)
+
+    def test_normalize_and_trim(self):
+        audio = trim_silence(normalize_audio(self.audio))
+
+        self.assertEqual((audio.channels, audio.frame_rate, audio.sample_width), (1, 16000, 2))
+        self.assertAlmostEqual(len(audio), 1400, delta=30)  # ➜ 1s có tiếng + 200ms mỗi bên
+        self.assertLess(len(audio.raw_data), len(self.audio.raw_data) / 10)
+
+    def test_fully_silent_audio_is_kept(self):
+        silence = Segment.silent(duration=500, frame_rate=16000)
+        self.assertEqual(len(trim_silence(silence)), 500)
+
+    def test_recognizer_receives_preprocessed_audio(self):
+        received = []
+
+        def recognize(recognizer, audio_data, language):
+            received.append(audio_data)
+            return "Xin chào"
+
+        buffer = io.BytesIO()
+        self.audio.export(buffer, format="wav")
+        buffer.seek(0)
+        buffer.name = "lecture.wav"
+        with patch('speech_to_text.views.sr.Recognizer.recognize_google', autospec=True, side_effect=recognize):
+            response = self.client.post(reverse('audio-to-text'), {'file': buffer}, format='multipart')
+
+        self.assertEqual(response.data, {"text": "Xin chào"})
+        audio_data = received[0]
+        self.assertEqual((audio_data.sample_rate, audio_data.sample_width), (16000, 2))
+        self.assertAlmostEqual(len(audio_data.frame_data) / 32, 1400, delta=30)
+        stages = [part.split(";")[0] for part in response["Server-Timing"].split(", ")]
+        self.assertEqual(stages, ["decode", "normalize", "trim", "recognize"])
@@ -1,12 +1,118 @@
 import os
+import time
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
 import speech_recognition as sr
 from pydub import AudioSegment
+from pydub.silence import detect_leading_silence, detect_nonsilent
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework import status
+from api.cache import ContentCache, make_key
+from .backends import BackendUnavailable, get_backend
 from .serializers import AudioUploadSerializer
 
+logger = logging.getLogger(__name__)
+
+# 📌 Chế độ audio dài: cắt theo khoảng lặng, nhận diện song song từng đoạn rồi ghép lại theo thứ tự
+SPEECH_MAX_CONCURRENCY = getattr(settings, "SPEECH_MAX_CONCURRENCY", 4)
+SPEECH_SEGMENT_MAX_MS = getattr(settings, "SPEECH_SEGMENT_MAX_MS", 50_000)  # ➜ Google từ chối đoạn audio quá dài
+SPEECH_MIN_SILENCE_MS = getattr(settings, "SPEECH_MIN_SILENCE_MS", 700)
+SPEECH_SILENCE_THRESH_DB = getattr(settings, "SPEECH_SILENCE_THRESH_DB", 16)  # ➜ Nhỏ hơn âm lượng trung bình bao nhiêu dB thì coi là lặng
+SPEECH_KEEP_SILENCE_MS = 200  # ➜ Giữ lại một chút khoảng lặng hai đầu để không cắt mất âm đầu / cuối
+
+# 📌 Tiền xử lý trước khi nhận diện: mono, 16 kHz, 16-bit và cắt khoảng lặng hai đầu
+SPEECH_SAMPLE_RATE = 16000
+SPEECH_TRIM_SILENCE = getattr(settings, "SPEECH_TRIM_SILENCE", True)
+SPEECH_VAD_THRESH_DBFS = getattr(settings, "SPEECH_VAD_THRESH_DBFS", -40)  # ➜ Khung nào to hơn mức này (dBFS) thì coi là có tiếng
+
+speech_executor = ThreadPoolExecutor(max_workers=SPEECH_MAX_CONCURRENCY, thread_name_prefix="speech")
+
+# 📌 Cache kết quả nhận diện theo dấu vân tay của audio đã giải mã (không phụ thuộc container / metadata)
+TRANSCRIPT_CACHE_MAX_ENTRIES = getattr(settings, "TRANSCRIPT_CACHE_MAX_ENTRIES", 2000)
+TRANSCRIPT_CACHE_TTL = getattr(settings, "TRANSCRIPT_CACHE_TTL", 30 * 24 * 3600)
+transcript_cache = ContentCache("transcript", max_entries=TRANSCRIPT_CACHE_MAX_ENTRIES, ttl=TRANSCRIPT_CACHE_TTL)
+SPEECH_REQUEST_ERROR = "Lỗi kết nối đến dịch vụ nhận diện giọng nói"
+
+def audio_fingerprint(audio):
+    """
+    SHA-256 của PCM chuẩn hóa (mono, 16 kHz, 16-bit): cùng một đoạn âm thanh trong WAV hay
+    container khác, tên file hay metadata khác nhau vẫn cho cùng một khóa.
+    """
+    canonical = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
+    return hashlib.sha256(canonical.raw_data).hexdigest()
+
+def normalize_audio(audio):
+    """
+    Downmix về mono, 16-bit, 16 kHz: engine nhận diện chỉ cần chừng đó, payload gửi đi nhỏ hơn nhiều
+    so với file stereo 44.1 / 48 kHz.
+    """
+    return audio.set_channels(1).set_sample_width(2).set_frame_rate(SPEECH_SAMPLE_RATE)
+
+def trim_silence(audio, threshold=None):
+    """
+    Bỏ khoảng lặng ở đầu và cuối audio (giữ lại SPEECH_KEEP_SILENCE_MS mỗi bên).
+    Audio lặng hoàn toàn thì giữ nguyên.
+    """
+    threshold = SPEECH_VAD_THRESH_DBFS if threshold is None else threshold
+    start = detect_leading_silence(audio, silence_threshold=threshold, chunk_size=10)
+    if start >= len(audio):
+        return audio
+    end = len(audio) - detect_leading_silence(audio.reverse(), silence_threshold=threshold, chunk_size=10)
+    return audio[max(start - SPEECH_KEEP_SILENCE_MS, 0):min(end + SPEECH_KEEP_SILENCE_MS, len(audio))]
+
+def timed(timings, stage, func, *args):
+    """
+    Gọi func(*args) và ghi thời gian chạy (ms) vào timings[stage].
+    """
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        timings[stage] = (time.perf_counter() - started) * 1000
+
+def silence_segments(audio, max_ms=None):
+    """
+    Chia audio thành các khoảng (start_ms, end_ms) tại chỗ lặng. Các khoảng có tiếng liền nhau được gộp
+    đến tối đa `max_ms` để giảm số request, khoảng dài hơn `max_ms` thì bị cắt cứng.
+    """
+    max_ms = max_ms or SPEECH_SEGMENT_MAX_MS
+    ranges = detect_nonsilent(
+        audio,
+        min_silence_len=SPEECH_MIN_SILENCE_MS,
+        silence_thresh=audio.dBFS - SPEECH_SILENCE_THRESH_DB,
+        seek_step=10,
+    )
+
+    segments = []
+    for start, end in ranges:
+        start = max(start - SPEECH_KEEP_SILENCE_MS, 0)
+        end = min(end + SPEECH_KEEP_SILENCE_MS, len(audio))
+        if segments and end - segments[-1][0] <= max_ms:
+            segments[-1] = (segments[-1][0], end)
+            continue
+        while end - start > max_ms:
+            segments.append((start, start + max_ms))
+            start += max_ms
+        segments.append((start, end))
+    return segments
+
+def recognize_segment(audio, backend=None):
+    """
+    Nhận diện một đoạn audio (AudioSegment) bằng `backend` (mặc định SPEECH_BACKEND). Trả về (text, lỗi).
+    """
+    backend = backend or get_backend()
+    try:
+        return backend.transcribe(audio, language="vi-VN"), None
+    except sr.UnknownValueError:
+        return "", None  # ➜ Đoạn không có lời nói, bỏ qua
+    except sr.RequestError as e:
+        logger.warning(f"⚠️ Lỗi nhận diện giọng nói: {str(e)}")
+        return "", SPEECH_REQUEST_ERROR
+
 class AudioToTextView(APIView):
     parser_classes = (MultiPartParser, FormParser)
 
@@ -19,25 +125,103 @@ class AudioToTextView(APIView):
             if file_extension not in ['.wav', '.mp3', '.ogg']:
                 return Response({"error": "Unsupported audio format"}, status=status.HTTP_400_BAD_REQUEST)
 
-            text = self.convert_audio_to_text(audio_file, file_extension)
-            return Response({"text": text}, status=status.HTTP_200_OK)
+            long_audio = serializer.validated_data.get('long_audio')
+
+            # 📌 Engine nhận diện: theo request nếu có, không thì theo cấu hình SPEECH_BACKEND
+            try:
+                backend = get_backend(serializer.validated_data.get('backend'))
+            except BackendUnavailable as e:
+                logger.warning(f"⚠️ Engine nhận diện không khả dụng: {str(e)}")
+                return Response({"error": "Engine nhận diện giọng nói không khả dụng"},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+            # 📌 Giải mã một lần: dùng để lấy dấu vân tay cho cache và để nhận diện luôn.
+            # Không giải mã được thì vẫn nhận diện như cũ, chỉ là không dùng cache.
+            timings = {}
+            audio = timed(timings, "decode", self.decode_audio, audio_file, file_extension)
+            cache_key = None
+            if audio is not None:
+                original_bytes = len(audio.raw_data)
+                audio = timed(timings, "normalize", normalize_audio, audio)
+                # ➜ Bản ghi dài đã tự bỏ khoảng lặng khi cắt đoạn, cắt thêm sẽ làm lệch mốc thời gian
+                if SPEECH_TRIM_SILENCE and not long_audio:
+                    audio = timed(timings, "trim", trim_silence, audio)
+                logger.debug(f"🔹 Audio sau tiền xử lý: {original_bytes} ➜ {len(audio.raw_data)} bytes")
+
+                cache_key = make_key(audio_fingerprint(audio), "long" if long_audio else "short", "vi-VN", backend.name)
+                cached = transcript_cache.get(cache_key)
+                if cached is not None:
+                    return self.timed_response(cached, timings)
+            source = audio if audio is not None else audio_file
+
+            # 📌 Bản ghi dài (bài giảng...): cắt theo khoảng lặng và nhận diện song song
+            if long_audio:
+                result = timed(timings, "recognize", self.convert_long_audio_to_text, source, file_extension, backend)
+                cacheable = not any("error" in segment for segment in result["segments"])
+            else:
+                result = {"text": timed(timings, "recognize", self.convert_audio_to_text, source, file_extension, backend)}
+                cacheable = result["text"] != SPEECH_REQUEST_ERROR
+
+            # ➜ Lỗi kết nối tới dịch vụ nhận diện thì không lưu cache để lần sau thử lại
+            if cache_key and cacheable:
+                transcript_cache.set(cache_key, result)
+            return self.timed_response(result, timings)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    def convert_audio_to_text(self, file, file_extension):
-        recognizer = sr.Recognizer()
+    def timed_response(self, data, timings):
+        """
+        Trả kết quả kèm thời gian từng bước (giải mã, chuẩn hóa, cắt lặng, nhận diện) trong header Server-Timing.
+        """
+        response = Response(data, status=status.HTTP_200_OK)
+        response["Server-Timing"] = ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())
+        return response
 
-        # Chuyển đổi file MP3, OGG sang WAV
-        if file_extension != '.wav':
-            audio = AudioSegment.from_file(file, format=file_extension[1:])
-            file = "temp_audio.wav"
-            audio.export(file, format="wav")
+    def decode_audio(self, file, file_extension):
+        """
+        Giải mã file upload thành AudioSegment, trả về None nếu không giải mã được.
+        """
+        try:
+            return AudioSegment.from_file(file, format=file_extension[1:])
+        except Exception as e:
+            logger.warning(f"⚠️ Không giải mã được audio {file.name}: {str(e)}")
+            return None
+        finally:
+            file.seek(0)
 
-        with sr.AudioFile(file) as source:
-            audio_data = recognizer.record(source)
+    def convert_audio_to_text(self, file, file_extension, backend=None):
+        # Giải mã MP3, OGG, WAV ngay trong bộ nhớ (nếu chưa giải mã), engine tự chuyển sang định dạng nó cần
+        # (mỗi request một buffer riêng nên nhiều request chạy song song không ghi đè lên nhau)
+        audio = file if isinstance(file, AudioSegment) else AudioSegment.from_file(file, format=file_extension[1:])
+        backend = backend or get_backend()
 
         try:
-            return recognizer.recognize_google(audio_data, language="vi-VN")  # Hỗ trợ tiếng Việt
+            return backend.transcribe(audio, language="vi-VN")  # Hỗ trợ tiếng Việt
         except sr.UnknownValueError:
             return "Không thể nhận diện giọng nói"
         except sr.RequestError:
-            return "Lỗi kết nối đến dịch vụ nhận diện giọng nói"
+            return SPEECH_REQUEST_ERROR
+
+    def convert_long_audio_to_text(self, file, file_extension, backend=None):
+        """
+        Cắt audio tại các khoảng lặng, nhận diện các đoạn song song (tối đa SPEECH_MAX_CONCURRENCY)
+        rồi ghép lại theo thứ tự. Trả về toàn văn và từng đoạn kèm thời điểm bắt đầu / kết thúc (giây).
+        """
+        audio = file if isinstance(file, AudioSegment) else AudioSegment.from_file(file, format=file_extension[1:])
+        segments = silence_segments(audio)
+        backend = backend or get_backend()
+        futures = [speech_executor.submit(recognize_segment, audio[start:end], backend) for start, end in segments]
+
+        results = []
+        for (start, end), future in zip(segments, futures):
+            try:
+                text, error = future.result()
+            except Exception as e:
+                logger.exception(f"⚠️ Lỗi khi nhận diện đoạn {start}-{end}ms: {str(e)}")
+                text, error = "", "Không thể nhận diện giọng nói"
+            segment = {"start": start / 1000, "end": end / 1000, "text": text}
+            if error:
+                segment["error"] = error
+            results.append(segment)
+
+        text = " ".join(segment["text"] for segment in results if segment["text"])
+        return {"text": text or "Không thể nhận diện giọng nói", "segments": results}
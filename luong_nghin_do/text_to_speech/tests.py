@@ -3,9 +3,12 @@ from rest_framework.test import APIClient
 from unittest.mock import patch, MagicMock
 from django.conf import settings
 import os
+import shutil
+import threading
 
 class TextToSpeechAPIViewTest(TestCase):
     def setUp(self):
+        shutil.rmtree(os.path.join(settings.MEDIA_ROOT, 'tts'), ignore_errors=True)
         self.client = APIClient()
         self.url = '/api/tts/'  # Cập nhật URL này nếu khác
         self.text = 'Hello world'
@@ -13,8 +16,9 @@ class TextToSpeechAPIViewTest(TestCase):
 
     @patch('text_to_speech.views.gTTS')  # Giả sử view nằm trong speech_to_text/views.py
     def test_post_valid_text(self, mock_gtts_class):
-        # Mock phương thức save để không tạo file thật
+        # Mock phương thức save để không gọi gTTS thật
         mock_tts_instance = MagicMock()
+        mock_tts_instance.save.side_effect = self.fake_save
         mock_gtts_class.return_value = mock_tts_instance
 
         response = self.client.post(self.url, {'text': self.text, 'lang': self.lang}, format='json')
@@ -31,12 +35,66 @@ class TextToSpeechAPIViewTest(TestCase):
         mock_gtts_class.assert_called_once_with(text=self.text, lang=self.lang)
         mock_tts_instance.save.assert_called_once()
     
+    def fake_save(self, path):
+        with open(path, 'wb') as f:
+            f.write(b'ID3fake-mp3')
+
+    @patch('text_to_speech.views.gTTS')
+    def test_same_text_is_synthesized_once(self, mock_gtts_class):
+        mock_gtts_class.return_value.save.side_effect = self.fake_save
+
+        first = self.client.post(self.url, {'text': 'Hello   world', 'lang': self.lang}, format='json')
+        second = self.client.post(self.url, {'text': ' Hello world ', 'lang': self.lang}, format='json')
+        other_lang = self.client.post(self.url, {'text': self.text, 'lang': 'vi'}, format='json')
+        # ➜ Mã ngôn ngữ khác hoa / thường, thừa khoảng trắng vẫn dùng chung một file
+        upper_lang = self.client.post(self.url, {'text': self.text, 'lang': ' EN '}, format='json')
+
+        self.assertEqual(first.data['audio_url'], second.data['audio_url'])
+        self.assertEqual(first.data['audio_url'], upper_lang.data['audio_url'])
+        self.assertNotEqual(first.data['audio_url'], other_lang.data['audio_url'])
+        self.assertEqual(mock_gtts_class.call_count, 2)
+        file_path = os.path.join(settings.MEDIA_ROOT, first.data['audio_url'][len(settings.MEDIA_URL):])
+        self.assertTrue(os.path.exists(file_path))
+        self.assertEqual(len(os.listdir(os.path.dirname(file_path))), 2)  # ➜ Không còn file tạm
+
+    @patch('text_to_speech.views.gTTS')
+    def test_concurrent_requests_are_coalesced(self, mock_gtts_class):
+        started = threading.Event()
+
+        def slow_save(path):
+            started.set()
+            threading.Event().wait(0.2)
+            self.fake_save(path)
+
+        mock_gtts_class.return_value.save.side_effect = slow_save
+        urls = []
+
+        def request():
+            urls.append(APIClient().post(self.url, {'text': self.text, 'lang': self.lang}, format='json').data['audio_url'])
+
+        threads = [threading.Thread(target=request) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(urls)), 1)
+        self.assertEqual(mock_gtts_class.call_count, 1)
+
     def test_post_missing_text(self):
         response = self.client.post(self.url, {'lang': self.lang}, format='json')
         self.assertEqual(response.status_code, 400)
         self.assertIn('error', response.data)
         self.assertEqual(response.data['error'], 'Text is required')
 
+    @patch('text_to_speech.views.gTTS')
+    def test_post_non_string_text(self, mock_gtts_class):
+        for text in [123, ['Hello'], {'text': 'Hello'}]:
+            response = self.client.post(self.url, {'text': text, 'lang': self.lang}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['error'], 'Text must be a string')
+        mock_gtts_class.assert_not_called()
+
     @patch('text_to_speech.views.gTTS')
     def test_post_gtts_raises_exception(self, mock_gtts_class):
         mock_gtts_class.side_effect = Exception('Something went wrong')
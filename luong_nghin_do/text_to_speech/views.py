@@ -1,32 +1,66 @@
 import os
+import threading
 from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from gtts import gTTS
+from api.cache import make_key, normalize_text
 import uuid
 
+# 📌 File mp3 chính là cache: đặt tên theo hash của (văn bản đã chuẩn hóa, ngôn ngữ), có rồi thì không gọi gTTS nữa
+TTS_MEDIA_DIR = "tts"
+
+TTS_LOCK_STRIPES = 64
+_key_locks = [threading.Lock() for _ in range(TTS_LOCK_STRIPES)]
+
+
+def key_lock(key):
+    """
+    Lock theo khóa (chia sẵn TTS_LOCK_STRIPES lock để không phình bộ nhớ): các request cùng nội dung
+    chờ nhau thay vì cùng gọi gTTS.
+    """
+    return _key_locks[int(key[:8], 16) % TTS_LOCK_STRIPES]
+
+
 class TextToSpeechAPIView(APIView):
     def post(self, request):
         # Lấy dữ liệu từ request
         text = request.data.get('text', '')
-        lang = request.data.get('lang', 'en')  # Ngôn ngữ mặc định là tiếng Anh
+        if not isinstance(text, str):
+            return Response({'error': 'Text must be a string'}, status=status.HTTP_400_BAD_REQUEST)
+        text = normalize_text(text)
+        lang = str(request.data.get('lang') or 'en').strip().lower()  # Ngôn ngữ mặc định là tiếng Anh
 
         if not text:
             return Response({'error': 'Text is required'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            # Tạo tên file duy nhất cho file âm thanh
-            file_name = f"{uuid.uuid4()}.mp3"
+            key = make_key(text, lang)
+            file_name = f"{TTS_MEDIA_DIR}/{key}.mp3"
             file_path = os.path.join(settings.MEDIA_ROOT, file_name)
 
-            # Tạo file âm thanh từ văn bản
-            tts = gTTS(text=text, lang=lang)
-            tts.save(file_path)
+            with key_lock(key):
+                if not os.path.exists(file_path):
+                    self.synthesize(text, lang, file_path)
 
             # Trả về URL để truy cập file âm thanh
             file_url = f"{settings.MEDIA_URL}{file_name}"
             return Response({'audio_url': file_url}, status=status.HTTP_200_OK)
 
         except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def synthesize(self, text, lang, file_path):
+        """
+        Tạo file âm thanh từ văn bản. Ghi ra file tạm rồi đổi tên, để process khác không bao giờ thấy file dở dang.
+        """
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            tts = gTTS(text=text, lang=lang)
+            tts.save(tmp_path)
+            os.replace(tmp_path, file_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)